@@ -0,0 +1,51 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponseNotAllowed
+
+from .metrics import metrics
+
+
+# Blocking Docker calls made by async views run here instead of on Daphne's
+# single sync thread, so concurrent commands are not serialized behind each other
+docker_executor = ThreadPoolExecutor(
+    max_workers=settings.DOCKER_EXECUTOR_WORKERS,
+    thread_name_prefix="docker-io"
+)
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking (Docker) call on the bounded Docker executor"""
+    def call():
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Calls may touch the ORM (registry, history); don't leak a connection per worker
+            close_old_connections()
+
+    metrics.incr('docker_executor.calls')
+    return await asyncio.get_running_loop().run_in_executor(docker_executor, call)
+
+
+def async_require_http_methods(request_method_list):
+    """``require_http_methods`` for async views; Django 4.2's decorators only wrap sync views"""
+    def decorator(view_func):
+        @functools.wraps(view_func)
+        async def inner(request, *args, **kwargs):
+            if request.method not in request_method_list:
+                return HttpResponseNotAllowed(request_method_list)
+            return await view_func(request, *args, **kwargs)
+        return inner
+    return decorator
+
+
+def async_csrf_exempt(view_func):
+    """``csrf_exempt`` for async views"""
+    @functools.wraps(view_func)
+    async def wrapper_view(*args, **kwargs):
+        return await view_func(*args, **kwargs)
+    wrapper_view.csrf_exempt = True
+    return wrapper_view
@@ -0,0 +1,267 @@
+import os
+import shlex
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .metrics import metrics
+
+
+# kubectl verbs whose output only depends on cluster state
+READ_VERBS = {'get', 'describe', 'top', 'explain', 'api-resources', 'api-versions', 'version', 'cluster-info'}
+
+# kubectl verbs that change the cluster (or which context later commands talk to)
+MUTATING_VERBS = {
+    'apply', 'delete', 'scale', 'edit', 'patch', 'create', 'replace', 'rollout', 'label', 'annotate',
+    'set', 'expose', 'run', 'autoscale', 'cordon', 'uncordon', 'drain', 'taint', 'config', 'exec', 'cp', 'debug',
+    'certificate'
+}
+HELM_MUTATING_VERBS = {'install', 'upgrade', 'uninstall', 'delete', 'rollback'}
+
+# Tools that run whatever kubectl commands they decide on, so any use of them may change the cluster
+AGENT_TOOLS = {'kubectl-ai'}
+
+# Flags that make a read command's output depend on more than the cluster, or never finish
+UNCACHEABLE_FLAGS = ('-w', '--watch', '--watch-only', '-f', '--filename', '-k', '--kustomize', '--raw')
+
+# Anything a shell would interpret: the command does more than a single kubectl read
+SHELL_CHARACTERS = set('|&;<>$`\\(){}*?~!#')
+
+# Global flags given before the verb whose value is a separate argument
+VALUE_FLAGS = {'-n', '--namespace', '--context', '--cluster', '--user', '-s', '--server', '--kubeconfig', '--as',
+               '--request-timeout', '--kube-context'}
+# ... and the same for common read flags
+READ_VALUE_FLAGS = VALUE_FLAGS | {'-l', '--selector', '-o', '--output', '--field-selector', '--sort-by', '-L',
+                                  '--label-columns', '-c', '--container'}
+
+# Seconds a cached result stays valid, by resource; others get the default TTL
+RESOURCE_TTLS = {
+    'events': 2, 'ev': 2, 'event': 2,
+    'pods': 5, 'po': 5, 'pod': 5,
+    'deployments': 10, 'deploy': 10, 'deployment': 10, 'replicasets': 10, 'rs': 10,
+    'services': 15, 'svc': 15, 'service': 15, 'endpoints': 15, 'ep': 15, 'ingresses': 15, 'ing': 15,
+    'configmaps': 15, 'cm': 15,
+    'nodes': 30, 'no': 30, 'node': 30, 'namespaces': 60, 'ns': 60, 'namespace': 60,
+    'crds': 60, 'customresourcedefinitions': 60, 'storageclasses': 60, 'sc': 60
+}
+VERB_TTLS = {'explain': 300, 'api-resources': 300, 'api-versions': 300, 'version': 60, 'cluster-info': 60}
+
+
+def normalize_read_command(command):
+    """``(normalized command, verb, resource)`` for a cacheable kubectl read, else None"""
+    if SHELL_CHARACTERS & set(command):
+        return None
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return None
+    if len(args) < 2 or args[0] != 'kubectl':
+        return None
+    positional = []
+    skip = False
+    for arg in args[1:]:
+        if skip:
+            skip = False
+        elif arg.startswith('-'):
+            skip = arg in READ_VALUE_FLAGS
+        else:
+            positional.append(arg)
+    if not positional or positional[0] not in READ_VERBS:
+        return None
+    if any(arg == flag or arg.startswith(f'{flag}=') for arg in args for flag in UNCACHEABLE_FLAGS):
+        return None
+    resource = positional[1].split('/', 1)[0].split('.', 1)[0] if len(positional) > 1 else ''
+    return ' '.join(shlex.quote(arg) for arg in args), positional[0], resource
+
+
+def is_mutating(command):
+    """Whether a command line (pipelines and chains included) may change cluster state"""
+    try:
+        lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        # Can't tell where the verb is: treat any mention of a mutating verb as one
+        words = set(command.split())
+        if words & AGENT_TOOLS:
+            return True
+        return bool(words & {'kubectl', 'helm'}) and bool(words & (MUTATING_VERBS | HELM_MUTATING_VERBS))
+
+    for i, token in enumerate(tokens):
+        tool = token.rsplit('/', 1)[-1]
+        if tool in AGENT_TOOLS:
+            return True
+        if tool not in ('kubectl', 'helm'):
+            continue
+        j = i + 1
+        while j < len(tokens) and tokens[j].startswith('-'):
+            j += 2 if tokens[j] in VALUE_FLAGS else 1
+        verbs = MUTATING_VERBS if tool == 'kubectl' else HELM_MUTATING_VERBS
+        if j < len(tokens) and tokens[j] in verbs:
+            return True
+    return False
+
+
+class CommandCache:
+    """LRU cache of successful read-only kubectl results, shared by the sessions of a cluster.
+
+    Entries are keyed on (cluster, scope, normalized command) and expire after
+    a TTL picked by the resource (``events`` after 2s, ``nodes`` after 30s,
+    ...). The scope is None for sessions whose kubectl uses the stored
+    kubeconfig as is; a container that may have switched context or
+    namespace passes its own scope. Any command that may mutate the cluster
+    drops all of the cluster's entries, since its effect on other resources
+    can't be predicted; from a switched container it drops every cluster's.
+
+    The entries live in this process. With ``generation_dir``, invalidations
+    also touch a per-cluster file there, and entries recorded before the
+    file's last change are dropped, so mutations seen by any worker on the
+    host reach every worker's cache. Callers take ``generation()`` before
+    running a command and pass it to ``record()``, so a read that overlapped
+    an invalidation is not stored.
+    """
+
+    def __init__(self, max_entries=512, default_ttl=5.0, enabled=True, generation_dir=None):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.enabled = enabled
+        self.generation_dir = generation_dir
+        if generation_dir:
+            os.makedirs(generation_dir, exist_ok=True)
+        self._entries = OrderedDict()
+        # Invalidations in this process, by cluster id (None: all clusters)
+        self._invalidations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def ttl_for(self, verb, resource):
+        if verb in VERB_TTLS:
+            return VERB_TTLS[verb]
+        return RESOURCE_TTLS.get(resource.lower(), self.default_ttl)
+
+    def get(self, cluster_id, command, scope=None):
+        """A copy of the cached result marked ``'cached': True``, or None"""
+        if not self.enabled:
+            return None
+        normalized = normalize_read_command(command)
+        if normalized is None:
+            return None
+        key = (cluster_id, scope, normalized[0])
+        generation = self.generation(cluster_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic() and entry[2] == generation:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                result = dict(entry[1], cached=True)
+            else:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                result = None
+        metrics.incr('command_cache.hits' if result is not None else 'command_cache.misses')
+        return result
+
+    def record(self, cluster_id, command, result, scope=None, generation=None):
+        """Store a fresh result of a read, or drop the cluster's entries after a mutation.
+
+        ``generation`` is the cluster's ``generation()`` from before the
+        command ran; the result is dropped if an invalidation happened since.
+        """
+        if not self.enabled:
+            return
+        if is_mutating(command):
+            self.invalidate(cluster_id if scope is None else None)
+            return
+        normalized = normalize_read_command(command)
+        if normalized is None or result.get('exit_code') != 0:
+            return
+        expires = time.monotonic() + self.ttl_for(normalized[1], normalized[2])
+        key = (cluster_id, scope, normalized[0])
+        current = self.generation(cluster_id)
+        if generation is not None and generation != current:
+            metrics.incr('command_cache.stale_records')
+            return
+        generation = current
+        with self._lock:
+            self._entries[key] = (expires, {
+                'output': result['output'],
+                'exit_code': result['exit_code']
+            }, generation)
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+        if evicted:
+            metrics.incr('command_cache.evictions', evicted)
+
+    def invalidate(self, cluster_id=None):
+        """Drop the cluster's entries in every worker, or all entries when ``cluster_id`` is None"""
+        if not self.enabled:
+            return
+        with self._lock:
+            keys = [key for key in self._entries if cluster_id is None or key[0] == cluster_id]
+            for key in keys:
+                del self._entries[key]
+            self._invalidations[cluster_id] = self._invalidations.get(cluster_id, 0) + 1
+        self._bump(cluster_id)
+        metrics.incr('command_cache.invalidations')
+        if keys:
+            target = 'all clusters' if cluster_id is None else f'cluster {cluster_id}'
+            print(f"🧹 Dropped {len(keys)} cached results for {target} after a mutating command")
+
+    def generation(self, cluster_id):
+        """Token that changes whenever the cluster's entries are invalidated, in this worker or another"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            local = (self._invalidations.get(cluster_id, 0), self._invalidations.get(None, 0))
+        return local, self._generation(cluster_id)
+
+    def _generation_path(self, cluster_id):
+        return os.path.join(self.generation_dir, 'all' if cluster_id is None else f'cluster-{cluster_id}')
+
+    def _generation(self, cluster_id):
+        """When the cluster's entries, and all entries, were last invalidated by any worker"""
+        if not self.generation_dir:
+            return None
+        stamps = []
+        for path in (self._generation_path(cluster_id), self._generation_path(None)):
+            try:
+                stamps.append(os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                stamps.append(0)
+        return tuple(stamps)
+
+    def _bump(self, cluster_id):
+        if not self.generation_dir:
+            return
+        path = self._generation_path(cluster_id)
+        try:
+            with open(path, 'a'):
+                pass
+            os.utime(path)
+        except OSError as e:
+            print(f"❌ Error recording cache invalidation: {e}")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+# Process-wide cache of read-only kubectl results, invalidated across the host's workers
+command_cache = CommandCache(
+    max_entries=settings.COMMAND_CACHE_MAX_ENTRIES,
+    default_ttl=settings.COMMAND_CACHE_TTL,
+    enabled=settings.COMMAND_CACHE_ENABLED,
+    generation_dir=os.path.join(settings.SESSION_REGISTRY_PATH, 'command-cache')
+)
@@ -0,0 +1,93 @@
+import threading
+import time
+
+import docker
+from django.conf import settings
+
+from .metrics import metrics
+
+
+# Process-wide Docker client shared by views, consumers and background services
+_client = None
+_client_lock = threading.Lock()
+_last_health_check = 0.0
+
+
+def get_docker_client():
+    """Return the shared Docker client, creating or replacing it as needed.
+
+    The client keeps a bounded HTTP connection pool to the Docker socket, so
+    callers must not close it. It is pinged at most once per health check
+    interval and recreated if the daemon stopped answering. Raises
+    ``docker.errors.DockerException`` when Docker is not available.
+    """
+    global _client, _last_health_check
+
+    client = _client
+    if client is not None and time.monotonic() - _last_health_check < settings.DOCKER_HEALTH_CHECK_INTERVAL:
+        return client
+
+    with _client_lock:
+        if _client is not None:
+            if time.monotonic() - _last_health_check < settings.DOCKER_HEALTH_CHECK_INTERVAL:
+                return _client
+            try:
+                _client.ping()
+                _last_health_check = time.monotonic()
+                metrics.incr('docker.health_checks')
+                return _client
+            except Exception as e:
+                print(f"❌ Docker health check failed, reconnecting: {e}")
+                metrics.incr('docker.health_check_failures')
+                _close_client(_client)
+                _client = None
+
+        _client = docker.from_env(max_pool_size=settings.DOCKER_MAX_POOL_SIZE)
+        _last_health_check = time.monotonic()
+        metrics.incr('docker.clients_created')
+        return _client
+
+
+def _close_client(client):
+    try:
+        client.close()
+    except Exception:
+        pass
+
+
+def docker_pool_stats():
+    """Connection pool usage of the shared client"""
+    stats = {
+        'max_pool_size': settings.DOCKER_MAX_POOL_SIZE,
+        'pools': 0,
+        'in_use': 0,
+        'idle': 0,
+        'connections_opened': 0,
+        'requests': 0
+    }
+    client = _client
+    if client is None:
+        return stats
+
+    for adapter in client.api.adapters.values():
+        pools = getattr(adapter, 'pools', None)
+        if pools is None:
+            continue
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None or pool.pool is None:
+                continue
+            available = pool.pool.qsize()
+            idle = sum(1 for conn in list(pool.pool.queue) if conn is not None)
+            stats['pools'] += 1
+            stats['in_use'] += pool.pool.maxsize - available
+            stats['idle'] += idle
+            stats['connections_opened'] += pool.num_connections
+            stats['requests'] += pool.num_requests
+    return stats
+
+
+def update_docker_pool_metrics():
+    """Publish connection pool usage as gauges"""
+    for name, value in docker_pool_stats().items():
+        metrics.set_gauge(f'docker.pool.{name}', value)
@@ -0,0 +1,355 @@
+"""A small in-process stand-in for the Kubernetes API server.
+
+Serves list and watch requests for pods, nodes, services, deployments and
+events from in-memory objects, so the API fast path and the informers can be
+exercised without a cluster::
+
+    server = FakeKubeApiServer(sample_objects())
+    server.start()
+    cluster.kubeconfig = server.kubeconfig()
+    server.apply('pods', {...})   # seen by watches as ADDED/MODIFIED
+
+Run ``python -m chat.fake_kube_api`` to serve the sample objects and print a
+kubeconfig pointing at them.
+"""
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+import yaml
+
+
+# URL resource name -> (API group path, kind of the list, namespaced)
+RESOURCE_PATHS = {
+    'pods': ('/api/v1', 'PodList', True),
+    'services': ('/api/v1', 'ServiceList', True),
+    'events': ('/api/v1', 'EventList', True),
+    'nodes': ('/api/v1', 'NodeList', False),
+    'deployments': ('/apis/apps/v1', 'DeploymentList', True),
+}
+
+
+def _timestamp(age):
+    return (datetime.now(dt_timezone.utc) - age).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def sample_objects():
+    """A small cluster: one node, a deployment with two pods (one crash-looping), a service and events"""
+    return {
+        'nodes': [{
+            'metadata': {
+                'name': 'node-1',
+                'labels': {'node-role.kubernetes.io/control-plane': ''},
+                'creationTimestamp': _timestamp(timedelta(days=12))
+            },
+            'spec': {},
+            'status': {
+                'conditions': [{'type': 'Ready', 'status': 'True'}],
+                'addresses': [{'type': 'InternalIP', 'address': '10.0.0.10'}],
+                'nodeInfo': {
+                    'kubeletVersion': 'v1.29.2', 'osImage': 'Ubuntu 22.04.4 LTS', 'kernelVersion': '6.5.0',
+                    'containerRuntimeVersion': 'containerd://1.7.13', 'architecture': 'amd64',
+                    'bootID': '', 'machineID': '', 'systemUUID': '', 'kubeProxyVersion': 'v1.29.2',
+                    'operatingSystem': 'linux'
+                }
+            }
+        }],
+        'pods': [
+            {
+                'metadata': {
+                    'name': 'web-7d4b9c8f5-abcde', 'namespace': 'default', 'labels': {'app': 'web'},
+                    'creationTimestamp': _timestamp(timedelta(hours=5, minutes=3))
+                },
+                'spec': {'containers': [{'name': 'web', 'image': 'nginx:1.25'}], 'nodeName': 'node-1'},
+                'status': {
+                    'phase': 'Running', 'podIP': '10.244.0.12',
+                    'containerStatuses': [{
+                        'name': 'web', 'ready': True, 'restartCount': 0, 'image': 'nginx:1.25', 'imageID': '',
+                        'state': {'running': {'startedAt': _timestamp(timedelta(hours=5))}}
+                    }]
+                }
+            },
+            {
+                'metadata': {
+                    'name': 'web-7d4b9c8f5-fghij', 'namespace': 'default', 'labels': {'app': 'web'},
+                    'creationTimestamp': _timestamp(timedelta(hours=5, minutes=3))
+                },
+                'spec': {'containers': [{'name': 'web', 'image': 'nginx:1.25'}], 'nodeName': 'node-1'},
+                'status': {
+                    'phase': 'Running', 'podIP': '10.244.0.13',
+                    'containerStatuses': [{
+                        'name': 'web', 'ready': False, 'restartCount': 4, 'image': 'nginx:1.25', 'imageID': '',
+                        'state': {'waiting': {'reason': 'CrashLoopBackOff'}},
+                        'lastState': {'terminated': {'exitCode': 1, 'reason': 'Error', 'finishedAt': _timestamp(timedelta(seconds=40))}}
+                    }]
+                }
+            },
+            {
+                'metadata': {
+                    'name': 'coredns-5d78c9869d-xyz12', 'namespace': 'kube-system', 'labels': {'k8s-app': 'kube-dns'},
+                    'creationTimestamp': _timestamp(timedelta(days=12))
+                },
+                'spec': {'containers': [{'name': 'coredns', 'image': 'coredns:1.11.1'}], 'nodeName': 'node-1'},
+                'status': {
+                    'phase': 'Running', 'podIP': '10.244.0.2',
+                    'containerStatuses': [{
+                        'name': 'coredns', 'ready': True, 'restartCount': 0, 'image': 'coredns:1.11.1', 'imageID': '',
+                        'state': {'running': {'startedAt': _timestamp(timedelta(days=12))}}
+                    }]
+                }
+            }
+        ],
+        'services': [
+            {
+                'metadata': {'name': 'kubernetes', 'namespace': 'default', 'creationTimestamp': _timestamp(timedelta(days=12))},
+                'spec': {'type': 'ClusterIP', 'clusterIP': '10.96.0.1', 'ports': [{'port': 443, 'protocol': 'TCP'}]}
+            },
+            {
+                'metadata': {'name': 'web', 'namespace': 'default', 'creationTimestamp': _timestamp(timedelta(hours=5))},
+                'spec': {
+                    'type': 'NodePort', 'clusterIP': '10.96.12.34', 'selector': {'app': 'web'},
+                    'ports': [{'port': 80, 'nodePort': 30080, 'protocol': 'TCP'}]
+                }
+            }
+        ],
+        'deployments': [{
+            'metadata': {'name': 'web', 'namespace': 'default', 'creationTimestamp': _timestamp(timedelta(hours=5, minutes=3))},
+            'spec': {
+                'replicas': 2,
+                'selector': {'matchLabels': {'app': 'web'}},
+                'template': {'spec': {'containers': [{'name': 'web', 'image': 'nginx:1.25'}]}}
+            },
+            'status': {'replicas': 2, 'readyReplicas': 1, 'updatedReplicas': 2, 'availableReplicas': 1}
+        }],
+        'events': [{
+            'metadata': {'name': 'web-7d4b9c8f5-fghij.17a', 'namespace': 'default', 'creationTimestamp': _timestamp(timedelta(minutes=20))},
+            'involvedObject': {'kind': 'Pod', 'name': 'web-7d4b9c8f5-fghij', 'namespace': 'default'},
+            'type': 'Warning', 'reason': 'BackOff', 'message': 'Back-off restarting failed container web',
+            'count': 4, 'firstTimestamp': _timestamp(timedelta(minutes=20)), 'lastTimestamp': _timestamp(timedelta(seconds=40)),
+            'source': {'component': 'kubelet', 'host': 'node-1'}
+        }]
+    }
+
+
+def _matches(obj, label_selector, field_selector):
+    labels = obj['metadata'].get('labels') or {}
+    for requirement in filter(None, (label_selector or '').split(',')):
+        key, _, value = requirement.partition('=')
+        if labels.get(key) != value.lstrip('='):
+            return False
+    for requirement in filter(None, (field_selector or '').split(',')):
+        field, _, value = requirement.partition('=')
+        if field == 'metadata.name' and obj['metadata']['name'] != value.lstrip('='):
+            return False
+        if field == 'metadata.namespace' and obj['metadata'].get('namespace') != value.lstrip('='):
+            return False
+    return True
+
+
+class FakeKubeApiServer:
+    """Plain-HTTP fake API server on ``127.0.0.1``.
+
+    ``requests`` counts the requests served. ``apply()`` and ``delete()``
+    change objects and notify watches; ``expire()`` makes older
+    resourceVersions answer 410 Gone, like an etcd compaction. Watches that
+    allow bookmarks get one every ``bookmark_interval`` seconds.
+    """
+
+    def __init__(self, objects=None, port=0, bookmark_interval=1.0):
+        self.bookmark_interval = bookmark_interval
+        self.objects = objects if objects is not None else sample_objects()
+        self.requests = 0
+        self.resource_version = 1000
+        self.oldest_version = 1000
+        self.events = []
+        self.changed = threading.Condition()
+        self._stopping = False
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # Chunked watch responses need HTTP/1.1
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.requests += 1
+                query = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+                if query.get('watch', '').lower() in ('true', '1'):
+                    server.watch(self, query)
+                    return
+                status, body = server.handle(self.path)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.httpd.server_address[1]}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="fake-kube-api", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        with self.changed:
+            self._stopping = True
+            self.changed.notify_all()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def apply(self, resource, obj):
+        """Create or replace an object, as an ADDED or MODIFIED event"""
+        with self.changed:
+            self.resource_version += 1
+            obj['metadata']['resourceVersion'] = str(self.resource_version)
+            items = self.objects.setdefault(resource, [])
+            key = (obj['metadata'].get('namespace'), obj['metadata']['name'])
+            for i, existing in enumerate(items):
+                if (existing['metadata'].get('namespace'), existing['metadata']['name']) == key:
+                    items[i] = obj
+                    event_type = 'MODIFIED'
+                    break
+            else:
+                items.append(obj)
+                event_type = 'ADDED'
+            self.events.append((self.resource_version, resource, event_type, obj))
+            self.changed.notify_all()
+
+    def delete(self, resource, name, namespace=None):
+        with self.changed:
+            for obj in list(self.objects.get(resource, [])):
+                if obj['metadata']['name'] == name and obj['metadata'].get('namespace') == namespace:
+                    self.objects[resource].remove(obj)
+                    self.resource_version += 1
+                    self.events.append((self.resource_version, resource, 'DELETED', obj))
+                    self.changed.notify_all()
+
+    def expire(self):
+        """Forget the event history: watches from an older resourceVersion get 410 Gone"""
+        with self.changed:
+            self.oldest_version = self.resource_version
+            self.events.clear()
+
+    def watch(self, handler, query):
+        """Stream watch events as chunked JSON lines, like the API server, until ``timeoutSeconds``"""
+        status, route = self._route(urlparse(handler.path).path)
+        handler.send_response(200 if status is None else status)
+        handler.send_header('Content-Type', 'application/json')
+        handler.send_header('Transfer-Encoding', 'chunked')
+        handler.end_headers()
+
+        def send(event):
+            line = json.dumps(event).encode() + b'\n'
+            handler.wfile.write(f'{len(line):x}\r\n'.encode() + line + b'\r\n')
+            handler.wfile.flush()
+
+        try:
+            if status is not None:
+                send(route)
+                return
+            resource, namespace, namespaced = route
+            since = int(query.get('resourceVersion') or self.resource_version)
+            deadline = time.monotonic() + int(query.get('timeoutSeconds', 60))
+            bookmarks = query.get('allowWatchBookmarks', '').lower() in ('true', '1')
+            next_bookmark = time.monotonic() + self.bookmark_interval
+            if since < self.oldest_version:
+                send({'type': 'ERROR', 'object': self._status(410, 'Expired', f'too old resource version: {since} ({self.oldest_version})')})
+                return
+            while True:
+                bookmark = None
+                with self.changed:
+                    pending = [event for event in self.events if event[0] > since and event[1] == resource]
+                    if not pending:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0 or self._stopping:
+                            return
+                        if not bookmarks or time.monotonic() < next_bookmark:
+                            self.changed.wait(min(remaining, 0.5, max(next_bookmark - time.monotonic(), 0.01)))
+                            continue
+                        # Nothing of this resource is pending, so the server's current version is safe to resume from
+                        since = self.resource_version
+                        bookmark = {'kind': RESOURCE_PATHS[resource][1][:-4], 'metadata': {'resourceVersion': str(since)}}
+                if bookmark is not None:
+                    next_bookmark = time.monotonic() + self.bookmark_interval
+                    send({'type': 'BOOKMARK', 'object': bookmark})
+                    continue
+                for version, _, event_type, obj in pending:
+                    since = version
+                    if namespaced and namespace is not None and obj['metadata'].get('namespace') != namespace:
+                        continue
+                    send({'type': event_type, 'object': obj})
+        except (BrokenPipeError, ConnectionResetError):
+            return
+        finally:
+            try:
+                handler.wfile.write(b'0\r\n\r\n')
+                handler.wfile.flush()
+            except OSError:
+                pass
+
+    def kubeconfig(self, namespace='default'):
+        return yaml.safe_dump({
+            'apiVersion': 'v1',
+            'kind': 'Config',
+            'clusters': [{'name': 'fake', 'cluster': {'server': self.url}}],
+            'users': [{'name': 'fake', 'user': {'token': 'fake-token'}}],
+            'contexts': [{'name': 'fake', 'context': {'cluster': 'fake', 'user': 'fake', 'namespace': namespace}}],
+            'current-context': 'fake'
+        })
+
+    def handle(self, path):
+        url = urlparse(path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        status, route = self._route(url.path)
+        if status is not None:
+            return status, route
+
+        resource, namespace, namespaced = route
+        group, kind, _ = RESOURCE_PATHS[resource]
+        with self.changed:
+            items = [
+                obj for obj in self.objects.get(resource, [])
+                if (namespace is None or not namespaced or obj['metadata'].get('namespace') == namespace)
+                and _matches(obj, query.get('labelSelector'), query.get('fieldSelector'))
+            ]
+            resource_version = self.resource_version
+        return 200, {
+            'kind': kind,
+            'apiVersion': group.split('/', 2)[-1] if group != '/api/v1' else 'v1',
+            'metadata': {'resourceVersion': str(resource_version)},
+            'items': items
+        }
+
+    def _route(self, path):
+        # Returns (None, (resource, namespace, namespaced)) or (404, Status)
+        parts = path.strip('/').split('/')
+        group = '/' + '/'.join(parts[:2] if parts[0] == 'api' else parts[:3])
+        rest = parts[2:] if parts[0] == 'api' else parts[3:]
+        namespace = None
+        if len(rest) >= 3 and rest[0] == 'namespaces':
+            namespace, rest = rest[1], rest[2:]
+        if len(rest) != 1 or rest[0] not in RESOURCE_PATHS or RESOURCE_PATHS[rest[0]][0] != group:
+            return 404, self._status(404, 'NotFound', 'the server could not find the requested resource')
+        return None, (rest[0], namespace, RESOURCE_PATHS[rest[0]][2])
+
+    def _status(self, code, reason, message):
+        return {'kind': 'Status', 'apiVersion': 'v1', 'status': 'Failure', 'reason': reason, 'message': message, 'code': code}
+
+
+if __name__ == '__main__':
+    server = FakeKubeApiServer(port=0)
+    print(server.kubeconfig())
+    print(f"☸️ Fake Kubernetes API serving sample objects on {server.url}")
+    server.httpd.serve_forever()
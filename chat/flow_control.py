@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+from .metrics import metrics
+
+
+class OutputFlowControl:
+    """Per-connection flow control for terminal output.
+
+    Output waiting to be sent, plus output sent but not yet acknowledged when
+    the client sends acknowledgements, counts against a high watermark. Above
+    it, reading from the exec socket pauses until the backlog drains below the
+    low watermark, so the process in the container blocks instead of memory
+    growing. Clients that do not acknowledge are protected by a runaway policy
+    that drops output above a byte rate and summarises what was dropped.
+    """
+
+    def __init__(self, high_watermark, low_watermark, runaway_bytes_per_sec=0, ack_mode=False):
+        self.high_watermark = high_watermark
+        self.low_watermark = min(low_watermark, high_watermark)
+        self.runaway_bytes_per_sec = runaway_bytes_per_sec
+        self.ack_mode = ack_mode
+        self.buffered = 0
+        self.unacked = 0
+        self.dropped_pending = 0
+        self._window_start = time.monotonic()
+        self._window_bytes = 0
+        self._paused_at = None
+        self._writable = asyncio.Event()
+        self._writable.set()
+        self.stats = {
+            'bytes_read': 0,
+            'bytes_sent': 0,
+            'bytes_acked': 0,
+            'bytes_dropped': 0,
+            'frames_sent': 0,
+            'pauses': 0,
+            'paused_seconds': 0.0,
+            'drop_summaries': 0
+        }
+
+    @property
+    def backlog(self):
+        return self.buffered + (self.unacked if self.ack_mode else 0)
+
+    @property
+    def paused(self):
+        return not self._writable.is_set()
+
+    async def wait_writable(self):
+        """Wait until the backlog is small enough to read more output"""
+        await self._writable.wait()
+
+    def admit(self, size):
+        """Account for ``size`` bytes read; return False if they should be dropped"""
+        self.stats['bytes_read'] += size
+        if self.ack_mode or not self.runaway_bytes_per_sec:
+            return True
+
+        now = time.monotonic()
+        if now - self._window_start >= 1.0:
+            self._window_start = now
+            self._window_bytes = 0
+        self._window_bytes += size
+        if self._window_bytes <= self.runaway_bytes_per_sec:
+            return True
+
+        self.stats['bytes_dropped'] += size
+        self.dropped_pending += size
+        metrics.incr('terminal.bytes_dropped', size)
+        return False
+
+    def take_drop_summary(self):
+        """Return a notice for output dropped since the last one, once the rate is back under the limit"""
+        if not self.dropped_pending or self._window_bytes > self.runaway_bytes_per_sec:
+            return None
+        dropped, self.dropped_pending = self.dropped_pending, 0
+        self.stats['drop_summaries'] += 1
+        return f"\r\n[... {dropped} bytes of output dropped, output rate exceeded {self.runaway_bytes_per_sec} bytes/s ...]\r\n"
+
+    def on_buffered(self, size):
+        self.buffered += size
+        self._update()
+
+    def on_sent(self, size):
+        self.buffered -= size
+        self.stats['bytes_sent'] += size
+        self.stats['frames_sent'] += 1
+        if self.ack_mode:
+            self.unacked += size
+        self._update()
+
+    def on_ack(self, total_bytes):
+        """Handle a cumulative acknowledgement of consumed output bytes"""
+        acked = max(0, min(total_bytes, self.stats['bytes_sent']) - self.stats['bytes_acked'])
+        self.stats['bytes_acked'] += acked
+        self.unacked = max(0, self.unacked - acked)
+        self._update()
+
+    def snapshot(self):
+        stats = dict(self.stats)
+        if self._paused_at is not None:
+            stats['paused_seconds'] += time.monotonic() - self._paused_at
+        stats['paused_seconds'] = round(stats['paused_seconds'], 3)
+        stats.update({
+            'ack_mode': self.ack_mode,
+            'backlog': self.backlog,
+            'paused': self.paused
+        })
+        return stats
+
+    def _update(self):
+        backlog = self.backlog
+        if not self.paused and backlog > self.high_watermark:
+            self._writable.clear()
+            self._paused_at = time.monotonic()
+            self.stats['pauses'] += 1
+            metrics.incr('terminal.read_pauses')
+        elif self.paused and backlog <= self.low_watermark:
+            self.stats['paused_seconds'] += time.monotonic() - self._paused_at
+            self._paused_at = None
+            self._writable.set()
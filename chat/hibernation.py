@@ -0,0 +1,135 @@
+import threading
+
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import ChatSession
+from .metrics import metrics
+from .registry import session_registry
+from .reconciler import SESSION_CONTAINER_PREFIX, CLUSTER_CONTAINER_PREFIX
+
+
+class IdleReaper:
+    """Hibernate session containers that have been idle for a while.
+
+    Driven by ``ChatSession.last_activity`` (for a shared cluster container,
+    that of its most recently active session): containers idle for longer than
+    ``pause_after`` seconds are paused (memory stays, processes freeze), and
+    after ``stop_after`` seconds they are stopped (files stay). When more than
+    ``max_running`` containers run on the host, the least recently active ones
+    are paused as well. Sessions for which ``is_busy(session_id)`` is true,
+    e.g. with an open terminal in any worker, are left alone. Hibernated containers are
+    resumed on demand by ``KubernetesContainer.resume()``.
+    """
+
+    def __init__(self, docker_client_factory, pause_after, stop_after, max_running=0, interval=60, is_busy=None):
+        self.docker_client_factory = docker_client_factory
+        self.pause_after = pause_after
+        self.stop_after = stop_after
+        self.max_running = max_running
+        self.interval = interval
+        self.is_busy = is_busy or (lambda session_id: False)
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return self.pause_after > 0 or self.stop_after > 0 or self.max_running > 0
+
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="idle-reaper", daemon=True)
+        self._thread.start()
+        print(f"😴 Idle reaper started (pause after {self.pause_after}s, stop after {self.stop_after}s)")
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"❌ Idle reaper error: {e}")
+            finally:
+                connection.close()
+
+    def run_once(self):
+        """Pause or stop idle containers and enforce the running container cap"""
+        docker_client = self.docker_client_factory()
+        containers = self._containers(docker_client)
+        if not containers:
+            return
+
+        now = timezone.now()
+        running = []
+        busy = 0
+        for container, session_ids, last_activity in containers:
+            if any(self.is_busy(session_id) for session_id in session_ids):
+                busy += 1 if container.status == 'running' else 0
+                continue
+            idle = (now - last_activity).total_seconds()
+            if self.stop_after > 0 and idle >= self.stop_after:
+                self._hibernate(session_ids, container, 'stopped')
+            elif self.pause_after > 0 and idle >= self.pause_after and container.status == 'running':
+                self._hibernate(session_ids, container, 'paused')
+            elif container.status == 'running':
+                running.append((last_activity, container.name, session_ids, container))
+
+        metrics.set_gauge('hibernation.running_containers', len(running) + busy)
+        excess = len(running) + busy - self.max_running
+        if self.max_running > 0 and excess > 0:
+            running.sort(key=lambda item: item[:2])
+            for _, _, session_ids, container in running[:excess]:
+                self._hibernate(session_ids, container, 'paused')
+
+    def _containers(self, docker_client):
+        """``(container, session ids, last activity)`` for each running or paused terminal container.
+
+        A container shared by the sessions of a cluster is as recently active
+        as the most recently active of them.
+        """
+        by_session = {}
+        by_cluster = {}
+        for prefix, containers in ((SESSION_CONTAINER_PREFIX, by_session), (CLUSTER_CONTAINER_PREFIX, by_cluster)):
+            for container in docker_client.containers.list(filters={'name': prefix}):
+                if container.name.startswith(prefix) and container.status in ('running', 'paused'):
+                    containers[container.name[len(prefix):]] = container
+        if not by_session and not by_cluster:
+            return []
+
+        sessions = ChatSession.objects.filter(
+            Q(session_id__in=list(by_session))
+            | Q(cluster_id__in=[int(key) for key in by_cluster if key.isdigit()], is_active=True)
+        ).values_list('session_id', 'cluster_id', 'is_active', 'last_activity')
+        units = {}
+        for session_id, cluster_id, is_active, last_activity in sessions:
+            container = by_session.get(session_id) or (by_cluster.get(str(cluster_id)) if is_active else None)
+            if container is None:
+                continue
+            unit = units.setdefault(container.name, [container, [], last_activity])
+            unit[1].append(session_id)
+            unit[2] = max(unit[2], last_activity)
+        return [tuple(unit) for unit in units.values()]
+
+    def _hibernate(self, session_ids, container, state):
+        try:
+            if state == 'paused':
+                print(f"😴 Pausing idle container: {container.name}")
+                container.pause()
+            else:
+                print(f"😴 Stopping idle container: {container.name}")
+                if container.status == 'paused':
+                    container.unpause()
+                container.stop(timeout=5)
+            for session_id in session_ids:
+                session_registry.update_state(session_id, state)
+            metrics.incr(f'hibernation.{state}')
+        except Exception as e:
+            print(f"❌ Error hibernating container {container.name}: {e}")
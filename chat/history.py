@@ -0,0 +1,153 @@
+import atexit
+import base64
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ChatSession, CommandHistory
+from .metrics import metrics
+
+
+class HistorySink:
+    """Write-behind buffer for command history and session activity.
+
+    ``record()`` and ``touch()`` only append to memory, so requests do not wait
+    on the database. A background thread writes buffered history with one
+    ``bulk_create`` once ``batch_size`` records are pending or every
+    ``flush_interval`` seconds, and turns all activity bumps of a session in
+    that window into a single ``update()``. ``stop()`` flushes what is left, and
+    is called on shutdown.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=0.5, max_pending=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._records = []
+        self._activity = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._atexit_registered = False
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name="history-sink", daemon=True)
+            self._thread.start()
+            if not self._atexit_registered:
+                # The flusher is a daemon thread; don't lose the last batch on exit
+                atexit.register(self.stop)
+                self._atexit_registered = True
+
+    def stop(self):
+        """Stop the flusher and write everything still buffered"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def record(self, chat_session_id, command, output, exit_code):
+        """Buffer a history entry for the session with primary key ``chat_session_id``"""
+        now = timezone.now()
+        entry = CommandHistory(
+            chat_session_id=chat_session_id,
+            command=command,
+            output=output,
+            exit_code=exit_code,
+            timestamp=now
+        )
+        with self._lock:
+            self._records.append(entry)
+            self._activity[chat_session_id] = now
+            pending = len(self._records)
+        metrics.incr('history.buffered')
+        if self._thread is None:
+            # Callable from async code, so never write inline; start the flusher on first use
+            self.start()
+        if pending >= self.batch_size:
+            self._wakeup.set()
+
+    def touch(self, chat_session_id):
+        """Bump the session's last activity at the next flush"""
+        with self._lock:
+            self._activity[chat_session_id] = timezone.now()
+
+    def discard(self, chat_session_id):
+        """Drop unwritten history of the session, e.g. when its history is cleared"""
+        with self._lock:
+            self._records = [entry for entry in self._records if entry.chat_session_id != chat_session_id]
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                records, self._records = self._records, []
+                activity, self._activity = self._activity, {}
+            if not records and not activity:
+                return
+
+            start = time.monotonic()
+            try:
+                with transaction.atomic():
+                    CommandHistory.objects.bulk_create(records, batch_size=500)
+                    for chat_session_id, last_activity in activity.items():
+                        ChatSession.objects.filter(pk=chat_session_id).update(last_activity=last_activity)
+            except Exception as e:
+                print(f"❌ Error writing command history, will retry: {e}")
+                metrics.incr('history.flush_errors')
+                with self._lock:
+                    # Keep the oldest entries first and cap the backlog
+                    self._records = (records + self._records)[-self.max_pending:]
+                    for chat_session_id, last_activity in activity.items():
+                        self._activity.setdefault(chat_session_id, last_activity)
+                return
+
+            metrics.incr('history.flushed', len(records))
+            metrics.incr('history.activity_updates', len(activity))
+            metrics.observe('history.flush_seconds', time.monotonic() - start)
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                connection.close()
+
+
+def encode_cursor(entry):
+    """Opaque pagination cursor for a history entry: its position in (timestamp, id) order"""
+    raw = f"{entry.timestamp.isoformat()}|{entry.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of ``encode_cursor``; raises ``ValueError`` for a malformed cursor"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        timestamp, pk = raw.rsplit('|', 1)
+        parsed = parse_datetime(timestamp)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if parsed is None:
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return parsed, int(pk)
+
+
+# Process-wide write-behind sink for command history
+history_sink = HistorySink(
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL
+)
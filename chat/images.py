@@ -0,0 +1,176 @@
+import io
+import os
+import tarfile
+import threading
+import time
+
+import docker
+from django.conf import settings
+
+from .metrics import metrics
+from .docker_client import get_docker_client
+
+
+# Docker image name
+KUBECTL_IMAGE_NAME = "your-kubectl-image:latest"
+
+# Dockerfile used when no local build context or image tarball is configured
+KUBECTL_DOCKERFILE = """FROM alpine:3.18
+
+# Install tools + download both binaries in one layer
+RUN apk add --no-cache curl tar ca-certificates bash vim nano expect \\
+    && curl -sSL https://dl.k8s.io/release/$(curl -L -s https://dl.k8s.io/release/stable.txt)/bin/linux/amd64/kubectl \\
+       -o /usr/local/bin/kubectl \\
+    && chmod +x /usr/local/bin/kubectl \\
+    && curl -sSL https://github.com/GoogleCloudPlatform/kubectl-ai/releases/download/v0.0.18/kubectl-ai_Linux_x86_64.tar.gz \\
+       | tar -xz -C /usr/local/bin \\
+    && chmod +x /usr/local/bin/kubectl-ai
+
+# Create kube directory
+RUN mkdir -p /root/.kube
+
+# Set working directory
+WORKDIR /root
+
+# Set environment variables
+ENV TERM=xterm-256color
+ENV KUBECONFIG=/root/.kube/config
+
+# Keep container running
+CMD ["/bin/sh"]
+"""
+
+
+class ImageManager:
+    """Make sure the kubectl image exists without building it inside requests.
+
+    Image presence and id are cached after the first successful check. A missing
+    image is loaded from a ``docker save`` tarball or built from a local build
+    context when configured (both work offline), and otherwise built from the
+    embedded Dockerfile. Preparation runs in a background thread and concurrent
+    callers share a single attempt.
+    """
+
+    def __init__(self, image_name, tarball=None, build_context=None):
+        self.image_name = image_name
+        self.tarball = tarball
+        self.build_context = build_context
+        self.image_id = None
+        self.error = None
+        self._lock = threading.Lock()
+        self._attempt = None
+        metrics.set_gauge('image.ready', 0)
+
+    @property
+    def ready(self):
+        return self.image_id is not None
+
+    def start(self):
+        """Check for or prepare the image in the background"""
+        self._begin_attempt()
+
+    def ensure_ready(self, wait=0):
+        """Return True if the image is ready.
+
+        Starts a background preparation if needed and waits up to ``wait``
+        seconds for it (``None`` waits until it finishes).
+        """
+        if self.ready:
+            return True
+        attempt = self._begin_attempt()
+        if wait is None or wait > 0:
+            attempt.wait(wait)
+        return self.ready
+
+    def invalidate(self):
+        """Forget the cached image, e.g. after it was removed from the daemon"""
+        self.image_id = None
+        metrics.set_gauge('image.ready', 0)
+
+    def status(self):
+        return {
+            'image': self.image_name,
+            'ready': self.ready,
+            'image_id': self.image_id,
+            'preparing': self._attempt is not None and not self._attempt.is_set(),
+            'error': self.error
+        }
+
+    def _begin_attempt(self):
+        with self._lock:
+            if self._attempt is not None and not self._attempt.is_set():
+                return self._attempt
+            attempt = self._attempt = threading.Event()
+        threading.Thread(target=self._prepare, args=(attempt,), name="image-prepare", daemon=True).start()
+        return attempt
+
+    def _prepare(self, attempt):
+        start = time.monotonic()
+        try:
+            docker_client = get_docker_client()
+            try:
+                image = docker_client.images.get(self.image_name)
+                print(f"✅ Docker image {self.image_name} already exists")
+            except docker.errors.ImageNotFound:
+                metrics.incr('image.builds')
+                image = self._load_or_build(docker_client)
+                metrics.observe('image.build_seconds', time.monotonic() - start)
+            self.image_id = image.id
+            self.error = None
+            metrics.set_gauge('image.ready', 1)
+        except Exception as e:
+            print(f"❌ Error preparing Docker image {self.image_name}: {e}")
+            self.error = str(e)
+            metrics.incr('image.build_failures')
+        finally:
+            attempt.set()
+
+    def _load_or_build(self, docker_client):
+        if self.tarball and os.path.exists(self.tarball):
+            print(f"📦 Loading Docker image {self.image_name} from {self.tarball}...")
+            with open(self.tarball, 'rb') as f:
+                docker_client.images.load(f)
+            return docker_client.images.get(self.image_name)
+
+        if self.build_context and os.path.isdir(self.build_context):
+            print(f"🔨 Building Docker image {self.image_name} from {self.build_context}...")
+            image, build_logs = docker_client.images.build(
+                path=str(self.build_context),
+                tag=self.image_name,
+                rm=True
+            )
+        else:
+            print(f"🔨 Building Docker image {self.image_name}...")
+            image, build_logs = docker_client.images.build(
+                fileobj=self._dockerfile_archive(),
+                custom_context=True,
+                tag=self.image_name,
+                rm=True,
+                nocache=False
+            )
+
+        for log in build_logs:
+            if 'stream' in log:
+                print(f"🔨 {log['stream'].strip()}")
+        print(f"✅ Successfully built Docker image: {self.image_name}")
+        return image
+
+    @staticmethod
+    def _dockerfile_archive():
+        """Create a tar archive in memory with the Dockerfile"""
+        dockerfile_tar = io.BytesIO()
+        content = KUBECTL_DOCKERFILE.encode('utf-8')
+        with tarfile.open(fileobj=dockerfile_tar, mode='w') as tar:
+            dockerfile_info = tarfile.TarInfo(name='Dockerfile')
+            dockerfile_info.size = len(content)
+            tar.addfile(dockerfile_info, io.BytesIO(content))
+        dockerfile_tar.seek(0)
+        return dockerfile_tar
+
+
+# Process-wide image manager for the kubectl terminal image
+image_manager = ImageManager(
+    KUBECTL_IMAGE_NAME,
+    tarball=settings.KUBECTL_IMAGE_TARBALL,
+    build_context=settings.KUBECTL_IMAGE_BUILD_CONTEXT
+)
@@ -0,0 +1,302 @@
+import re
+import threading
+import time
+
+from kubernetes import watch as k8s_watch
+from kubernetes.client.rest import ApiException
+
+from .metrics import metrics
+
+
+# Equality-based label selectors (`app=web,tier==frontend`) are answered from the store
+LABEL_REQUIREMENT = re.compile(r'^([A-Za-z0-9][-A-Za-z0-9_./]*)==?([-A-Za-z0-9_.]*)$')
+
+# Upper bound on one watch request; the server ends it earlier with `timeoutSeconds`
+WATCH_TIMEOUT = 300
+
+# API servers send a watch bookmark about this often, so an open watch can be this quiet and still be current
+BOOKMARK_INTERVAL = 60
+
+# Backoff between failed list/watch attempts
+RETRY_MIN_SECONDS = 1.0
+RETRY_MAX_SECONDS = 30.0
+
+
+def parse_label_selector(selector):
+    """``{'key': 'value'}`` for an equality-based selector, None if the store can't evaluate it"""
+    labels = {}
+    for requirement in filter(None, (selector or '').split(',')):
+        match = LABEL_REQUIREMENT.match(requirement.strip())
+        if match is None:
+            return None
+        labels[match.group(1)] = match.group(2)
+    return labels
+
+
+class Store:
+    """Objects of one kind keyed by (namespace, name), indexed by namespace and by label.
+
+    Not thread-safe; the owning informer serializes access.
+    """
+
+    def __init__(self):
+        self._objects = {}
+        self._by_namespace = {}
+        self._by_label = {}
+
+    def __len__(self):
+        return len(self._objects)
+
+    def replace(self, items):
+        self._objects.clear()
+        self._by_namespace.clear()
+        self._by_label.clear()
+        for item in items:
+            self.upsert(item)
+
+    def upsert(self, obj):
+        key = (obj.metadata.namespace, obj.metadata.name)
+        if key in self._objects:
+            self._unindex(key, self._objects[key])
+        _compact(obj)
+        self._objects[key] = obj
+        self._by_namespace.setdefault(key[0], set()).add(key)
+        for label in (obj.metadata.labels or {}).items():
+            self._by_label.setdefault(label, set()).add(key)
+
+    def delete(self, obj):
+        key = (obj.metadata.namespace, obj.metadata.name)
+        if key in self._objects:
+            self._unindex(key, self._objects.pop(key))
+
+    def list(self, namespace=None, labels=None, names=None):
+        """Objects in ``namespace`` (None: all) carrying all ``labels``, sorted like the API returns them"""
+        if names:
+            keys = {(namespace, name) for name in names} & self._objects.keys()
+        elif namespace is not None:
+            keys = set(self._by_namespace.get(namespace, ()))
+        else:
+            keys = set(self._objects)
+        for label in (labels or {}).items():
+            keys &= self._by_label.get(label, set())
+        return [self._objects[key] for key in sorted(keys, key=lambda key: (key[0] or '', key[1]))]
+
+    def _unindex(self, key, obj):
+        self._by_namespace.get(key[0], set()).discard(key)
+        for label in (obj.metadata.labels or {}).items():
+            keys = self._by_label.get(label)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_label[label]
+
+
+def _compact(obj):
+    # Fields no printer reads but that often dominate an object's size
+    obj.metadata.managed_fields = None
+    annotations = obj.metadata.annotations
+    if annotations:
+        annotations.pop('kubectl.kubernetes.io/last-applied-configuration', None)
+
+
+class Informer:
+    """Keeps a ``Store`` of one resource kind in sync with the API server.
+
+    Lists everything once, then watches from the list's resourceVersion,
+    applying ADDED/MODIFIED/DELETED events as they arrive. An expired
+    resourceVersion (410 Gone) or a resync period elapsing triggers a fresh
+    list. ``staleness()`` is the seconds since the server last showed the
+    store to be current: the last list, event or bookmark, or the opening of
+    the current watch. An open watch is silent while nothing changes, so up to
+    ``BOOKMARK_INTERVAL`` seconds of silence on it don't count. A watch only
+    counts as ``connected`` once its first event or bookmark has arrived,
+    since an open stream alone says nothing about whether the server is
+    still there.
+    """
+
+    def __init__(self, resource, list_func, cache, resync_period=300):
+        # list_func: the API client's cluster-wide list call, e.g. ``CoreV1Api.list_pod_for_all_namespaces``
+        self.resource = resource
+        self.list_func = list_func
+        self.cache = cache
+        self.resync_period = resync_period
+        self.store = Store()
+        self.lock = threading.Lock()
+        self.resource_version = None
+        self.synced = False
+        self.connected = False
+        self.last_sync = 0.0
+        self.last_list = 0.0
+        # When the current watch was opened, None while none is open
+        self.watch_started = None
+        self._stopping = threading.Event()
+        self._watch = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._run, name=f"informer-{self.cache.name}-{self.resource}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._watch is not None:
+            self._watch.stop()
+
+    def staleness(self):
+        if not self.synced:
+            return float('inf')
+        watch_started = self.watch_started
+        if watch_started is None:
+            return time.monotonic() - self.last_sync
+        return max(0.0, time.monotonic() - max(self.last_sync, watch_started) - BOOKMARK_INTERVAL)
+
+    def list(self, namespace=None, labels=None, names=None):
+        with self.lock:
+            return self.store.list(namespace, labels, names)
+
+    def _run(self):
+        delay = RETRY_MIN_SECONDS
+        while not self._stopping.is_set():
+            try:
+                if self.resource_version is None or time.monotonic() - self.last_list >= self.resync_period:
+                    self._list()
+                self._watch_once()
+                delay = RETRY_MIN_SECONDS
+            except ApiException as e:
+                self.connected = False
+                if e.status == 410:
+                    # Our resourceVersion is too old to watch from; start over with a list
+                    metrics.incr('informers.relists')
+                    self.resource_version = None
+                    continue
+                if e.status == 403:
+                    # Credentials limited to some namespaces can't watch cluster-wide; leave reads to the API
+                    print(f"⚠️ Informer {self.cache.name}/{self.resource} not allowed to list and watch, disabling it")
+                    self.synced = False
+                    break
+                print(f"❌ Informer {self.cache.name}/{self.resource} failed: {e.status} {e.reason}")
+                metrics.incr('informers.errors')
+                self._stopping.wait(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+            except Exception as e:
+                self.connected = False
+                if self._stopping.is_set():
+                    break
+                print(f"❌ Informer {self.cache.name}/{self.resource} failed: {e}")
+                metrics.incr('informers.errors')
+                self._stopping.wait(delay)
+                delay = min(delay * 2, RETRY_MAX_SECONDS)
+            if self.cache.overflowed or self.cache.idle():
+                self.cache.stop()
+        self.connected = False
+
+    def _list(self):
+        result = self.list_func(_request_timeout=WATCH_TIMEOUT)
+        if self._stopping.is_set():
+            return
+        with self.lock:
+            self.store.replace(result.items)
+        self.resource_version = result.metadata.resource_version
+        self.synced = True
+        self.last_sync = self.last_list = time.monotonic()
+        metrics.incr('informers.lists')
+        self.cache.check_budget()
+
+    def _watch_once(self):
+        self._watch = k8s_watch.Watch()
+        timeout = int(min(self.resync_period, WATCH_TIMEOUT))
+        stream = self._watch.stream(
+            self.list_func,
+            resource_version=self.resource_version,
+            allow_watch_bookmarks=True,
+            timeout_seconds=timeout,
+            _request_timeout=timeout + 15
+        )
+        self.watch_started = time.monotonic()
+        try:
+            self._consume(stream)
+        finally:
+            self.watch_started = None
+
+    def _consume(self, stream):
+        for event in stream:
+            self.connected = True
+            if event['type'] == 'BOOKMARK':
+                self.resource_version = event['raw_object']['metadata']['resourceVersion']
+                self.last_sync = time.monotonic()
+                continue
+            obj = event['object']
+            with self.lock:
+                if event['type'] == 'DELETED':
+                    self.store.delete(obj)
+                else:
+                    self.store.upsert(obj)
+            self.resource_version = obj.metadata.resource_version
+            self.last_sync = time.monotonic()
+            metrics.incr('informers.events')
+            if event['type'] == 'ADDED' and not self.cache.check_budget():
+                break
+        self.connected = False
+
+
+class ClusterInformers:
+    """The informers of one cluster, sharing a budget of ``max_objects`` cached objects.
+
+    Informers start on first use and stop once the cluster has had no reads
+    for ``idle_timeout`` seconds, or for good when the objects no longer fit
+    the budget; reads then go to the API server again.
+    """
+
+    def __init__(self, name, list_funcs, max_objects=20000, resync_period=300, idle_timeout=900):
+        self.name = name
+        self.max_objects = max_objects
+        self.idle_timeout = idle_timeout
+        self.overflowed = False
+        self.stopped = False
+        self.last_used = time.monotonic()
+        self._lock = threading.Lock()
+        self.informers = {
+            resource: Informer(resource, list_func, self, resync_period)
+            for resource, list_func in list_funcs.items()
+        }
+        for informer in self.informers.values():
+            informer.start()
+        print(f"👀 Started informers for cluster {name}: {', '.join(self.informers)}")
+
+    def lister(self, resource, max_staleness):
+        """The informer for ``resource`` if its store is within ``max_staleness`` seconds of the server"""
+        self.last_used = time.monotonic()
+        informer = self.informers.get(resource)
+        if informer is None or self.stopped or self.overflowed or informer.staleness() > max_staleness:
+            return None
+        return informer
+
+    def idle(self):
+        return time.monotonic() - self.last_used > self.idle_timeout
+
+    def check_budget(self):
+        """False (and informers stopping) once the cached objects exceed the budget"""
+        total = sum(len(informer.store) for informer in self.informers.values())
+        metrics.set_gauge(f'informers.objects.{self.name}', total)
+        with self._lock:
+            if total <= self.max_objects or self.overflowed:
+                return not self.overflowed
+            self.overflowed = True
+        print(f"⚠️ Cluster {self.name} has more than {self.max_objects} objects, not caching it")
+        metrics.incr('informers.overflows')
+        self.stop()
+        return False
+
+    def stop(self):
+        with self._lock:
+            if self.stopped:
+                return
+            self.stopped = True
+        for informer in self.informers.values():
+            informer.stop()
+            with informer.lock:
+                informer.store.replace([])
+        metrics.set_gauge(f'informers.objects.{self.name}', 0)
+        print(f"👀 Stopped informers for cluster {self.name}")
@@ -0,0 +1,251 @@
+import asyncio
+import codecs
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+
+from .models import CommandJob
+from .metrics import metrics
+from .history import history_sink
+from .command_cache import command_cache, is_mutating
+from .scheduler import JOB_LANE, SchedulerFull
+from .registry import session_registry
+
+
+# Job states after which nothing changes any more
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled', 'timed_out')
+
+# Output stored with the command history entry; the full output stays in the job's log
+HISTORY_OUTPUT_LIMIT = 1024 * 1024
+
+# Seconds between output size updates, and between session activity updates, while a job runs
+PROGRESS_INTERVAL = 1.0
+ACTIVITY_INTERVAL = 30.0
+
+# Seconds a job's attachment on its session outlives the job's deadline, in case its worker dies
+ATTACHMENT_GRACE = 60
+
+# Runs the command under `timeout` and leaves its pid behind so any worker can cancel it
+JOB_WRAPPER = 'echo $$ > "$JOB_PID_FILE"; exec timeout "$JOB_DEADLINE" /bin/sh -c "$JOB_COMMAND"'
+
+
+def job_output_path(job_id):
+    return os.path.join(settings.JOB_OUTPUT_DIR, f"{job_id}.log")
+
+
+def job_pid_file(job_id):
+    return f"/tmp/k8s-ai-job-{job_id}.pid"
+
+
+def read_job_output(job_id, offset=0, limit=65536, final=False):
+    """Read up to ``limit`` bytes of a job's output starting at byte ``offset``.
+
+    Returns ``(text, next_offset)``. A multi-byte character cut off at the end
+    is left for the next read unless ``final`` is set (the job has finished).
+    """
+    try:
+        with open(job_output_path(job_id), 'rb') as f:
+            f.seek(offset)
+            data = f.read(limit)
+    except FileNotFoundError:
+        return '', offset
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    if final and len(data) < limit:
+        return decoder.decode(data, final=True), offset + len(data)
+    text = decoder.decode(data)
+    pending = len(decoder.getstate()[0])
+    return text, offset + len(data) - pending
+
+
+def serialize_job(job):
+    return {
+        'job_id': job.job_id,
+        'command': job.command,
+        'status': job.status,
+        'exit_code': job.exit_code,
+        'deadline': job.deadline,
+        'output_size': job.output_size,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+class JobRunner:
+    """Run long commands in session containers in the background.
+
+    Jobs are rows in the CommandJob table, so any worker can report on or
+    cancel them. Each job gets its own ``docker exec`` running under
+    ``timeout`` with the job's deadline, on a bounded pool of ``max_workers``
+    threads. With a ``scheduler``, a job waits for an exec slot in its
+    session's job lane first, so jobs count against the exec limits without
+    holding up the session's interactive commands. Output is appended to
+    ``JOB_OUTPUT_DIR/<job_id>.log`` as it arrives, and finished jobs are
+    written to the command history.
+    """
+
+    def __init__(self, max_workers=8, scheduler=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self.scheduler = scheduler
+        os.makedirs(settings.JOB_OUTPUT_DIR, exist_ok=True)
+
+    def submit(self, job_id, container_manager):
+        """Queue a job; called on the event loop, which then grants the job its exec slot"""
+        metrics.incr('jobs.submitted')
+        self.executor.submit(self._run, job_id, container_manager, asyncio.get_running_loop())
+
+    def cancel(self, job, container):
+        """Request cancellation of ``job``; a running command is killed in the container"""
+        CommandJob.objects.filter(pk=job.pk).update(cancel_requested=True)
+        if job.status != 'running' or container is None:
+            return
+        pid_file = job_pid_file(job.job_id)
+        container.exec_run(
+            cmd=['/bin/sh', '-c', f'pid=$(cat {pid_file}) && pkill -TERM -P "$pid"; kill -TERM "$pid"'],
+        )
+        metrics.incr('jobs.cancel_requests')
+
+    def recover(self):
+        """Fail jobs left queued or running by a worker on this host that has exited"""
+        host = socket.gethostname()
+        for job in CommandJob.objects.filter(status__in=['queued', 'running'], owner__startswith=f"{host}:"):
+            pid = int(job.owner.rsplit(':', 1)[1])
+            try:
+                os.kill(pid, 0)
+                continue
+            except ProcessLookupError:
+                pass
+            except PermissionError:
+                continue
+            print(f"🧹 Failing job {job.job_id} left behind by exited worker {job.owner}")
+            self._finish(job, 'failed', None, error='The worker running this job exited')
+
+    def _run(self, job_id, container_manager, loop):
+        job = None
+        ticket = None
+        try:
+            job = CommandJob.objects.select_related('chat_session').get(job_id=job_id)
+            if self.scheduler is not None:
+                try:
+                    ticket = self.scheduler.acquire_threadsafe(
+                        loop, JOB_LANE.format(session_id=job.chat_session.session_id)
+                    )
+                except SchedulerFull as e:
+                    self._finish(job, 'failed', None, error=f'Too many queued jobs: {e}')
+                    return
+                job.refresh_from_db(fields=['cancel_requested'])
+            if job.cancel_requested:
+                self._finish(job, 'cancelled', None)
+                return
+            if not container_manager.ensure_running():
+                self._finish(job, 'failed', None, error='Container is not running')
+                return
+
+            # Keeps the idle reaper of every worker away from the container while the job runs
+            session_registry.attach(job.chat_session.session_id, f"job:{job.job_id}", job.deadline + ATTACHMENT_GRACE)
+            job.status = 'running'
+            job.started_at = timezone.now()
+            CommandJob.objects.filter(pk=job.pk).update(status='running', started_at=job.started_at)
+            exit_code, elapsed = self._execute(job, container_manager)
+            container_manager.note_kube_config_change(job.command)
+
+            job.refresh_from_db(fields=['cancel_requested', 'output_size'])
+            if job.cancel_requested:
+                status = 'cancelled'
+            elif exit_code == 124 or elapsed >= job.deadline:
+                status = 'timed_out'
+            else:
+                status = 'succeeded' if exit_code == 0 else 'failed'
+            self._finish(job, status, exit_code)
+        except Exception as e:
+            print(f"❌ Error running job {job_id}: {e}")
+            if job is not None:
+                self._finish(job, 'failed', None, error=str(e))
+        finally:
+            if ticket is not None:
+                self.scheduler.release_threadsafe(loop, ticket)
+            if job is not None:
+                session_registry.detach(job.chat_session.session_id, f"job:{job.job_id}")
+            connection.close()
+
+    def _execute(self, job, container_manager):
+        api = container_manager.docker_client.api
+        shell = container_manager.shell
+        exec_id = api.exec_create(
+            container_manager.container.id,
+            cmd=['/bin/sh', '-c', JOB_WRAPPER],
+            environment={
+                'JOB_COMMAND': job.command,
+                'JOB_DEADLINE': str(job.deadline),
+                'JOB_PID_FILE': job_pid_file(job.job_id),
+                'KUBECONFIG': '/root/.kube/config',
+                'GEMINI_API_KEY': os.getenv('GEMINI_API_KEY', '')
+            },
+            stdout=True,
+            stderr=True,
+            stdin=False,
+            tty=False,
+            workdir=shell.cwd if shell is not None else container_manager.workdir
+        )['Id']
+
+        start = time.monotonic()
+        size = 0
+        dropped = 0
+        last_progress = last_activity = start
+        with open(job_output_path(job.job_id), 'ab') as f:
+            for chunk in api.exec_start(exec_id, stream=True):
+                if size + len(chunk) > settings.JOB_MAX_OUTPUT_BYTES:
+                    dropped += len(chunk)
+                    continue
+                f.write(chunk)
+                f.flush()
+                size += len(chunk)
+
+                now = time.monotonic()
+                if now - last_progress >= PROGRESS_INTERVAL:
+                    last_progress = now
+                    CommandJob.objects.filter(pk=job.pk).update(output_size=size)
+                if now - last_activity >= ACTIVITY_INTERVAL:
+                    last_activity = now
+                    history_sink.touch(job.chat_session_id)
+
+            if dropped:
+                note = f"\n[... {dropped} bytes of output dropped, job output is limited to {settings.JOB_MAX_OUTPUT_BYTES} bytes ...]\n"
+                f.write(note.encode('utf-8'))
+                size += len(note.encode('utf-8'))
+
+        CommandJob.objects.filter(pk=job.pk).update(output_size=size)
+        elapsed = time.monotonic() - start
+        metrics.observe('jobs.run_seconds', elapsed)
+        return api.exec_inspect(exec_id)['ExitCode'], elapsed
+
+    def _finish(self, job, status, exit_code, error=''):
+        output, _ = read_job_output(job.job_id, 0, HISTORY_OUTPUT_LIMIT, final=True)
+        size = os.path.getsize(job_output_path(job.job_id)) if os.path.exists(job_output_path(job.job_id)) else 0
+        if size > HISTORY_OUTPUT_LIMIT:
+            output += f"\n[... output truncated, {size} bytes in total; fetch the job output for the rest ...]"
+        if error:
+            output = f"{output}\n❌ {error}" if output else f"❌ {error}"
+        if status == 'timed_out':
+            output += f"\n⏱️ Job timed out after {job.deadline} seconds"
+
+        CommandJob.objects.filter(pk=job.pk).update(
+            status=status,
+            exit_code=exit_code,
+            output_size=size,
+            error=error,
+            finished_at=timezone.now()
+        )
+        history_sink.record(job.chat_session_id, job.command, output, exit_code if exit_code is not None else 1)
+        if is_mutating(job.command):
+            # A job in a container that may have switched context can have changed any cluster
+            switched = session_registry.kube_config_changed(job.chat_session.session_id)
+            command_cache.invalidate(None if switched else job.chat_session.cluster_id)
+        metrics.incr(f'jobs.{status}')
+        print(f"📋 Job {job.job_id} {status} (exit code {exit_code})")
@@ -0,0 +1,681 @@
+import json
+import shlex
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+import yaml
+from kubernetes import client as k8s_client, config as k8s_config
+from kubernetes.client.rest import ApiException
+
+from .informers import ClusterInformers, parse_label_selector
+from .kubeconfig import kubeconfig_digest
+from .metrics import metrics
+
+
+# Commands with any of these go to a real shell
+SHELL_CHARACTERS = set('|&;<>$`\\(){}*?~!#')
+
+
+def _pods(api, namespace, **kwargs):
+    if namespace is None:
+        return api.core.list_pod_for_all_namespaces(**kwargs)
+    return api.core.list_namespaced_pod(namespace, **kwargs)
+
+
+def _services(api, namespace, **kwargs):
+    if namespace is None:
+        return api.core.list_service_for_all_namespaces(**kwargs)
+    return api.core.list_namespaced_service(namespace, **kwargs)
+
+
+def _deployments(api, namespace, **kwargs):
+    if namespace is None:
+        return api.apps.list_deployment_for_all_namespaces(**kwargs)
+    return api.apps.list_namespaced_deployment(namespace, **kwargs)
+
+
+def _events(api, namespace, **kwargs):
+    if namespace is None:
+        return api.core.list_event_for_all_namespaces(**kwargs)
+    return api.core.list_namespaced_event(namespace, **kwargs)
+
+
+def _nodes(api, namespace, **kwargs):
+    return api.core.list_node(**kwargs)
+
+
+def human_duration(seconds):
+    """Age the way kubectl prints it (``duration.HumanDuration``)"""
+    seconds = int(seconds)
+    if seconds < -1:
+        return '<invalid>'
+    if seconds < 0:
+        return '0s'
+    if seconds < 60 * 2:
+        return f'{seconds}s'
+    minutes = seconds // 60
+    if minutes < 10:
+        return f'{minutes}m{seconds % 60}s' if seconds % 60 else f'{minutes}m'
+    if minutes < 60 * 3:
+        return f'{minutes}m'
+    hours = seconds // 3600
+    if hours < 8:
+        return f'{hours}h{minutes % 60}m' if minutes % 60 else f'{hours}h'
+    if hours < 48:
+        return f'{hours}h'
+    if hours < 24 * 8:
+        return f'{hours // 24}d{hours % 24}h' if hours % 24 else f'{hours // 24}d'
+    if hours < 24 * 365 * 2:
+        return f'{hours // 24}d'
+    if hours < 24 * 365 * 8:
+        days = (hours // 24) % 365
+        return f'{hours // 24 // 365}y{days}d' if days else f'{hours // 24 // 365}y'
+    return f'{hours // 24 // 365}y'
+
+
+def _age(timestamp, now):
+    if timestamp is None:
+        return '<unknown>'
+    return human_duration((now - timestamp).total_seconds())
+
+
+def _format_labels(labels):
+    return ','.join(f'{key}={value}' for key, value in sorted((labels or {}).items())) or '<none>'
+
+
+def _pod_status(pod):
+    # Mirrors kubectl's printPod: the most relevant container state wins over the phase
+    reason = pod.status.reason or pod.status.phase or 'Unknown'
+    initializing = False
+    init_statuses = pod.status.init_container_statuses or []
+    for i, status in enumerate(init_statuses):
+        state = status.state
+        if state.terminated is not None and state.terminated.exit_code == 0:
+            continue
+        if state.terminated is not None:
+            if state.terminated.reason:
+                reason = f'Init:{state.terminated.reason}'
+            elif state.terminated.signal:
+                reason = f'Init:Signal:{state.terminated.signal}'
+            else:
+                reason = f'Init:ExitCode:{state.terminated.exit_code}'
+        elif state.waiting is not None and state.waiting.reason and state.waiting.reason != 'PodInitializing':
+            reason = f'Init:{state.waiting.reason}'
+        else:
+            reason = f'Init:{i}/{len(pod.spec.init_containers or [])}'
+        initializing = True
+        break
+
+    if not initializing:
+        has_running = False
+        for status in reversed(pod.status.container_statuses or []):
+            state = status.state
+            if state.waiting is not None and state.waiting.reason:
+                reason = state.waiting.reason
+            elif state.terminated is not None and state.terminated.reason:
+                reason = state.terminated.reason
+            elif state.terminated is not None:
+                if state.terminated.signal:
+                    reason = f'Signal:{state.terminated.signal}'
+                else:
+                    reason = f'ExitCode:{state.terminated.exit_code}'
+            elif state.running is not None and status.ready:
+                has_running = True
+        if reason == 'Completed' and has_running:
+            reason = 'Running'
+
+    if pod.metadata.deletion_timestamp is not None:
+        reason = 'Unknown' if pod.status.reason == 'NodeLost' else 'Terminating'
+    return reason
+
+
+def _pod_restarts(pod, now):
+    restarts = 0
+    last_restart = None
+    for status in pod.status.container_statuses or []:
+        restarts += status.restart_count or 0
+        terminated = status.last_state.terminated if status.last_state else None
+        if terminated is not None and terminated.finished_at is not None:
+            if last_restart is None or terminated.finished_at > last_restart:
+                last_restart = terminated.finished_at
+    if restarts and last_restart is not None:
+        return f'{restarts} ({_age(last_restart, now)} ago)'
+    return str(restarts)
+
+
+def _pod_row(pod, now, wide):
+    statuses = pod.status.container_statuses or []
+    row = [
+        pod.metadata.name,
+        f'{sum(1 for status in statuses if status.ready)}/{len(pod.spec.containers)}',
+        _pod_status(pod),
+        _pod_restarts(pod, now),
+        _age(pod.metadata.creation_timestamp, now)
+    ]
+    if wide:
+        gates = pod.spec.readiness_gates or []
+        if gates:
+            conditions = {condition.type: condition.status for condition in pod.status.conditions or []}
+            ready_gates = sum(1 for gate in gates if conditions.get(gate.condition_type) == 'True')
+            gates_column = f'{ready_gates}/{len(gates)}'
+        else:
+            gates_column = '<none>'
+        row += [
+            pod.status.pod_ip or '<none>',
+            pod.spec.node_name or '<none>',
+            pod.status.nominated_node_name or '<none>',
+            gates_column
+        ]
+    return row
+
+
+def _node_row(node, now, wide):
+    conditions = {condition.type: condition.status for condition in node.status.conditions or []}
+    status = {'True': 'Ready', 'False': 'NotReady'}.get(conditions.get('Ready'), 'Unknown')
+    if node.spec.unschedulable:
+        status += ',SchedulingDisabled'
+    roles = sorted(
+        label.split('/', 1)[1] for label in (node.metadata.labels or {})
+        if label.startswith('node-role.kubernetes.io/') and label.split('/', 1)[1]
+    )
+    info = node.status.node_info
+    row = [
+        node.metadata.name,
+        status,
+        ','.join(roles) or '<none>',
+        _age(node.metadata.creation_timestamp, now),
+        info.kubelet_version if info else ''
+    ]
+    if wide:
+        addresses = node.status.addresses or []
+        internal = [address.address for address in addresses if address.type == 'InternalIP']
+        external = [address.address for address in addresses if address.type == 'ExternalIP']
+        row += [
+            internal[0] if internal else '<none>',
+            external[0] if external else '<none>',
+            info.os_image if info else '<unknown>',
+            info.kernel_version if info else '<unknown>',
+            info.container_runtime_version if info else '<unknown>'
+        ]
+    return row
+
+
+def _service_external_ip(service):
+    spec = service.spec
+    if spec.type == 'ExternalName':
+        return spec.external_name or '<none>'
+    if spec.type == 'LoadBalancer':
+        ingress = (service.status.load_balancer.ingress or []) if service.status and service.status.load_balancer else []
+        addresses = [entry.ip or entry.hostname for entry in ingress if entry.ip or entry.hostname]
+        addresses += spec.external_i_ps or []
+        return ','.join(addresses) or '<pending>'
+    return ','.join(spec.external_i_ps or []) or '<none>'
+
+
+def _service_row(service, now, wide):
+    ports = [
+        f'{port.port}:{port.node_port}/{port.protocol}' if port.node_port else f'{port.port}/{port.protocol}'
+        for port in service.spec.ports or []
+    ]
+    row = [
+        service.metadata.name,
+        service.spec.type,
+        service.spec.cluster_ip or '<none>',
+        _service_external_ip(service),
+        ','.join(ports) or '<none>',
+        _age(service.metadata.creation_timestamp, now)
+    ]
+    if wide:
+        row.append(_format_labels(service.spec.selector))
+    return row
+
+
+def _format_selector(selector):
+    if selector is None:
+        return '<none>'
+    parts = [f'{key}={value}' for key, value in sorted((selector.match_labels or {}).items())]
+    for expression in selector.match_expressions or []:
+        if expression.operator in ('In', 'NotIn'):
+            parts.append(f"{expression.key} {expression.operator.lower()} ({','.join(expression.values or [])})")
+        elif expression.operator == 'Exists':
+            parts.append(expression.key)
+        else:
+            parts.append(f'!{expression.key}')
+    return ','.join(parts) or '<none>'
+
+
+def _deployment_row(deployment, now, wide):
+    status = deployment.status
+    replicas = deployment.spec.replicas if deployment.spec.replicas is not None else 1
+    row = [
+        deployment.metadata.name,
+        f'{status.ready_replicas or 0}/{replicas}',
+        str(status.updated_replicas or 0),
+        str(status.available_replicas or 0),
+        _age(deployment.metadata.creation_timestamp, now)
+    ]
+    if wide:
+        containers = deployment.spec.template.spec.containers
+        row += [
+            ','.join(container.name for container in containers),
+            ','.join(container.image or '' for container in containers),
+            _format_selector(deployment.spec.selector)
+        ]
+    return row
+
+
+def _event_row(event, now, wide):
+    last_seen = event.last_timestamp or event.event_time or event.metadata.creation_timestamp
+    first_seen = event.first_timestamp or event.event_time or event.metadata.creation_timestamp
+    count = event.count or 0
+    if event.series is not None and event.series.count:
+        count = event.series.count
+        last_seen = event.series.last_observed_time or last_seen
+    last_seen_column = _age(last_seen, now)
+    if count > 1:
+        last_seen_column = f'{last_seen_column} (x{count} over {_age(first_seen, now)})'
+    involved = event.involved_object
+    row = [
+        last_seen_column,
+        event.type or '',
+        event.reason or '',
+        f'{(involved.kind or "").lower()}/{involved.name}',
+        (event.message or '').strip()
+    ]
+    if wide:
+        source = event.source
+        component = source.component if source and source.component else (event.reporting_component or '')
+        host = source.host if source and source.host else ''
+        row[4:4] = [involved.field_path or '', ', '.join(part for part in (component, host) if part)]
+        row += [_age(first_seen, now), str(count), event.metadata.name]
+    return row
+
+
+# Resources served from the API: aliases, list call, `-o name` prefix, table columns and `-o wide` columns
+RESOURCES = {
+    'pods': {
+        'aliases': ('po', 'pod', 'pods'),
+        'namespaced': True,
+        'list': _pods,
+        'kind': 'pod',
+        'plural': 'pods',
+        'columns': ['NAME', 'READY', 'STATUS', 'RESTARTS', 'AGE'],
+        'wide_columns': ['NAME', 'READY', 'STATUS', 'RESTARTS', 'AGE', 'IP', 'NODE', 'NOMINATED NODE', 'READINESS GATES'],
+        'row': _pod_row
+    },
+    'nodes': {
+        'aliases': ('no', 'node', 'nodes'),
+        'namespaced': False,
+        'list': _nodes,
+        'kind': 'node',
+        'plural': 'nodes',
+        'columns': ['NAME', 'STATUS', 'ROLES', 'AGE', 'VERSION'],
+        'wide_columns': ['NAME', 'STATUS', 'ROLES', 'AGE', 'VERSION', 'INTERNAL-IP', 'EXTERNAL-IP', 'OS-IMAGE', 'KERNEL-VERSION', 'CONTAINER-RUNTIME'],
+        'row': _node_row
+    },
+    'services': {
+        'aliases': ('svc', 'service', 'services'),
+        'namespaced': True,
+        'list': _services,
+        'kind': 'service',
+        'plural': 'services',
+        'columns': ['NAME', 'TYPE', 'CLUSTER-IP', 'EXTERNAL-IP', 'PORT(S)', 'AGE'],
+        'wide_columns': ['NAME', 'TYPE', 'CLUSTER-IP', 'EXTERNAL-IP', 'PORT(S)', 'AGE', 'SELECTOR'],
+        'row': _service_row
+    },
+    'deployments': {
+        'aliases': ('deploy', 'deployment', 'deployments', 'deployment.apps', 'deployments.apps'),
+        'namespaced': True,
+        'list': _deployments,
+        'kind': 'deployment.apps',
+        'plural': 'deployments.apps',
+        'columns': ['NAME', 'READY', 'UP-TO-DATE', 'AVAILABLE', 'AGE'],
+        'wide_columns': ['NAME', 'READY', 'UP-TO-DATE', 'AVAILABLE', 'AGE', 'CONTAINERS', 'IMAGES', 'SELECTOR'],
+        'row': _deployment_row
+    },
+    'events': {
+        'aliases': ('ev', 'event', 'events'),
+        'namespaced': True,
+        'list': _events,
+        'kind': 'event',
+        'plural': 'events',
+        'columns': ['LAST SEEN', 'TYPE', 'REASON', 'OBJECT', 'MESSAGE'],
+        'wide_columns': ['LAST SEEN', 'TYPE', 'REASON', 'OBJECT', 'SUBOBJECT', 'SOURCE', 'MESSAGE', 'FIRST SEEN', 'COUNT', 'NAME'],
+        'row': _event_row
+    }
+}
+
+RESOURCE_ALIASES = {alias: resource for resource, spec in RESOURCES.items() for alias in spec['aliases']}
+
+# Resources kept in informer caches, with the cluster-wide list call watched for each; events churn too much
+INFORMER_RESOURCES = {
+    'pods': ('core', 'list_pod_for_all_namespaces'),
+    'nodes': ('core', 'list_node'),
+    'services': ('core', 'list_service_for_all_namespaces'),
+    'deployments': ('apps', 'list_deployment_for_all_namespaces')
+}
+
+
+def parse_read_command(command):
+    """Parse a ``kubectl get`` the API fast path can answer.
+
+    Returns ``{'resource', 'names', 'namespace', 'all_namespaces', 'output',
+    'selector', 'no_headers'}``, or None for anything else (other verbs and
+    resources, unknown flags, shell syntax), which then runs in the container.
+    """
+    if SHELL_CHARACTERS & set(command):
+        return None
+    try:
+        args = shlex.split(command)
+    except ValueError:
+        return None
+    if len(args) < 3 or args[0] != 'kubectl' or args[1] != 'get':
+        return None
+
+    parsed = {
+        'resource': None,
+        'names': [],
+        'namespace': None,
+        'all_namespaces': False,
+        'output': '',
+        'selector': None,
+        'no_headers': False
+    }
+    # Flags taking a value, in their short and long spellings
+    valued = {'-n': 'namespace', '--namespace': 'namespace', '-o': 'output', '--output': 'output',
+              '-l': 'selector', '--selector': 'selector'}
+    args = args[2:]
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ('-A', '--all-namespaces'):
+            parsed['all_namespaces'] = True
+        elif arg == '--no-headers':
+            parsed['no_headers'] = True
+        elif arg in valued:
+            if i + 1 >= len(args):
+                return None
+            parsed[valued[arg]] = args[i + 1]
+            i += 1
+        elif arg.startswith('--') and '=' in arg and arg.split('=', 1)[0] in valued:
+            flag, value = arg.split('=', 1)
+            parsed[valued[flag]] = value
+        elif arg[:2] in ('-n', '-o', '-l') and len(arg) > 2:
+            parsed[valued[arg[:2]]] = arg[2:].lstrip('=')
+        elif arg.startswith('-'):
+            return None
+        elif parsed['resource'] is None:
+            resource, _, name = arg.partition('/')
+            if resource not in RESOURCE_ALIASES or ',' in resource:
+                return None
+            parsed['resource'] = RESOURCE_ALIASES[resource]
+            if name:
+                parsed['names'].append(name)
+        else:
+            if '/' in arg:
+                return None
+            parsed['names'].append(arg)
+        i += 1
+
+    if parsed['resource'] is None or parsed['output'] not in ('', 'wide', 'name'):
+        return None
+    if parsed['names'] and (parsed['selector'] or parsed['all_namespaces']):
+        return None
+    return parsed
+
+
+# Kubeconfig fields that make the client run programs or read files on the host that loads it.
+# Kubeconfigs using them are left to the sandboxed container; so is any field ending in `-file`/`File`.
+UNSAFE_KUBECONFIG_FIELDS = {
+    'exec', 'auth-provider', 'tokenFile', 'token-file', 'certificate-authority', 'client-certificate', 'client-key'
+}
+
+
+def unsafe_kubeconfig_fields(kubeconfig):
+    """Sorted names of the fields that keep ``kubeconfig`` (a parsed dict) from being loaded in-process"""
+    found = set()
+
+    def walk(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                key = str(key)
+                if key in UNSAFE_KUBECONFIG_FIELDS or key.endswith(('-file', 'File')):
+                    found.add(key)
+                walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+
+    walk(kubeconfig)
+    return sorted(found)
+
+
+def render_table(rows, no_headers=False):
+    """Align rows like kubectl's tabwriter: each column is its widest cell plus 3 spaces of padding"""
+    if not rows:
+        return ''
+    rows = rows[1:] if no_headers else rows
+    widths = [0] * max(len(row) for row in rows)
+    for row in rows:
+        for i, cell in enumerate(row[:-1]):
+            widths[i] = max(widths[i], len(cell) + 3)
+    return ''.join(
+        ''.join(cell.ljust(widths[i]) for i, cell in enumerate(row[:-1])) + row[-1] + '\n'
+        for row in rows
+    )
+
+
+class _ClusterApi:
+    def __init__(self, name, digest, api_client=None, default_namespace='default'):
+        # No api_client: the kubeconfig can't be used in-process, don't retry until it changes
+        self.name = name
+        self.digest = digest
+        self.api_client = api_client
+        self.default_namespace = default_namespace
+        self.informers = None
+        if api_client is not None:
+            self.core = k8s_client.CoreV1Api(api_client)
+            self.apps = k8s_client.AppsV1Api(api_client)
+
+
+class KubeApiPool:
+    """Serve read-only ``kubectl get`` commands straight from the Kubernetes API.
+
+    Each cluster gets one ``ApiClient`` (and its urllib3 connection pool of
+    ``pool_size`` connections), built from the stored kubeconfig and rebuilt
+    when the kubeconfig changes. ``run()`` answers ``kubectl get`` of pods,
+    nodes, services, deployments and events with kubectl's table output; it
+    returns None for everything else and whenever the API cannot be reached
+    from here (network errors), and the command then runs in the session
+    container as before. Kubeconfigs with exec or auth-provider plugins, or
+    that reference files, are never loaded in-process: see
+    ``unsafe_kubeconfig_fields``.
+
+    With ``informers`` set, pods, nodes, services and deployments of clusters
+    in use are also kept in watch-based caches, which answer reads as long as
+    they are at most ``max_staleness`` seconds behind the server.
+    """
+
+    def __init__(self, pool_size=4, request_timeout=5.0, enabled=False, informers=False,
+                 max_staleness=10.0, informer_max_objects=20000, informer_resync=300, informer_idle_timeout=900):
+        self.pool_size = pool_size
+        self.request_timeout = request_timeout
+        self.enabled = enabled
+        self.informers = informers
+        self.max_staleness = max_staleness
+        self.informer_max_objects = informer_max_objects
+        self.informer_resync = informer_resync
+        self.informer_idle_timeout = informer_idle_timeout
+        self._clusters = {}
+        self._lock = threading.Lock()
+
+    def run(self, cluster, command):
+        """Run ``command`` against the cluster's API; returns ``{'output', 'exit_code'}`` or None"""
+        if not self.enabled:
+            return None
+        parsed = parse_read_command(command)
+        if parsed is None:
+            return None
+        api = self.api_for(cluster)
+        if api is None:
+            metrics.incr('kube_api.fallbacks')
+            return None
+
+        start = time.monotonic()
+        try:
+            result = self._get(api, parsed)
+        except ApiException as e:
+            if e.status not in (403, 404):
+                print(f"❌ Kubernetes API error for cluster {cluster.name}, using the container: {e.status} {e.reason}")
+                metrics.incr('kube_api.fallbacks')
+                return None
+            result = {'output': _api_error(e) + '\n', 'exit_code': 1}
+        except Exception as e:
+            print(f"❌ Kubernetes API unreachable for cluster {cluster.name}, using the container: {e}")
+            metrics.incr('kube_api.fallbacks')
+            return None
+        metrics.incr('kube_api.served')
+        metrics.observe('kube_api.seconds', time.monotonic() - start)
+        return result
+
+    def api_for(self, cluster):
+        """The pooled API client for ``cluster``, or None if its kubeconfig can't be used in-process"""
+        digest = kubeconfig_digest(cluster.kubeconfig)
+        with self._lock:
+            api = self._clusters.get(cluster.pk)
+            if api is not None and api.digest == digest:
+                return api if api.api_client is not None else None
+            stale = api
+
+            try:
+                kubeconfig = yaml.safe_load(cluster.kubeconfig)
+                if not isinstance(kubeconfig, dict):
+                    raise ValueError("kubeconfig is not a mapping")
+                unsafe = unsafe_kubeconfig_fields(kubeconfig)
+                if unsafe:
+                    # Never run exec plugins or read host files in the web server process
+                    raise ValueError(f"kubeconfig uses {', '.join(unsafe)}, which only the container may use")
+                configuration = k8s_client.Configuration()
+                k8s_config.load_kube_config_from_dict(kubeconfig, client_configuration=configuration)
+                configuration.connection_pool_maxsize = self.pool_size
+                api = _ClusterApi(cluster.name, digest, k8s_client.ApiClient(configuration), _context_namespace(kubeconfig))
+                print(f"☸️ Connected Kubernetes API client for cluster {cluster.name}")
+            except Exception as e:
+                print(f"⚠️ Kubernetes API client unavailable for cluster {cluster.name}, using the container: {e}")
+                api = _ClusterApi(cluster.name, digest)
+            self._clusters[cluster.pk] = api
+
+        if stale is not None:
+            _close(stale)
+        return api if api.api_client is not None else None
+
+    def discard(self, cluster_id):
+        """Drop the client and informers of a deleted cluster"""
+        with self._lock:
+            api = self._clusters.pop(cluster_id, None)
+        if api is not None:
+            _close(api)
+
+    def close(self):
+        with self._lock:
+            clusters, self._clusters = self._clusters, {}
+        for api in clusters.values():
+            _close(api)
+
+    def _informer(self, api, resource, labels):
+        """A fresh enough informer to answer the read from, starting the cluster's informers if needed"""
+        if not self.informers or resource not in INFORMER_RESOURCES or labels is None:
+            return None
+        with self._lock:
+            cache = api.informers
+            if cache is None or (cache.stopped and not cache.overflowed):
+                cache = api.informers = ClusterInformers(
+                    api.name,
+                    {
+                        name: getattr(getattr(api, group), method)
+                        for name, (group, method) in INFORMER_RESOURCES.items()
+                    },
+                    max_objects=self.informer_max_objects,
+                    resync_period=self.informer_resync,
+                    idle_timeout=self.informer_idle_timeout
+                )
+        informer = cache.lister(resource, self.max_staleness)
+        metrics.incr('informers.hits' if informer is not None else 'informers.misses')
+        return informer
+
+    def _get(self, api, parsed):
+        spec = RESOURCES[parsed['resource']]
+        namespace = parsed['namespace'] or api.default_namespace
+        # None lists across all namespaces
+        list_namespace = None if parsed['all_namespaces'] or not spec['namespaced'] else namespace
+        labels = parse_label_selector(parsed['selector'])
+        informer = self._informer(api, parsed['resource'], labels)
+
+        def fetch(name=None):
+            if informer is not None:
+                return informer.list(list_namespace, labels, [name] if name else None)
+            kwargs = {'_request_timeout': self.request_timeout}
+            if parsed['selector']:
+                kwargs['label_selector'] = parsed['selector']
+            if name:
+                kwargs['field_selector'] = f'metadata.name={name}'
+            return spec['list'](api, list_namespace, **kwargs).items
+
+        errors = []
+        if parsed['names']:
+            items = []
+            for name in parsed['names']:
+                found = fetch(name)
+                if found:
+                    items.extend(found)
+                else:
+                    errors.append(f'Error from server (NotFound): {spec["plural"]} "{name}" not found')
+        else:
+            items = fetch()
+
+        if not items and not errors:
+            if list_namespace is None:
+                return {'output': 'No resources found\n', 'exit_code': 0}
+            return {'output': f'No resources found in {namespace} namespace.\n', 'exit_code': 0}
+
+        if parsed['output'] == 'name':
+            output = ''.join(f"{spec['kind']}/{item.metadata.name}\n" for item in items)
+        elif items:
+            now = datetime.now(dt_timezone.utc)
+            wide = parsed['output'] == 'wide'
+            show_namespace = parsed['all_namespaces'] and spec['namespaced']
+            header = (['NAMESPACE'] if show_namespace else []) + spec['wide_columns' if wide else 'columns']
+            rows = [header]
+            for item in items:
+                row = spec['row'](item, now, wide)
+                rows.append(([item.metadata.namespace] if show_namespace else []) + row)
+            output = render_table(rows, parsed['no_headers'])
+        else:
+            output = ''
+        output += ''.join(f'{error}\n' for error in errors)
+        return {'output': output, 'exit_code': 1 if errors else 0}
+
+
+def _close(api):
+    if api.informers is not None:
+        api.informers.stop()
+    if api.api_client is not None:
+        api.api_client.close()
+
+
+def _context_namespace(kubeconfig):
+    current = kubeconfig.get('current-context')
+    for context in kubeconfig.get('contexts') or []:
+        if context.get('name') == current:
+            return (context.get('context') or {}).get('namespace') or 'default'
+    return 'default'
+
+
+def _api_error(error):
+    # kubectl prints the Status the API server sent back
+    try:
+        status = json.loads(error.body)
+        return f"Error from server ({status.get('reason') or error.reason}): {status.get('message', '')}"
+    except (TypeError, ValueError):
+        return f"Error from server ({error.reason})"
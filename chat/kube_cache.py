@@ -0,0 +1,189 @@
+import base64
+import statistics
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import docker
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .metrics import metrics
+from .readiness import wait_until_ready
+from .docker_client import get_docker_client
+
+
+# Where kubectl looks for its discovery and HTTP caches
+KUBE_CACHE_DIR = '/root/.kube/cache'
+
+# Fetches every API group's resource list, which is what kubectl's discovery cache holds
+PREWARM_COMMAND = 'kubectl api-resources -o name'
+
+# Volumes created this recently may belong to a cluster created after the active list was read
+EVICT_MIN_AGE = 600
+
+
+class KubeCacheVolume:
+    """Docker volumes with kubectl's discovery and HTTP caches, one per cluster.
+
+    Cold-started terminal containers mount their cluster's volume
+    (``<volume_name>-cluster-<id>``) at ``/root/.kube/cache``, so only the first
+    kubectl of a cluster pays full API discovery, instead of the first few of
+    every session. kubectl replaces cache files atomically, so containers of a
+    cluster can share a volume, and no container sees another cluster's cache.
+    Pooled containers are started before their cluster is known and Docker
+    can't add a volume to a running container, so they keep their cache in
+    the container and are pre-warmed when claimed. A janitor thread removes
+    the volumes of clusters not returned by ``active_clusters()`` (deleted or
+    long unused ones) once no container uses them.
+    """
+
+    def __init__(self, docker_client_factory, volume_name, interval=3600, active_clusters=None):
+        self.docker_client_factory = docker_client_factory
+        self.volume_name = volume_name
+        self.interval = interval
+        # active_clusters: returns the ids of clusters whose caches are kept
+        self.active_clusters = active_clusters or (lambda: [])
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self):
+        return bool(self.volume_name)
+
+    def cluster_volume(self, cluster_id):
+        return f'{self.volume_name}-cluster-{cluster_id}'
+
+    def volumes(self, cluster_id):
+        """``volumes`` argument for ``containers.run`` mounting the cluster's cache volume"""
+        if not self.enabled:
+            return {}
+        return {self.cluster_volume(cluster_id): {'bind': KUBE_CACHE_DIR, 'mode': 'rw'}}
+
+    def prewarm(self, container, timeout=60):
+        """Fill ``container``'s discovery cache, which is its cluster's volume unless it came from the pool"""
+        start = time.monotonic()
+        try:
+            result = container.exec_run(cmd=['/bin/sh', '-c', f'timeout {int(timeout)} {PREWARM_COMMAND}'])
+        except Exception as e:
+            print(f"❌ Error pre-warming kubectl cache in {container.name}: {e}")
+            metrics.incr('kube_cache.prewarm_errors')
+            return False
+        if result.exit_code != 0:
+            print(f"⚠️ Could not pre-warm kubectl cache in {container.name} (exit code {result.exit_code})")
+            metrics.incr('kube_cache.prewarm_errors')
+            return False
+        elapsed = time.monotonic() - start
+        metrics.observe('kube_cache.prewarm_seconds', elapsed)
+        print(f"🗂️ Pre-warmed kubectl cache in {container.name} in {elapsed:.2f}s")
+        return True
+
+    def start(self):
+        """Start the janitor evicting stale cluster caches"""
+        if not self.enabled or self.interval <= 0 or self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="kube-cache-janitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def schedule_eviction(self):
+        """Run the janitor soon, e.g. after a cluster was deleted"""
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                self.evict()
+            except Exception as e:
+                print(f"❌ Kubectl cache eviction error: {e}")
+            finally:
+                connection.close()
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def evict(self):
+        """Remove cache volumes of clusters that are not active; returns the removed volumes"""
+        keep = {self.cluster_volume(cluster_id) for cluster_id in self.active_clusters()}
+        prefix = self.cluster_volume('')
+        cutoff = timezone.now() - timedelta(seconds=EVICT_MIN_AGE)
+        removed = []
+        for volume in self.docker_client_factory().volumes.list(filters={'name': prefix}):
+            if not volume.name.startswith(prefix) or volume.name in keep:
+                continue
+            created = parse_datetime(volume.attrs.get('CreatedAt') or '')
+            if created is None or created > cutoff:
+                continue
+            try:
+                volume.remove()
+            except docker.errors.APIError as e:
+                # Still mounted by a (possibly stopped) container; try again next time
+                if e.status_code != 409:
+                    raise
+                continue
+            removed.append(volume.name)
+        metrics.incr('kube_cache.evictions', len(removed))
+        if removed:
+            print(f"🧹 Removed kubectl caches: {', '.join(removed)}")
+        return removed
+
+
+def _first_kubectl_seconds(docker_client, image_name, kubeconfig, command, volumes=None):
+    """Start a terminal container and time the first kubectl command run in it"""
+    kubeconfig_b64 = base64.b64encode(kubeconfig.encode()).decode()
+    container = docker_client.containers.run(
+        image=image_name,
+        name=f"k8s-cache-bench-{uuid.uuid4().hex[:12]}",
+        environment={'KUBECONFIG_B64': kubeconfig_b64},
+        command=['/bin/sh', '-c', f'echo $KUBECONFIG_B64 | base64 -d > /root/.kube/config && tail -f /dev/null'],
+        detach=True,
+        volumes=volumes or {}
+    )
+    try:
+        if not wait_until_ready(container, timeout=30, probe=['/bin/sh', '-c', 'test -f /root/.kube/config']):
+            raise RuntimeError(f"Benchmark container {container.name} did not start")
+        start = time.monotonic()
+        result = container.exec_run(cmd=['/bin/sh', '-c', command])
+        elapsed = time.monotonic() - start
+        if result.exit_code != 0:
+            raise RuntimeError(result.output.decode('utf-8', 'replace'))
+        return elapsed
+    finally:
+        container.remove(force=True)
+
+
+def benchmark(kubeconfig, image_name, volume_name, runs=5, command='kubectl get pods -A'):
+    """Time-to-first-kubectl in fresh containers, with an empty cache and with a shared cache volume.
+
+    The shared cache runs use a throwaway cluster volume, filled by
+    pre-warming once before they start.
+    """
+    docker_client = get_docker_client()
+    cache = KubeCacheVolume(lambda: docker_client, volume_name)
+    cluster_id = f'bench-{uuid.uuid4().hex[:8]}'
+    volumes = cache.volumes(cluster_id)
+    timings = {'empty': [], 'shared': []}
+    try:
+        for _ in range(runs):
+            timings['empty'].append(_first_kubectl_seconds(docker_client, image_name, kubeconfig, command))
+        _first_kubectl_seconds(docker_client, image_name, kubeconfig, PREWARM_COMMAND, volumes)
+        for _ in range(runs):
+            timings['shared'].append(_first_kubectl_seconds(docker_client, image_name, kubeconfig, command, volumes))
+    finally:
+        try:
+            docker_client.volumes.get(cache.cluster_volume(cluster_id)).remove(force=True)
+        except docker.errors.NotFound:
+            pass
+    return {
+        name: {'median': statistics.median(values), 'min': min(values), 'max': max(values)}
+        for name, values in timings.items()
+    }
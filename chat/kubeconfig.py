@@ -0,0 +1,56 @@
+import hashlib
+import io
+import re
+import tarfile
+import time
+
+from .metrics import metrics
+
+
+KUBECONFIG_DIR = '/root/.kube'
+KUBECONFIG_PATH = f'{KUBECONFIG_DIR}/config'
+
+# Commands that may change which context, namespace or kubeconfig later kubectl commands use:
+# kubectl config edits other than reads, kubectx/kubens, KUBECONFIG assignments and writes to the file
+KUBE_CONFIG_CHANGE = re.compile(
+    r'\bkubectl\s+config\s+(?!view\b|get-|current-context\b)'
+    r'|\bkube(?:ctx|ns)\b'
+    r'|\bKUBECONFIG\s*='
+    r'|\.kube/config'
+)
+
+
+def kubeconfig_digest(kubeconfig):
+    return hashlib.sha256(kubeconfig.encode('utf-8')).hexdigest()
+
+
+def changes_kube_config(command):
+    """Whether ``command`` may leave the session's kubectl on another context, namespace or kubeconfig"""
+    return bool(KUBE_CONFIG_CHANGE.search(command))
+
+
+def write_kubeconfig(container, kubeconfig):
+    """Atomically replace the kubeconfig in a running container.
+
+    The file is copied in with ``put_archive`` under a temporary name and then
+    renamed over the old one, so kubectl never reads a partially written
+    kubeconfig and shells keep running. Returns True on success.
+    """
+    start = time.monotonic()
+    content = kubeconfig.encode('utf-8')
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode='w') as tar:
+        info = tarfile.TarInfo(name='.config.new')
+        info.size = len(content)
+        info.mode = 0o600
+        info.mtime = int(time.time())
+        tar.addfile(info, io.BytesIO(content))
+    archive.seek(0)
+
+    if not container.put_archive(KUBECONFIG_DIR, archive.getvalue()):
+        return False
+    exec_result = container.exec_run(cmd=['mv', '-f', f'{KUBECONFIG_DIR}/.config.new', KUBECONFIG_PATH])
+    if exec_result.exit_code != 0:
+        return False
+    metrics.observe('kubeconfig.install_seconds', time.monotonic() - start)
+    return True
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.images import KUBECTL_IMAGE_NAME, image_manager
+from chat.kube_cache import benchmark
+from chat.models import KubernetesCluster
+
+
+class Command(BaseCommand):
+    help = "Time the first kubectl command of fresh terminal containers, with an empty and with the shared kubectl cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('cluster_id', type=int, help="Cluster whose kubeconfig the containers use")
+        parser.add_argument('--runs', type=int, default=5, help="Containers started per variant")
+        parser.add_argument('--command', default='kubectl get pods -A', help="First command to time")
+
+    def handle(self, *args, **options):
+        if not settings.KUBE_CACHE_VOLUME:
+            raise CommandError("KUBE_CACHE_VOLUME is empty, the shared kubectl cache is disabled")
+        try:
+            cluster = KubernetesCluster.objects.get(pk=options['cluster_id'])
+        except KubernetesCluster.DoesNotExist:
+            raise CommandError(f"Cluster {options['cluster_id']} does not exist")
+        if not image_manager.ensure_ready(wait=None):
+            raise CommandError(f"Docker image {KUBECTL_IMAGE_NAME} is not ready")
+
+        results = benchmark(
+            cluster.kubeconfig,
+            KUBECTL_IMAGE_NAME,
+            settings.KUBE_CACHE_VOLUME,
+            runs=options['runs'],
+            command=options['command']
+        )
+        self.stdout.write(f"⏱️ First `{options['command']}` in {options['runs']} fresh containers of {cluster.name}:")
+        for name, stats in results.items():
+            self.stdout.write(
+                f"  {name:>6} cache: median {stats['median']:.2f}s "
+                f"(min {stats['min']:.2f}s, max {stats['max']:.2f}s)"
+            )
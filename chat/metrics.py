@@ -0,0 +1,76 @@
+import threading
+import bisect
+
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative bucket histogram for latency style measurements"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def snapshot(self):
+        buckets = {}
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            buckets[str(bound)] = running
+        buckets['+Inf'] = self.count
+        return {
+            'count': self.count,
+            'sum': round(self.total, 6),
+            'avg': round(self.total / self.count, 6) if self.count else 0.0,
+            'buckets': buckets
+        }
+
+
+class MetricsRegistry:
+    """Thread-safe in-process registry of counters, gauges and histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value, buckets=DEFAULT_BUCKETS):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram(buckets)
+            histogram.observe(value)
+
+    def counter(self, name):
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'histograms': {name: h.snapshot() for name, h in self._histograms.items()}
+            }
+
+
+# Process-wide metrics registry
+metrics = MetricsRegistry()
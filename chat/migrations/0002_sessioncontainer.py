@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessionContainer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=100, unique=True)),
+                ('container_id', models.CharField(blank=True, max_length=64)),
+                ('owner', models.CharField(max_length=100)),
+                ('state', models.CharField(choices=[('creating', 'Creating'), ('running', 'Running'), ('stopped', 'Stopped')], default='creating', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
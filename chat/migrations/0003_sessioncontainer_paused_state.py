@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_sessioncontainer'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sessioncontainer',
+            name='state',
+            field=models.CharField(choices=[('creating', 'Creating'), ('running', 'Running'), ('paused', 'Paused'), ('stopped', 'Stopped')], default='creating', max_length=20),
+        ),
+    ]
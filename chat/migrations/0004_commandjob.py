@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_sessioncontainer_paused_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommandJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job_id', models.CharField(max_length=100, unique=True)),
+                ('command', models.TextField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed'), ('cancelled', 'Cancelled'), ('timed_out', 'Timed out')], default='queued', max_length=20)),
+                ('exit_code', models.IntegerField(blank=True, null=True)),
+                ('deadline', models.IntegerField()),
+                ('output_size', models.BigIntegerField(default=0)),
+                ('cancel_requested', models.BooleanField(default=False)),
+                ('owner', models.CharField(blank=True, max_length=100)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('chat_session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='chat.chatsession')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
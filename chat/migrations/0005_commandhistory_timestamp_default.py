@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:55
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_commandjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='commandhistory',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
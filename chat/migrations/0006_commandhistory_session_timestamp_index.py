@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_commandhistory_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='commandhistory',
+            index=models.Index(fields=['chat_session', 'timestamp'], name='chat_history_session_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_commandhistory_session_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sessioncontainer',
+            name='container_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
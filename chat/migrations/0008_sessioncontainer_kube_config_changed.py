@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_sessioncontainer_container_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessioncontainer',
+            name='kube_config_changed',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_sessioncontainer_kube_config_changed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessioncontainer',
+            name='attachments',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 import json
 
@@ -52,10 +53,72 @@ class CommandHistory(models.Model):
     command = models.TextField()
     output = models.TextField()
     exit_code = models.IntegerField(default=0)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)  # Set explicitly by write-behind history
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # History is paged per session on (timestamp, id)
+            models.Index(fields=['chat_session', 'timestamp'], name='chat_history_session_ts_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.chat_session.name}: {self.command[:50]}..." 
\ No newline at end of file
+        return f"{self.chat_session.name}: {self.command[:50]}..." 
+
+class SessionContainer(models.Model):
+    """Registry entry mapping a chat session to its terminal container, shared by all workers."""
+    session_id = models.CharField(max_length=100, unique=True)
+    container_id = models.CharField(max_length=64, blank=True, db_index=True)
+    owner = models.CharField(max_length=100)
+    state = models.CharField(
+        max_length=20,
+        choices=[
+            ('creating', 'Creating'),
+            ('running', 'Running'),
+            ('paused', 'Paused'),
+            ('stopped', 'Stopped'),
+        ],
+        default='creating'
+    )
+    # A command in the container may have switched kubectl's context, namespace or kubeconfig
+    kube_config_changed = models.BooleanField(default=False)
+    # What keeps the container awake, from any worker: attachment key -> lease expiry (unix time)
+    attachments = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.session_id} ({self.state} on {self.owner})"
+
+
+class CommandJob(models.Model):
+    """A long-running command executed in the background, with its output buffered to disk."""
+    job_id = models.CharField(max_length=100, unique=True)
+    chat_session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='jobs')
+    command = models.TextField()
+    status = models.CharField(
+        max_length=20,
+        choices=[
+            ('queued', 'Queued'),
+            ('running', 'Running'),
+            ('succeeded', 'Succeeded'),
+            ('failed', 'Failed'),
+            ('cancelled', 'Cancelled'),
+            ('timed_out', 'Timed out'),
+        ],
+        default='queued'
+    )
+    exit_code = models.IntegerField(null=True, blank=True)
+    deadline = models.IntegerField()  # Seconds the command may run
+    output_size = models.BigIntegerField(default=0)
+    cancel_requested = models.BooleanField(default=False)
+    owner = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.job_id} ({self.status}): {self.command[:50]}"
@@ -0,0 +1,31 @@
+from django.conf import settings
+
+from .reconciler import SESSION_CONTAINER_PREFIX, CLUSTER_CONTAINER_PREFIX
+
+
+# Home directories of sessions sharing a cluster container
+SESSION_HOME_ROOT = '/root/sessions'
+
+
+def shared_placement():
+    """Whether sessions of a cluster share one container (CONTAINER_PLACEMENT=cluster)"""
+    return settings.CONTAINER_PLACEMENT == 'cluster'
+
+
+def container_key_for(cluster_id, session_id):
+    """Registry lock key of the container serving a session"""
+    return f"cluster-{cluster_id}" if shared_placement() else session_id
+
+
+def container_name_for(cluster_id, session_id):
+    """Docker name of the container serving a session"""
+    if shared_placement():
+        return f"{CLUSTER_CONTAINER_PREFIX}{cluster_id}"
+    return f"{SESSION_CONTAINER_PREFIX}{session_id}"
+
+
+def session_home(session_id):
+    """Initial working directory of a session's shells, private to the session in a shared container"""
+    if shared_placement():
+        return f"{SESSION_HOME_ROOT}/{session_id}"
+    return '/root'
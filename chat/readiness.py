@@ -0,0 +1,51 @@
+import time
+
+import docker
+
+from .metrics import metrics
+
+
+# Default readiness command: the container can run an exec
+READY_PROBE = ['/bin/sh', '-c', 'true']
+
+# Backoff between probes, in seconds
+PROBE_INITIAL_DELAY = 0.02
+PROBE_MAX_DELAY = 0.5
+
+
+def wait_until_ready(container, timeout=10.0, probe=READY_PROBE, metric='container.ready_seconds'):
+    """Block until ``container`` runs ``probe`` successfully, or ``timeout`` seconds pass.
+
+    Probes with exponential backoff starting at a few milliseconds, so callers
+    return as soon as the container is usable instead of after a fixed sleep.
+    Gives up early if the container exits. Time-to-ready is recorded in the
+    ``metric`` histogram. Returns True when the container is ready.
+    """
+    start = time.monotonic()
+    deadline = start + timeout
+    delay = PROBE_INITIAL_DELAY
+    while True:
+        try:
+            container.reload()
+            if container.status in ('exited', 'dead'):
+                print(f"❌ Container {container.name} exited before becoming ready")
+                break
+            if container.status == 'running' and container.exec_run(cmd=probe).exit_code == 0:
+                elapsed = time.monotonic() - start
+                metrics.observe(metric, elapsed)
+                return True
+        except docker.errors.NotFound:
+            break
+        except docker.errors.APIError:
+            # Not accepting execs yet (e.g. still starting)
+            pass
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            print(f"❌ Container {container.name} not ready after {timeout}s")
+            break
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, PROBE_MAX_DELAY)
+
+    metrics.incr('container.ready_failures')
+    return False
@@ -0,0 +1,131 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import docker
+from django.db import connection
+
+from .models import ChatSession, KubernetesCluster
+from .metrics import metrics
+from .registry import session_registry
+
+
+SESSION_CONTAINER_PREFIX = "k8s-terminal-"
+# Containers shared by all sessions of a cluster (CONTAINER_PLACEMENT=cluster)
+CLUSTER_CONTAINER_PREFIX = "k8s-cluster-"
+
+
+def reconcile_containers(docker_client, adopt, max_workers=8):
+    """Re-register live session containers and garbage-collect orphans after a restart.
+
+    Scans the Docker daemon for ``k8s-terminal-*`` containers and matches them
+    to active ChatSession rows with one query. Running (or paused) containers
+    of active sessions are handed to ``adopt(chat_session, container)`` in
+    parallel; stopped ones are left to be adopted on demand. Containers whose
+    session is gone or inactive are removed, as are registry entries for
+    containers that no longer exist. Shared ``k8s-cluster-*`` containers of
+    active clusters are kept for their sessions to adopt on demand, and
+    removed once their cluster is gone or inactive.
+    """
+    start = time.monotonic()
+    containers = {}
+    for container in docker_client.containers.list(all=True, filters={'name': SESSION_CONTAINER_PREFIX}):
+        if container.name.startswith(SESSION_CONTAINER_PREFIX):
+            containers[container.name[len(SESSION_CONTAINER_PREFIX):]] = container
+    cluster_containers = {}
+    for container in docker_client.containers.list(all=True, filters={'name': CLUSTER_CONTAINER_PREFIX}):
+        if container.name.startswith(CLUSTER_CONTAINER_PREFIX):
+            cluster_containers[container.name[len(CLUSTER_CONTAINER_PREFIX):]] = container
+
+    sessions = {
+        session.session_id: session
+        for session in ChatSession.objects.filter(
+            session_id__in=list(containers),
+            is_active=True,
+            cluster__is_active=True
+        ).select_related('cluster')
+    }
+
+    live = []
+    orphans = []
+    for session_id, container in containers.items():
+        if session_id not in sessions:
+            orphans.append(container)
+        elif container.status in ('running', 'paused'):
+            live.append((sessions[session_id], container))
+    active_clusters = {
+        str(cluster_id)
+        for cluster_id in KubernetesCluster.objects.filter(
+            pk__in=[key for key in cluster_containers if key.isdigit()],
+            is_active=True
+        ).values_list('pk', flat=True)
+    }
+    orphans.extend(container for key, container in cluster_containers.items() if key not in active_clusters)
+
+    adopted = 0
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="reconcile") as executor:
+        removals = [executor.submit(_remove_orphan, container) for container in orphans]
+        for result in executor.map(lambda item: _adopt(adopt, *item), live):
+            adopted += 1 if result else 0
+        removed = sum(1 for future in removals if future.result())
+
+    # Drop registry entries whose container is gone; entries missing from the scan are checked
+    # again, as they may have been registered for a container created after it
+    live_ids = {container.id for container in containers.values()}
+    live_ids.update(container.id for key, container in cluster_containers.items() if key in active_clusters)
+    for record in session_registry.all():
+        if record['container_id'] not in live_ids:
+            _unregister_if_gone(docker_client, record)
+
+    elapsed = time.monotonic() - start
+    metrics.incr('reconcile.adopted', adopted)
+    metrics.incr('reconcile.orphans_removed', removed)
+    metrics.observe('reconcile.seconds', elapsed)
+    print(f"🔄 Reconciled containers in {elapsed:.2f}s: {adopted} adopted, {removed} orphans removed")
+    return {'adopted': adopted, 'orphans_removed': removed}
+
+
+def _adopt(adopt, chat_session, container):
+    try:
+        return adopt(chat_session, container)
+    except Exception as e:
+        print(f"❌ Error adopting container {container.name}: {e}")
+        return False
+    finally:
+        # Registry writes open a connection per pool thread
+        connection.close()
+
+
+def _unregister_if_gone(docker_client, record):
+    """Drop ``record`` if the registry still points at its container and that container no longer exists.
+
+    Runs under the lock that container creation holds while registering, so
+    it cannot drop an entry for a container being created.
+    """
+    from .placement import container_key_for
+
+    session_id = record['session_id']
+    cluster_id = ChatSession.objects.filter(session_id=session_id).values_list('cluster_id', flat=True).first()
+    with session_registry.lock(container_key_for(cluster_id, session_id)):
+        current = session_registry.lookup(session_id)
+        if current is None or current['container_id'] != record['container_id']:
+            return
+        if current['container_id']:
+            try:
+                docker_client.containers.get(current['container_id'])
+                return
+            except docker.errors.NotFound:
+                pass
+            except Exception as e:
+                print(f"❌ Error checking container of session {session_id}: {e}")
+                return
+        session_registry.unregister(session_id)
+
+
+def _remove_orphan(container):
+    try:
+        print(f"🧹 Removing orphaned container: {container.name}")
+        container.remove(force=True)
+        return True
+    except Exception as e:
+        print(f"❌ Error removing orphaned container {container.name}: {e}")
+        return False
@@ -0,0 +1,271 @@
+import fcntl
+import json
+import os
+import socket
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import SessionContainer
+
+
+def process_owner():
+    """Identify this worker process as host:pid"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class SessionRegistry:
+    """Map session ids to their terminal containers across worker processes.
+
+    Records hold the container id, the owning process and the state
+    (``creating``, ``running``, ``paused`` or ``stopped``), and whether a command
+    in the container may have changed kubectl's context, namespace or
+    kubeconfig (``kube_config_changed``). ``attachments`` are leases on the
+    session taken by whatever is using its container, like an open terminal
+    or a running job, in any worker; the idle reaper leaves the container
+    alone while one is live. Leases expire, so a crashed worker's attachments
+    go away on their own. With shared cluster
+    containers several records point at one container, and they are its
+    reference count: ``sessions_for()`` lists the sessions still using it.
+    Containers live on the host's
+    Docker daemon, so ``lock()`` uses host-local file locks: a worker holds the
+    session's lock while it adopts or creates the container, which prevents
+    duplicate containers for a session. Locks are released by the kernel if the
+    worker dies.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        os.makedirs(self.path, exist_ok=True)
+
+    @contextmanager
+    def lock(self, session_id):
+        """Hold the cross-process lock for ``session_id``"""
+        lock_path = os.path.join(self.path, f"{session_id}.lock")
+        with open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def register(self, session_id, container_id, state='running'):
+        raise NotImplementedError
+
+    def lookup(self, session_id):
+        raise NotImplementedError
+
+    def update_state(self, session_id, state):
+        raise NotImplementedError
+
+    def unregister(self, session_id):
+        raise NotImplementedError
+
+    def sessions_for(self, container_id):
+        raise NotImplementedError
+
+    def mark_kube_config_changed(self, container_id):
+        """Record that kubectl in ``container_id`` may no longer use the stored kubeconfig as is"""
+        raise NotImplementedError
+
+    def kube_config_changed(self, session_id):
+        raise NotImplementedError
+
+    def attach(self, session_id, key, ttl):
+        """Take or renew the attachment ``key`` on the session for ``ttl`` seconds"""
+        raise NotImplementedError
+
+    def detach(self, session_id, key):
+        raise NotImplementedError
+
+    def attached(self, session_id):
+        """Whether anything holds a live attachment on the session"""
+        record = self.lookup(session_id)
+        now = time.time()
+        return bool(record) and any(expiry > now for expiry in (record.get('attachments') or {}).values())
+
+    def all(self):
+        raise NotImplementedError
+
+
+def _renew(attachments, key, ttl):
+    """``attachments`` without expired leases, and with ``key`` renewed for ``ttl`` seconds (or dropped if None)"""
+    now = time.time()
+    attachments = {name: expiry for name, expiry in (attachments or {}).items() if expiry > now and name != key}
+    if ttl is not None:
+        attachments[key] = now + ttl
+    return attachments
+
+
+class DatabaseSessionRegistry(SessionRegistry):
+    """Session registry stored in the SessionContainer table"""
+
+    def register(self, session_id, container_id, state='running'):
+        # Re-registering keeps the container's kubeconfig state, also for a session joining a shared container
+        changed = SessionContainer.objects.filter(container_id=container_id, kube_config_changed=True).exists()
+        SessionContainer.objects.update_or_create(
+            session_id=session_id,
+            defaults={
+                'container_id': container_id,
+                'owner': process_owner(),
+                'state': state,
+                'kube_config_changed': changed
+            }
+        )
+
+    def lookup(self, session_id):
+        record = SessionContainer.objects.filter(session_id=session_id).first()
+        return self._to_dict(record) if record else None
+
+    def update_state(self, session_id, state):
+        SessionContainer.objects.filter(session_id=session_id).update(
+            state=state,
+            owner=process_owner(),
+            updated_at=timezone.now()
+        )
+
+    def unregister(self, session_id):
+        SessionContainer.objects.filter(session_id=session_id).delete()
+
+    def sessions_for(self, container_id):
+        return list(SessionContainer.objects.filter(container_id=container_id).values_list('session_id', flat=True))
+
+    def mark_kube_config_changed(self, container_id):
+        SessionContainer.objects.filter(container_id=container_id, kube_config_changed=False).update(
+            kube_config_changed=True
+        )
+
+    def kube_config_changed(self, session_id):
+        return SessionContainer.objects.filter(session_id=session_id, kube_config_changed=True).exists()
+
+    def attach(self, session_id, key, ttl):
+        self._update_attachments(session_id, key, ttl)
+
+    def detach(self, session_id, key):
+        self._update_attachments(session_id, key, None)
+
+    def _update_attachments(self, session_id, key, ttl):
+        with transaction.atomic():
+            record = SessionContainer.objects.select_for_update().filter(session_id=session_id).first()
+            if record is not None:
+                SessionContainer.objects.filter(pk=record.pk).update(attachments=_renew(record.attachments, key, ttl))
+
+    def all(self):
+        return [self._to_dict(record) for record in SessionContainer.objects.all()]
+
+    @staticmethod
+    def _to_dict(record):
+        return {
+            'session_id': record.session_id,
+            'container_id': record.container_id,
+            'owner': record.owner,
+            'state': record.state,
+            'kube_config_changed': record.kube_config_changed,
+            'attachments': record.attachments,
+            'updated_at': record.updated_at.isoformat()
+        }
+
+
+class FileSessionRegistry(SessionRegistry):
+    """Session registry stored in a JSON file guarded by an exclusive file lock"""
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.store_path = os.path.join(self.path, 'sessions.json')
+        self.store_lock_path = os.path.join(self.path, 'sessions.json.lock')
+
+    @contextmanager
+    def _store(self, write=True):
+        with open(self.store_lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.store_path) as f:
+                        records = json.load(f)
+                except (FileNotFoundError, ValueError):
+                    records = {}
+                yield records
+                if not write:
+                    return
+                temp_path = f"{self.store_path}.{os.getpid()}.tmp"
+                with open(temp_path, 'w') as f:
+                    json.dump(records, f)
+                os.replace(temp_path, self.store_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def register(self, session_id, container_id, state='running'):
+        with self._store() as records:
+            changed = any(
+                record['container_id'] == container_id and record.get('kube_config_changed')
+                for record in records.values()
+            )
+            records[session_id] = {
+                'session_id': session_id,
+                'container_id': container_id,
+                'owner': process_owner(),
+                'state': state,
+                'kube_config_changed': changed,
+                'attachments': records.get(session_id, {}).get('attachments', {}),
+                'updated_at': time.time()
+            }
+
+    def lookup(self, session_id):
+        with self._store(write=False) as records:
+            return records.get(session_id)
+
+    def update_state(self, session_id, state):
+        with self._store() as records:
+            if session_id in records:
+                records[session_id].update(state=state, owner=process_owner(), updated_at=time.time())
+
+    def unregister(self, session_id):
+        with self._store() as records:
+            records.pop(session_id, None)
+
+    def sessions_for(self, container_id):
+        with self._store(write=False) as records:
+            return [record['session_id'] for record in records.values() if record['container_id'] == container_id]
+
+    def mark_kube_config_changed(self, container_id):
+        with self._store() as records:
+            for record in records.values():
+                if record['container_id'] == container_id:
+                    record['kube_config_changed'] = True
+
+    def kube_config_changed(self, session_id):
+        with self._store(write=False) as records:
+            return bool(records.get(session_id, {}).get('kube_config_changed'))
+
+    def attach(self, session_id, key, ttl):
+        with self._store() as records:
+            if session_id in records:
+                records[session_id]['attachments'] = _renew(records[session_id].get('attachments'), key, ttl)
+
+    def detach(self, session_id, key):
+        with self._store() as records:
+            if session_id in records:
+                records[session_id]['attachments'] = _renew(records[session_id].get('attachments'), key, None)
+
+    def all(self):
+        with self._store(write=False) as records:
+            return list(records.values())
+
+
+REGISTRY_BACKENDS = {
+    'database': DatabaseSessionRegistry,
+    'file': FileSessionRegistry,
+}
+
+
+def create_session_registry():
+    """Build the registry backend selected by SESSION_REGISTRY_BACKEND"""
+    backend = REGISTRY_BACKENDS[settings.SESSION_REGISTRY_BACKEND]
+    return backend(settings.SESSION_REGISTRY_PATH)
+
+
+# Process-wide session registry
+session_registry = create_session_registry()
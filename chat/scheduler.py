@@ -0,0 +1,166 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+
+from .metrics import metrics
+
+
+# Smallest exec time charged to a session, so instant commands still cost something
+MIN_COST_SECONDS = 0.01
+
+
+class SchedulerFull(Exception):
+    """Raised when a session already has too many commands waiting"""
+
+
+class _SessionQueue:
+    def __init__(self):
+        self.waiters = deque()
+        self.active = 0
+        # Virtual time: exec seconds used so far, divided by the session's weight
+        self.vtime = 0.0
+
+
+# Scheduling key of a session's background jobs, queued apart from its interactive commands
+JOB_LANE = "{session_id}:jobs"
+
+
+class ExecScheduler:
+    """Admission control for command execs, shared by all sessions of this process.
+
+    At most ``global_limit`` execs run at once, and at most ``session_limit``
+    per session (1 runs a session's commands serially); the rest wait in
+    per-session FIFO queues of up to ``session_queue_limit`` entries. When a
+    slot frees up it goes to the waiting session that has used the least exec
+    time relative to its weight (start-time fair queuing), so a session running
+    long commands cannot starve the others.
+
+    The limits are per worker process: with several workers, up to
+    ``global_limit`` execs run in each. Runs on the event loop; threads use
+    ``acquire_threadsafe()`` and ``release_threadsafe()``.
+    """
+
+    def __init__(self, global_limit=32, session_limit=1, session_queue_limit=16):
+        self.global_limit = max(1, global_limit)
+        self.session_limit = max(1, session_limit)
+        self.session_queue_limit = session_queue_limit
+        self.active = 0
+        self.virtual_time = 0.0
+        self._sessions = {}
+
+    @asynccontextmanager
+    async def slot(self, session_id, weight=1.0, limit=None):
+        """Wait for an exec slot for ``session_id``; yields a ticket with the ``queue_wait`` in seconds"""
+        ticket = await self.acquire(session_id, weight, limit)
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    async def acquire(self, session_id, weight=1.0, limit=None):
+        """Wait for an exec slot; ``limit`` overrides ``session_limit`` for this request.
+
+        A parallel batch passes its parallelism as ``limit``, so its commands
+        run side by side while each still takes a global slot of its own.
+        """
+        state = self._sessions.get(session_id)
+        if state is None:
+            state = self._sessions[session_id] = _SessionQueue()
+        if len(state.waiters) >= self.session_queue_limit:
+            metrics.incr('scheduler.rejected')
+            raise SchedulerFull(f"{len(state.waiters)} commands already queued for this session")
+        if not state.waiters and not state.active:
+            # A session coming back from idle starts at the current virtual time, without banked credit
+            state.vtime = max(state.vtime, self.virtual_time)
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, max(1, limit or self.session_limit))
+        state.waiters.append(waiter)
+        enqueued = time.monotonic()
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Granted just as the request went away
+                self._release(session_id)
+            elif waiter in state.waiters:
+                state.waiters.remove(waiter)
+                self._prune()
+            self._update_gauges()
+            raise
+
+        queue_wait = time.monotonic() - enqueued
+        metrics.observe('scheduler.queue_wait_seconds', queue_wait)
+        return {
+            'session_id': session_id,
+            'weight': weight,
+            'queue_wait': queue_wait,
+            'started': time.monotonic()
+        }
+
+    def release(self, ticket):
+        state = self._sessions.get(ticket['session_id'])
+        if state is not None:
+            elapsed = time.monotonic() - ticket['started']
+            state.vtime += max(elapsed, MIN_COST_SECONDS) / max(ticket['weight'], 0.001)
+        self._release(ticket['session_id'])
+
+    def acquire_threadsafe(self, loop, session_id, weight=1.0):
+        """``acquire()`` from a worker thread: blocks until ``loop`` grants the slot"""
+        return asyncio.run_coroutine_threadsafe(self.acquire(session_id, weight), loop).result()
+
+    def release_threadsafe(self, loop, ticket):
+        loop.call_soon_threadsafe(self.release, ticket)
+
+    def snapshot(self):
+        return {
+            'active': self.active,
+            'queued': sum(len(state.waiters) for state in self._sessions.values()),
+            'sessions': len(self._sessions)
+        }
+
+    def _release(self, session_id):
+        self._sessions[session_id].active -= 1
+        self.active -= 1
+        self._dispatch()
+        self._prune()
+
+    def _prune(self):
+        # Forget sessions with nothing queued or running and no exec time owed
+        for session_id, state in list(self._sessions.items()):
+            if not state.waiters and not state.active and state.vtime <= self.virtual_time:
+                del self._sessions[session_id]
+
+    def _dispatch(self):
+        while self.active < self.global_limit:
+            eligible = [
+                state for state in self._sessions.values()
+                if state.waiters and state.active < state.waiters[0][1]
+            ]
+            if not eligible:
+                break
+            state = min(eligible, key=lambda state: state.vtime)
+            future, _ = state.waiters.popleft()
+            if future.done():
+                continue
+            state.active += 1
+            self.active += 1
+            self.virtual_time = max(self.virtual_time, state.vtime)
+            future.set_result(None)
+        self._update_gauges()
+
+    def _update_gauges(self):
+        metrics.set_gauge('scheduler.active', self.active)
+        metrics.set_gauge('scheduler.queued', sum(len(state.waiters) for state in self._sessions.values()))
+
+
+# Admission control for command execs of this process: per-session queues, a process-wide cap and fair sharing
+exec_scheduler = ExecScheduler(
+    global_limit=settings.EXEC_GLOBAL_CONCURRENCY,
+    session_limit=settings.EXEC_SESSION_CONCURRENCY,
+    session_queue_limit=settings.EXEC_SESSION_QUEUE_LIMIT
+)
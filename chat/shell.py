@@ -0,0 +1,240 @@
+import codecs
+import struct
+import socket
+import threading
+import time
+import uuid
+
+from .metrics import metrics
+
+
+# Docker multiplexed stream header: stream type (1 byte), padding (3 bytes), payload size (4 bytes)
+FRAME_HEADER_SIZE = 8
+
+# Seconds to wait for the shell prompt to come back after killing a timed out command
+KILL_GRACE_PERIOD = 2.0
+
+
+class ShellError(Exception):
+    """Raised when the persistent shell is unusable and has to be restarted"""
+
+
+class ShellUnavailable(ShellError):
+    """Raised when a command could not be handed to the shell, so it did not run"""
+
+
+class PersistentShell:
+    """A long-lived ``/bin/sh`` in a session container that runs commands one at a time.
+
+    Each command is written to the shell's stdin wrapped in a ``{ ... }`` group,
+    followed by a ``printf`` of a per-command sentinel and ``$?``. Output is read
+    from the exec socket until the sentinel appears, which frames the command's
+    output and exit code without a new Docker exec per command. Because the
+    group runs in the shell itself, ``cd`` and ``export`` persist between commands.
+    """
+
+    def __init__(self, docker_client, container, environment=None, workdir='/root'):
+        self.docker_client = docker_client
+        self.container = container
+        self.environment = environment or {}
+        self.workdir = workdir
+        self.cwd = workdir
+        self.exec_id = None
+        self.pid = None
+        self._socket = None
+        self._sock = None
+        self._buffer = b''
+        self._output = b''
+        self._lock = threading.Lock()
+
+    @property
+    def alive(self):
+        return self._sock is not None
+
+    def start(self):
+        """Start the shell process inside the container"""
+        try:
+            exec_cmd = self.docker_client.api.exec_create(
+                container=self.container.id,
+                cmd=['/bin/sh'],
+                stdin=True,
+                stdout=True,
+                stderr=True,
+                tty=False,
+                environment=self.environment,
+                workdir=self.workdir
+            )
+            self.exec_id = exec_cmd['Id']
+            self._socket = self.docker_client.api.exec_start(
+                exec_id=self.exec_id,
+                socket=True
+            )
+        except Exception as e:
+            raise ShellUnavailable(f"shell did not start: {e}")
+        self._sock = getattr(self._socket, '_sock', self._socket)
+        self._buffer = b''
+        try:
+            output, _ = self._collect(self._stream_framed('echo $$', timeout=10))
+            self.pid = int(output.strip())
+        except (ShellError, ValueError) as e:
+            self.close()
+            raise ShellUnavailable(f"shell did not start: {e}")
+        metrics.incr('shell.started')
+
+    def close(self):
+        """Close the exec socket, which ends the shell"""
+        sock, self._sock = self._sock, None
+        self._socket = None
+        self.pid = None
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+            try:
+                sock.close()
+            except Exception:
+                pass
+
+    def run(self, command, timeout=30):
+        """Run ``command`` and return ``{'output': str, 'exit_code': int}``.
+
+        A command that exceeds ``timeout`` seconds has its processes killed and
+        gets exit code 124, like coreutils ``timeout``. If the shell does not
+        recover, it is restarted and cwd/env are lost.
+        """
+        output, exit_code = self._collect(self.stream(command, timeout))
+        return {'output': output, 'exit_code': exit_code}
+
+    def stream(self, command, timeout=30):
+        """Run ``command``, yielding ``('output', str)`` chunks as they arrive and finally ``('exit', int)``"""
+        with self._lock:
+            if not self.alive:
+                self.start()
+            start = time.monotonic()
+            try:
+                yield from self._stream_framed(command, timeout)
+            except ShellError:
+                self.close()
+                raise
+            metrics.observe('shell.command_seconds', time.monotonic() - start)
+
+    @staticmethod
+    def _collect(events):
+        chunks = []
+        exit_code = None
+        for kind, value in events:
+            if kind == 'output':
+                chunks.append(value)
+            else:
+                exit_code = value
+        return ''.join(chunks), exit_code
+
+    def _stream_framed(self, command, timeout):
+        sentinel = f"__K8S_AI_DONE_{uuid.uuid4().hex}__"
+        script = f"{{ {command}\n}} </dev/null 2>&1; printf '\\n{sentinel} %d %s\\n' \"$?\" \"$PWD\"\n"
+        marker = f"\n{sentinel} ".encode('utf-8')
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+        deadline = time.monotonic() + timeout
+        timed_out = False
+
+        self._output = b''
+        self._write(script.encode('utf-8'))
+        try:
+            while True:
+                try:
+                    exit_code, data = self._read_chunk(marker, deadline)
+                except socket.timeout:
+                    if timed_out:
+                        raise ShellError(f"shell did not recover after {timeout}s timeout")
+                    # Timed out: kill the command's processes and wait for the shell to report back
+                    timed_out = True
+                    metrics.incr('shell.timeouts')
+                    self._kill_children()
+                    deadline = time.monotonic() + KILL_GRACE_PERIOD
+                    continue
+
+                text = decoder.decode(data, final=exit_code is not None)
+                if text:
+                    yield ('output', text)
+                if exit_code is not None:
+                    yield ('exit', 124 if timed_out else exit_code)
+                    return
+        except GeneratorExit:
+            # The consumer went away mid-command: stop it and resynchronise the shell
+            self._kill_children()
+            try:
+                deadline = time.monotonic() + KILL_GRACE_PERIOD
+                while self._read_chunk(marker, deadline)[0] is None:
+                    pass
+            except Exception:
+                self.close()
+            raise
+
+    def _write(self, data):
+        # The command group only runs once its closing brace arrives, so a failed write ran nothing
+        try:
+            self._sock.sendall(data)
+        except OSError as e:
+            raise ShellUnavailable(f"shell input closed: {e}")
+
+    def _read_chunk(self, marker, deadline):
+        """Read demultiplexed output and return ``(exit_code, data)``.
+
+        ``exit_code`` is None until ``marker`` and the exit code line have been
+        seen; that line also carries the shell's cwd, kept in ``self.cwd``.
+        Bytes that could be the start of the marker are held back.
+        """
+        while True:
+            index = self._output.find(marker)
+            if index != -1:
+                line_end = self._output.find(b'\n', index + len(marker))
+                if line_end != -1:
+                    status, _, cwd = self._output[index + len(marker):line_end].decode('utf-8', 'replace').partition(' ')
+                    exit_code = int(status)
+                    self.cwd = cwd or self.cwd
+                    data = self._output[:index]
+                    self._output = b''
+                    return exit_code, data
+            elif self._output:
+                # Only the part after the last newline can be the start of the marker
+                safe = self._output.rfind(b'\n')
+                if safe == -1 or not marker.startswith(self._output[safe:]):
+                    safe = len(self._output)
+                if safe > 0:
+                    data, self._output = self._output[:safe], self._output[safe:]
+                    return None, data
+            self._output += self._next_payload(deadline)
+
+    def _next_payload(self, deadline):
+        # Only consume a frame once it is complete so a timeout never loses data
+        self._fill(FRAME_HEADER_SIZE, deadline)
+        _, size = struct.unpack('>BxxxL', self._buffer[:FRAME_HEADER_SIZE])
+        self._fill(FRAME_HEADER_SIZE + size, deadline)
+        payload = self._buffer[FRAME_HEADER_SIZE:FRAME_HEADER_SIZE + size]
+        self._buffer = self._buffer[FRAME_HEADER_SIZE + size:]
+        return payload
+
+    def _fill(self, size, deadline):
+        while len(self._buffer) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise socket.timeout()
+            self._sock.settimeout(remaining)
+            try:
+                chunk = self._sock.recv(65536)
+            except socket.timeout:
+                raise
+            except OSError as e:
+                raise ShellError(f"shell output closed: {e}")
+            if not chunk:
+                raise ShellError("shell exited")
+            self._buffer += chunk
+
+    def _kill_children(self):
+        if not self.pid:
+            return
+        try:
+            self.container.exec_run(cmd=['/bin/sh', '-c', f'pkill -TERM -P {self.pid}; sleep 0.5; pkill -KILL -P {self.pid}'])
+        except Exception as e:
+            print(f"❌ Error killing timed out command: {e}")
@@ -0,0 +1,93 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .metrics import metrics
+
+
+def teardown_containers(containers, stop_timeout=10, deadline=30, max_workers=16, label="containers"):
+    """Stop and remove ``containers`` concurrently within a global deadline.
+
+    Each container gets a graceful ``stop`` (at most ``stop_timeout`` seconds,
+    and never past the deadline) followed by ``remove``; paused containers and a
+    ``stop_timeout`` of 0 go straight to a forced remove. Containers still not
+    gone when ``deadline`` seconds have passed are escalated to a forced remove
+    (SIGKILL), which gets a short grace period of its own. Progress is printed as
+    containers finish. Returns ``{'removed', 'forced', 'failed', 'seconds'}``.
+    """
+    containers = list(containers)
+    result = {'removed': 0, 'forced': 0, 'failed': [], 'seconds': 0.0}
+    if not containers:
+        return result
+
+    start = time.monotonic()
+    end = start + deadline
+    total = len(containers)
+    print(f"🧹 Tearing down {total} {label} (deadline {deadline}s)...")
+
+    def graceful(container):
+        if stop_timeout > 0 and container.status != 'paused':
+            remaining = int(max(0, min(stop_timeout, end - time.monotonic())))
+            container.stop(timeout=remaining)
+            container.remove(force=True)
+            return False
+        container.remove(force=True)
+        return True
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, total), thread_name_prefix="teardown")
+    try:
+        pending = {executor.submit(graceful, container): container for container in containers}
+        done_count = 0
+        while pending:
+            done, _ = wait(pending, timeout=max(0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                container = pending.pop(future)
+                done_count += 1
+                try:
+                    forced = future.result()
+                    result['removed'] += 1
+                    result['forced'] += 1 if forced else 0
+                except Exception as e:
+                    if _is_gone(e):
+                        result['removed'] += 1
+                    else:
+                        print(f"❌ Error removing container {container.name}: {e}")
+                        result['failed'].append(container.name)
+            print(f"🧹 Teardown progress: {done_count}/{total} {label}")
+
+        if pending:
+            # Deadline passed: kill whatever is left
+            print(f"⏱️ Teardown deadline reached, force-removing {len(pending)} {label}")
+            kill_executor = ThreadPoolExecutor(max_workers=min(max_workers, len(pending)), thread_name_prefix="teardown-kill")
+            kills = {kill_executor.submit(container.remove, force=True): container for container in pending.values()}
+            done, not_done = wait(kills, timeout=5)
+            for future in done:
+                container = kills[future]
+                try:
+                    future.result()
+                    result['removed'] += 1
+                    result['forced'] += 1
+                except Exception as e:
+                    if _is_gone(e):
+                        result['removed'] += 1
+                    else:
+                        print(f"❌ Error force-removing container {container.name}: {e}")
+                        result['failed'].append(container.name)
+            result['failed'].extend(kills[future].name for future in not_done)
+            kill_executor.shutdown(wait=False, cancel_futures=True)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    result['seconds'] = round(time.monotonic() - start, 3)
+    metrics.observe('teardown.seconds', result['seconds'])
+    metrics.incr('teardown.removed', result['removed'])
+    metrics.incr('teardown.forced', result['forced'])
+    metrics.incr('teardown.failed', len(result['failed']))
+    print(f"✅ Tore down {result['removed']}/{total} {label} in {result['seconds']:.2f}s ({result['forced']} forced)")
+    return result
+
+
+def _is_gone(error):
+    # Removal raced with something else removing the container
+    return getattr(getattr(error, 'response', None), 'status_code', None) == 404
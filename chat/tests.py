@@ -0,0 +1,217 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import skipUnless
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .fake_kube_api import FakeKubeApiServer, sample_objects, _timestamp
+from .kube_api import KubeApiPool, render_table
+from .history import encode_cursor
+from .kubeconfig import changes_kube_config
+from .models import ChatSession, CommandHistory, KubernetesCluster
+from .registry import DatabaseSessionRegistry, FileSessionRegistry
+
+
+# What kubectl prints for the sample objects of FakeKubeApiServer (with the ages pinned in setUpClass)
+KUBECTL_OUTPUT = {
+    'kubectl get pods': (
+        'NAME                  READY   STATUS             RESTARTS      AGE\n'
+        'web-7d4b9c8f5-abcde   1/1     Running            0             5h3m\n'
+        'web-7d4b9c8f5-fghij   0/1     CrashLoopBackOff   4 (30m ago)   5h3m\n'
+    ),
+    'kubectl get pods -A': (
+        'NAMESPACE     NAME                       READY   STATUS             RESTARTS      AGE\n'
+        'default       web-7d4b9c8f5-abcde        1/1     Running            0             5h3m\n'
+        'default       web-7d4b9c8f5-fghij        0/1     CrashLoopBackOff   4 (30m ago)   5h3m\n'
+        'kube-system   coredns-5d78c9869d-xyz12   1/1     Running            0             12d\n'
+    ),
+    'kubectl get pods -o wide': (
+        'NAME                  READY   STATUS             RESTARTS      AGE    IP            NODE     NOMINATED NODE   READINESS GATES\n'
+        'web-7d4b9c8f5-abcde   1/1     Running            0             5h3m   10.244.0.12   node-1   <none>           <none>\n'
+        'web-7d4b9c8f5-fghij   0/1     CrashLoopBackOff   4 (30m ago)   5h3m   10.244.0.13   node-1   <none>           <none>\n'
+    ),
+    'kubectl get pods --no-headers': (
+        'web-7d4b9c8f5-abcde   1/1   Running            0             5h3m\n'
+        'web-7d4b9c8f5-fghij   0/1   CrashLoopBackOff   4 (30m ago)   5h3m\n'
+    ),
+    'kubectl get pods -o name': 'pod/web-7d4b9c8f5-abcde\npod/web-7d4b9c8f5-fghij\n',
+    'kubectl get nodes': (
+        'NAME     STATUS   ROLES           AGE   VERSION\n'
+        'node-1   Ready    control-plane   12d   v1.29.2\n'
+    ),
+    'kubectl get svc': (
+        'NAME         TYPE        CLUSTER-IP    EXTERNAL-IP   PORT(S)        AGE\n'
+        'kubernetes   ClusterIP   10.96.0.1     <none>        443/TCP        12d\n'
+        'web          NodePort    10.96.12.34   <none>        80:30080/TCP   5h\n'
+    ),
+    'kubectl get deploy': (
+        'NAME   READY   UP-TO-DATE   AVAILABLE   AGE\n'
+        'web    1/2     2            1           5h3m\n'
+    ),
+    'kubectl get events': (
+        'LAST SEEN           TYPE      REASON    OBJECT                    MESSAGE\n'
+        '30m (x4 over 45m)   Warning   BackOff   pod/web-7d4b9c8f5-fghij   Back-off restarting failed container web\n'
+    ),
+    'kubectl get pods -n staging': 'No resources found in staging namespace.\n',
+    'kubectl get pod missing': 'Error from server (NotFound): pods "missing" not found\n',
+}
+
+
+class FastPathOutputTests(SimpleTestCase):
+    """The API fast path prints what kubectl prints for the same objects"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        objects = sample_objects()
+        # Ages under ten minutes print seconds, which would tick while the test runs
+        objects['pods'][1]['status']['containerStatuses'][0]['lastState']['terminated']['finishedAt'] = (
+            _timestamp(timedelta(minutes=30))
+        )
+        objects['events'][0].update(
+            firstTimestamp=_timestamp(timedelta(minutes=45)),
+            lastTimestamp=_timestamp(timedelta(minutes=30))
+        )
+        cls.server = FakeKubeApiServer(objects).start()
+        cls.kube_api = KubeApiPool(enabled=True)
+        cls.cluster = SimpleNamespace(pk=1, name='fake', kubeconfig=cls.server.kubeconfig())
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.kube_api.close()
+        cls.server.stop()
+        super().tearDownClass()
+
+    def test_matches_kubectl_output(self):
+        for command, expected in KUBECTL_OUTPUT.items():
+            with self.subTest(command=command):
+                result = self.kube_api.run(self.cluster, command)
+                self.assertIsNotNone(result)
+                self.assertEqual(result['output'], expected)
+                self.assertEqual(result['exit_code'], 1 if 'Error from server' in expected else 0)
+
+    def test_falls_back_for_commands_it_does_not_serve(self):
+        for command in ('kubectl get pods | grep web', 'kubectl describe pod web', 'kubectl get configmaps'):
+            with self.subTest(command=command):
+                self.assertIsNone(self.kube_api.run(self.cluster, command))
+
+    @skipUnless(
+        shutil.which('kubectl') and os.getenv('K8S_AI_TEST_KUBECONFIG'),
+        "needs kubectl and K8S_AI_TEST_KUBECONFIG pointing at a quiet test cluster"
+    )
+    def test_matches_live_kubectl(self):
+        with open(os.environ['K8S_AI_TEST_KUBECONFIG']) as f:
+            cluster = SimpleNamespace(pk=2, name='live', kubeconfig=f.read())
+        kube_api = KubeApiPool(enabled=True)
+        try:
+            for command in ('kubectl get pods -A', 'kubectl get nodes -o wide', 'kubectl get svc -A',
+                            'kubectl get deploy -A -o wide'):
+                with self.subTest(command=command):
+                    kubectl = subprocess.run(
+                        command.split(), capture_output=True, text=True, timeout=30,
+                        env=dict(os.environ, KUBECONFIG=os.environ['K8S_AI_TEST_KUBECONFIG'])
+                    )
+                    result = kube_api.run(cluster, command)
+                    self.assertIsNotNone(result)
+                    self.assertEqual(result['output'], kubectl.stdout + kubectl.stderr)
+        finally:
+            kube_api.close()
+
+
+class RenderTableTests(SimpleTestCase):
+    def test_columns_are_widest_cell_plus_padding(self):
+        self.assertEqual(
+            render_table([['NAME', 'AGE'], ['a', '1d']]),
+            'NAME   AGE\n'
+            'a      1d\n'
+        )
+
+    def test_no_headers(self):
+        self.assertEqual(render_table([['NAME', 'AGE'], ['a', '1d']], no_headers=True), 'a   1d\n')
+
+
+class KubeConfigChangeTests(SimpleTestCase):
+    def test_detects_context_changes(self):
+        for command in ('kubectl config use-context prod', 'kubectl config set-context --current --namespace=dev',
+                        'export KUBECONFIG=/tmp/other', 'kubens dev', 'cp other ~/.kube/config'):
+            with self.subTest(command=command):
+                self.assertTrue(changes_kube_config(command))
+
+    def test_ignores_reads(self):
+        for command in ('kubectl get pods', 'kubectl config view', 'kubectl config get-contexts',
+                        'kubectl config current-context'):
+            with self.subTest(command=command):
+                self.assertFalse(changes_kube_config(command))
+
+
+class RegistryAttachmentTests(TestCase):
+    """Attachments keep a session busy for every worker until detached or expired"""
+
+    def registries(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path, True)
+        return DatabaseSessionRegistry(path), FileSessionRegistry(path)
+
+    def test_attach_and_detach(self):
+        for registry in self.registries():
+            with self.subTest(backend=type(registry).__name__):
+                registry.register('s1', 'c1')
+                self.assertFalse(registry.attached('s1'))
+                registry.attach('s1', 'terminal', 90)
+                registry.attach('s1', 'job', 90)
+                registry.detach('s1', 'terminal')
+                self.assertTrue(registry.attached('s1'))
+                registry.detach('s1', 'job')
+                self.assertFalse(registry.attached('s1'))
+
+    def test_leases_expire(self):
+        for registry in self.registries():
+            with self.subTest(backend=type(registry).__name__):
+                registry.register('s1', 'c1')
+                registry.attach('s1', 'terminal', -1)
+                self.assertFalse(registry.attached('s1'))
+
+    def test_unregistered_session_is_not_attached(self):
+        for registry in self.registries():
+            with self.subTest(backend=type(registry).__name__):
+                registry.attach('missing', 'terminal', 90)
+                self.assertFalse(registry.attached('missing'))
+
+
+class HistoryETagTests(TestCase):
+    """History ETags depend on the query, and If-None-Match is compared token by token"""
+
+    def setUp(self):
+        cluster = KubernetesCluster.objects.create(name='test', kubeconfig='clusters: []')
+        self.session = ChatSession.objects.create(cluster=cluster, session_id='etag-session', name='test')
+        entry = CommandHistory.objects.create(
+            chat_session=self.session, command='kubectl get pods', output='', timestamp=timezone.now() - timedelta(hours=1)
+        )
+        # A cursor keeps the view from starting a container for the session
+        self.cursor = encode_cursor(entry)
+        self.url = reverse('chat:get_chat_history', args=[self.session.session_id])
+
+    def get(self, etag=None, **query):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(self.url, {'after': self.cursor, **query}, **headers)
+
+    def test_not_modified_for_same_query(self):
+        etag = self.get(limit=10)['ETag']
+        self.assertEqual(self.get(f'"other", {etag}', limit=10).status_code, 304)
+
+    def test_query_changes_etag(self):
+        etag = self.get(limit=10)['ETag']
+        response = self.get(etag, limit=20)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_partial_tag_does_not_match(self):
+        etag = self.get(limit=10)['ETag']
+        self.assertEqual(self.get(f'"v{etag}"', limit=10).status_code, 200)
+        self.assertEqual(self.get(etag[:-2] + '"', limit=10).status_code, 200)
@@ -14,8 +14,15 @@ urlpatterns = [
     path('clusters/<int:cluster_id>/delete/', views.delete_cluster, name='delete_cluster'),
     path('terminal/<str:session_id>/', views.terminal_view, name='terminal'),
     path('terminal/<str:session_id>/execute/', views.execute_command, name='execute_command'),
+    path('terminal/<str:session_id>/batch/', views.execute_batch, name='execute_batch'),
     path('terminal/<str:session_id>/ai-debug/', views.debug_kubectl_ai, name='debug_kubectl_ai'),
     path('terminal/<str:session_id>/history/', views.get_chat_history, name='get_chat_history'),
+    path('terminal/<str:session_id>/history/<int:entry_id>/output/', views.get_history_output, name='get_history_output'),
     path('terminal/<str:session_id>/clear-history/', views.clear_history, name='clear_history'),
     path('terminal/<str:session_id>/status/', views.container_status, name='container_status'),
+    path('terminal/<str:session_id>/jobs/', views.command_jobs, name='command_jobs'),
+    path('terminal/<str:session_id>/jobs/<str:job_id>/', views.job_status, name='job_status'),
+    path('terminal/<str:session_id>/jobs/<str:job_id>/stream/', views.stream_job, name='stream_job'),
+    path('terminal/<str:session_id>/jobs/<str:job_id>/cancel/', views.cancel_job, name='cancel_job'),
+    path('metrics/', views.get_metrics, name='metrics'),
 ] 
\ No newline at end of file
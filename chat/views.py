@@ -1,10 +1,41 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse, StreamingHttpResponse
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseNotModified
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
-from .models import KubernetesCluster, ChatSession, CommandHistory
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, F, Max, Q
+from django.db.models.functions import Length, Substr
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from asgiref.sync import sync_to_async
+from .models import KubernetesCluster, ChatSession, CommandHistory, CommandJob
+from .metrics import metrics
+from .warm_pool import WarmPool
+from .shell import PersistentShell, ShellUnavailable
+from .docker_client import get_docker_client, update_docker_pool_metrics
+from .images import KUBECTL_IMAGE_NAME, image_manager
+from .consumers import terminal_flow_stats
+from .registry import session_registry, process_owner
+from .reconciler import reconcile_containers, SESSION_CONTAINER_PREFIX, CLUSTER_CONTAINER_PREFIX
+from .placement import shared_placement, container_key_for, container_name_for, session_home
+from .hibernation import IdleReaper
+from .readiness import wait_until_ready
+from .kubeconfig import write_kubeconfig, kubeconfig_digest, changes_kube_config
+from .teardown import teardown_containers
+from .async_views import run_blocking, async_require_http_methods, async_csrf_exempt
+from .scheduler import exec_scheduler, SchedulerFull
+from .jobs import JobRunner, FINISHED_STATUSES, ATTACHMENT_GRACE, read_job_output, serialize_job
+from .history import history_sink, encode_cursor, decode_cursor
+from .kube_api import KubeApiPool
+from .command_cache import command_cache, is_mutating
+from .kube_cache import KubeCacheVolume
 import json
+import asyncio
+import hashlib
+from collections import deque
+from contextlib import asynccontextmanager
 import yaml
 import uuid
 import tempfile
@@ -16,112 +47,107 @@ import io
 import tarfile
 import threading
 import queue
+import codecs
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Global dictionary to store active containers
+# Global dictionary to store container managers known to this worker process.
+# The session registry shares the session -> container mapping with other workers.
 active_containers = {}
 
 # Global dictionary to store active kubectl-ai sessions
 active_ai_sessions = {}
 
-# Docker image name
-KUBECTL_IMAGE_NAME = "your-kubectl-image:latest"
-
 def ensure_docker_image():
-    """Ensure the kubectl Docker image exists, build it if it doesn't"""
-    try:
-        docker_client = docker.from_env()
-    except docker.errors.DockerException as e:
-        print(f"❌ Docker connection error: {e}")
-        return False
-        
-    try:
-        # Check if image exists
-        try:
-            docker_client.images.get(KUBECTL_IMAGE_NAME)
-            print(f"✅ Docker image {KUBECTL_IMAGE_NAME} already exists")
-            return True
-        except docker.errors.ImageNotFound:
-            print(f"🔨 Building Docker image {KUBECTL_IMAGE_NAME}...")
-            return build_docker_image(docker_client)
-            
-    except Exception as e:
-        print(f"❌ Error checking Docker image: {e}")
-        return False
-
-def build_docker_image(docker_client):
-    """Build the kubectl Docker image"""
-    try:
-        # Create Dockerfile content
-        dockerfile_content = """FROM alpine:3.18
-
-# Install tools + download both binaries in one layer
-RUN apk add --no-cache curl tar ca-certificates bash vim nano expect \\
-    && curl -sSL https://dl.k8s.io/release/$(curl -L -s https://dl.k8s.io/release/stable.txt)/bin/linux/amd64/kubectl \\
-       -o /usr/local/bin/kubectl \\
-    && chmod +x /usr/local/bin/kubectl \\
-    && curl -sSL https://github.com/GoogleCloudPlatform/kubectl-ai/releases/download/v0.0.18/kubectl-ai_Linux_x86_64.tar.gz \\
-       | tar -xz -C /usr/local/bin \\
-    && chmod +x /usr/local/bin/kubectl-ai
-
-# Create kube directory
-RUN mkdir -p /root/.kube
-
-# Set working directory
-WORKDIR /root
-
-# Set environment variables
-ENV TERM=xterm-256color
-ENV KUBECONFIG=/root/.kube/config
-
-# Keep container running
-CMD ["/bin/sh"]
-"""
-        
-        # Create a tar archive in memory with the Dockerfile
-        dockerfile_tar = io.BytesIO()
-        with tarfile.open(fileobj=dockerfile_tar, mode='w') as tar:
-            dockerfile_info = tarfile.TarInfo(name='Dockerfile')
-            dockerfile_info.size = len(dockerfile_content.encode('utf-8'))
-            tar.addfile(dockerfile_info, io.BytesIO(dockerfile_content.encode('utf-8')))
-        
-        dockerfile_tar.seek(0)
-        
-        print("🔨 Starting Docker image build...")
-        
-        # Build the image
-        image, build_logs = docker_client.images.build(
-            fileobj=dockerfile_tar,
-            custom_context=True,
-            tag=KUBECTL_IMAGE_NAME,
-            rm=True,
-            nocache=False
-        )
-        
-        # Print build logs
-        for log in build_logs:
-            if 'stream' in log:
-                print(f"🔨 {log['stream'].strip()}")
-        
-        print(f"✅ Successfully built Docker image: {KUBECTL_IMAGE_NAME}")
-        
-        # Test the image
-        test_container = docker_client.containers.run(
-            image=KUBECTL_IMAGE_NAME,
-            command="kubectl version --client",
-            remove=True,
-            detach=False
-        )
-        
-        print("✅ Docker image test successful")
+    """Check that the kubectl Docker image is ready without building it inline"""
+    if image_manager.ensure_ready(wait=settings.IMAGE_READY_WAIT):
         return True
-        
-    except Exception as e:
-        print(f"❌ Error building Docker image: {e}")
-        return False
+    print(f"🔨 Docker image {KUBECTL_IMAGE_NAME} is still being prepared")
+    return False
+
+
+def recently_active_clusters():
+    """Ids of clusters in use within KUBE_CACHE_MAX_AGE, whose kubectl caches are kept"""
+    cutoff = timezone.now() - timedelta(seconds=settings.KUBE_CACHE_MAX_AGE)
+    return KubernetesCluster.objects.filter(
+        Q(created_at__gte=cutoff) | Q(chat_sessions__last_activity__gte=cutoff),
+        is_active=True
+    ).values_list('pk', flat=True).distinct()
+
+
+# Per-cluster kubectl discovery/HTTP caches, one volume per cluster shared by its terminal containers
+kube_cache = KubeCacheVolume(
+    get_docker_client,
+    settings.KUBE_CACHE_VOLUME,
+    interval=settings.KUBE_CACHE_EVICT_INTERVAL,
+    active_clusters=recently_active_clusters
+)
+
+
+# Pool of pre-started containers that new sessions claim instead of cold starting one
+warm_pool = WarmPool(
+    KUBECTL_IMAGE_NAME,
+    size=settings.WARM_POOL_SIZE,
+    low_watermark=settings.WARM_POOL_LOW_WATERMARK,
+    interval=settings.WARM_POOL_REPLENISH_INTERVAL,
+    prepare=lambda: image_manager.ensure_ready(wait=None),
+    ready_timeout=settings.CONTAINER_READY_TIMEOUT,
+    lock_dir=os.path.join(settings.SESSION_REGISTRY_PATH, 'warm-pool')
+)
+
+
+# Pauses and then stops containers of idle sessions; sessions with an open terminal or a running job stay awake
+idle_reaper = IdleReaper(
+    get_docker_client,
+    pause_after=settings.IDLE_PAUSE_AFTER,
+    stop_after=settings.IDLE_STOP_AFTER,
+    max_running=settings.MAX_RUNNING_CONTAINERS,
+    interval=settings.IDLE_REAPER_INTERVAL,
+    is_busy=session_registry.attached
+)
+
+
+# Background runner for long commands submitted as jobs
+job_runner = JobRunner(max_workers=settings.JOB_WORKERS, scheduler=exec_scheduler)
+
+# One pooled Kubernetes API client per cluster for read-only kubectl commands,
+# optionally backed by watch-based informer caches
+kube_api = KubeApiPool(
+    pool_size=settings.KUBE_API_POOL_SIZE,
+    request_timeout=settings.KUBE_API_TIMEOUT,
+    enabled=settings.KUBE_API_FAST_PATH,
+    informers=settings.INFORMERS_ENABLED,
+    max_staleness=settings.INFORMER_MAX_STALENESS,
+    informer_max_objects=settings.INFORMER_MAX_OBJECTS,
+    informer_resync=settings.INFORMER_RESYNC_PERIOD,
+    informer_idle_timeout=settings.INFORMER_IDLE_TIMEOUT
+)
+
+
+def run_on_api(session_id, cluster, command):
+    """Answer a read-only kubectl command from the Kubernetes API, or None to run it in the container.
+
+    The API only knows the stored kubeconfig, so sessions whose container may
+    have switched context, namespace or kubeconfig always use the container.
+    """
+    if not kube_api.enabled or session_registry.kube_config_changed(session_id):
+        return None
+    return kube_api.run(cluster, command)
+
+
+def start_background_services():
+    """Start background services for the serving process"""
+    image_manager.start()
+    warm_pool.start()
+    idle_reaper.start()
+    history_sink.start()
+    kube_cache.start()
+    threading.Thread(target=recover_jobs, name="job-recovery", daemon=True).start()
+    threading.Thread(target=reconcile_session_containers, name="reconciler", daemon=True).start()
 
 
 class KubectlAiSession:
@@ -256,16 +282,20 @@ class KubectlAiSession:
         
         try:
             if any(word in query_lower for word in ['how many pods', 'count pods', 'number of pods']):
-                result = self.container_manager.execute_command('kubectl get pods --no-headers | wc -l')
-                return f"Number of pods: {result['output'].strip()}"
+                result = self._kubectl('kubectl get pods --no-headers')
+                if result['exit_code'] != 0 or result['output'].startswith('No resources found'):
+                    count = 0
+                else:
+                    count = len([line for line in result['output'].splitlines() if line.strip()])
+                return f"Number of pods: {count}"
             elif any(word in query_lower for word in ['show pods', 'list pods', 'get pods']):
-                result = self.container_manager.execute_command('kubectl get pods')
+                result = self._kubectl('kubectl get pods')
                 return result['output']
             elif any(word in query_lower for word in ['show services', 'list services']):
-                result = self.container_manager.execute_command('kubectl get services')
+                result = self._kubectl('kubectl get services')
                 return result['output']
             elif any(word in query_lower for word in ['show nodes', 'list nodes']):
-                result = self.container_manager.execute_command('kubectl get nodes')
+                result = self._kubectl('kubectl get nodes')
                 return result['output']
             else:
                 # Try to extract intent and run a general query
@@ -274,6 +304,13 @@ class KubectlAiSession:
         except:
             return f"❌ Unable to execute fallback command for: {query}"
     
+    def _kubectl(self, command):
+        """Run a kubectl command, answering it from the Kubernetes API when possible"""
+        result = run_on_api(self.container_manager.session_id, self.container_manager.cluster, command)
+        if result is None:
+            result = self.container_manager.execute_command(command)
+        return result
+    
     def clean_kubectl_ai_output(self, output):
         """Clean and format kubectl-ai output"""
         if not output:
@@ -331,20 +368,57 @@ class KubernetesContainer:
         self.session_id = session_id
         self.container = None
         try:
-            self.docker_client = docker.from_env()
+            self.docker_client = get_docker_client()
         except docker.errors.DockerException as e:
             print(f"❌ Docker connection error: {e}")
             self.docker_client = None
-        self.container_name = f"k8s-terminal-{session_id}"
+        # With CONTAINER_PLACEMENT=cluster all sessions of the cluster share one container
+        self.shared = shared_placement()
+        self.container_key = container_key_for(cluster.pk, session_id)
+        self.container_name = container_name_for(cluster.pk, session_id)
         self.running = False
+        self.shell = None
+        # The session's own directory in a shared container; its shells start there
+        self.home = session_home(session_id)
+        self.workdir = self.home
+        # Digest of the kubeconfig known to be in the container, None if unknown
+        self.kubeconfig_digest = None
         
     def create_container(self):
         """Create a Docker container with kubectl and kubectl-ai"""
+        self.close_shell()
+        self.workdir = self.home
         try:
             # Check if Docker client is available
             if self.docker_client is None:
                 print(f"❌ Docker client not available - is Docker running?")
                 return False
+            
+            # Another session of the cluster may have started the shared container already
+            if self.shared and self.adopt_container():
+                return True
+            
+            # Get GEMINI_API_KEY from environment
+            gemini_api_key = os.getenv('GEMINI_API_KEY')
+            if not gemini_api_key:
+                print(f"❌ GEMINI_API_KEY not found in environment")
+                return False
+            
+            # Claim a pre-started container from the warm pool if one is available
+            pooled_container = warm_pool.claim(self.container_name)
+            if pooled_container is not None:
+                self.container = pooled_container
+                if self.install_kubeconfig():
+                    # Pooled containers can't mount the cluster's cache volume; fill their own cache instead
+                    self.prewarm_cache()
+                    self._prepare_home()
+                    self.running = True
+                    session_registry.register(self.session_id, self.container.id)
+                    print(f"🔥 Claimed warm container: {self.container_name}")
+                    return True
+                print(f"❌ Failed to configure warm container, creating a new one")
+                self.container.remove(force=True)
+                self.container = None
                 
             # Ensure Docker image exists (build if needed)
             if not ensure_docker_image():
@@ -354,12 +428,6 @@ class KubernetesContainer:
             # Encode kubeconfig to base64 for passing to container
             kubeconfig_b64 = base64.b64encode(self.cluster.kubeconfig.encode()).decode()
             
-            # Get GEMINI_API_KEY from environment
-            gemini_api_key = os.getenv('GEMINI_API_KEY')
-            if not gemini_api_key:
-                print(f"❌ GEMINI_API_KEY not found in environment")
-                return False
-            
             print(f"🐳 Creating container: {self.container_name}")
             
             # Create container with kubectl and kubectl-ai
@@ -371,54 +439,245 @@ class KubernetesContainer:
                     'GEMINI_API_KEY': gemini_api_key,
                     'TERM': 'xterm-256color'
                 },
-                command=["/bin/sh", "-c", "echo $KUBECONFIG_B64 | base64 -d > /root/.kube/config && mkdir -p /root/.kube && export KUBECONFIG=/root/.kube/config && tail -f /dev/null"],
+                command=["/bin/sh", "-c", f"echo $KUBECONFIG_B64 | base64 -d > /root/.kube/config && mkdir -p /root/.kube && export KUBECONFIG=/root/.kube/config && tail -f /dev/null"],
                 stdin_open=True,
                 tty=True,
                 detach=True,
                 remove=False,
                 working_dir="/root",
-                volumes={}
+                volumes=kube_cache.volumes(self.cluster.pk)
             )
             
-            # Wait a moment for container to initialize
-            time.sleep(2)
-            
-            # Verify container is running
-            self.container.reload()
-            if self.container.status == 'running':
+            # Wait until the kubeconfig is written and the container accepts commands
+            if wait_until_ready(
+                self.container,
+                timeout=settings.CONTAINER_READY_TIMEOUT,
+                probe=['/bin/sh', '-c', 'test -f /root/.kube/config']
+            ):
                 self.running = True
+                self.kubeconfig_digest = kubeconfig_digest(self.cluster.kubeconfig)
+                self._prepare_home()
+                session_registry.register(self.session_id, self.container.id)
                 print(f"✅ Container created and running: {self.container_name}")
                 return True
             else:
                 print(f"❌ Container failed to start: {self.container.status}")
                 return False
             
+        except docker.errors.ImageNotFound as e:
+            print(f"❌ Docker image missing, preparing it again: {e}")
+            image_manager.invalidate()
+            image_manager.start()
+            return False
         except Exception as e:
             print(f"❌ Error creating container: {e}")
             return False
     
+    def adopt_container(self, container=None, wake=True):
+        """Attach to the session's existing container, started by this or another worker.
+        
+        With ``wake`` unset, a paused (hibernated) container is adopted as is
+        and resumed on first use.
+        """
+        if self.docker_client is None:
+            return False
+        if container is None:
+            try:
+                container = self.docker_client.containers.get(self.container_name)
+            except docker.errors.NotFound:
+                return False
+            except Exception as e:
+                print(f"❌ Error looking up container {self.container_name}: {e}")
+                return False
+        
+        if container.status == 'paused' and not wake:
+            self.close_shell()
+            self.container = container
+            session_registry.register(self.session_id, container.id, state='paused')
+            print(f"🔗 Adopted hibernated container: {self.container_name}")
+            return True
+        
+        status = container.status
+        try:
+            if status == 'paused':
+                container.unpause()
+            elif status != 'running':
+                container.start()
+            container.reload()
+        except Exception as e:
+            print(f"❌ Error starting existing container {self.container_name}: {e}")
+            return False
+        
+        if container.status != 'running':
+            return False
+        
+        self.close_shell()
+        self.container = container
+        self.running = True
+        if status != 'running':
+            self._after_wake(status)
+        else:
+            self._prepare_home()
+        session_registry.register(self.session_id, container.id)
+        print(f"🔗 Adopted existing container: {self.container_name}")
+        return True
+    
+    def install_kubeconfig(self):
+        """Write the cluster kubeconfig into the container without restarting anything.
+        
+        Paused or stopped containers get it when they are resumed.
+        """
+        self.container.reload()
+        if self.container.status != 'running':
+            self.kubeconfig_digest = None
+            return True
+        if not write_kubeconfig(self.container, self.cluster.kubeconfig):
+            return False
+        self.kubeconfig_digest = kubeconfig_digest(self.cluster.kubeconfig)
+        return True
+    
+    def sync_kubeconfig(self):
+        """Install the cluster's current kubeconfig if the container may have an older one"""
+        self.cluster.refresh_from_db(fields=['kubeconfig'])
+        if self.kubeconfig_digest != kubeconfig_digest(self.cluster.kubeconfig):
+            if not self.install_kubeconfig():
+                print(f"❌ Failed to install kubeconfig in {self.container_name}")
+    
+    def _after_wake(self, previous_status):
+        """Catch a container up after it was paused or stopped"""
+        # The session's last activity may be long past; keep the reaper from hibernating it again right away
+        chat_session_id = ChatSession.objects.filter(session_id=self.session_id).values_list('pk', flat=True).first()
+        if chat_session_id is not None:
+            history_sink.touch(chat_session_id)
+        if previous_status != 'paused':
+            # A restarted container runs its command again, which writes the kubeconfig it was created with
+            self.kubeconfig_digest = None
+            wait_until_ready(self.container, timeout=settings.CONTAINER_READY_TIMEOUT)
+        self._prepare_home()
+        self.sync_kubeconfig()
+    
+    def _prepare_home(self):
+        """Create the session's home directory in a shared container"""
+        if self.shared:
+            self.container.exec_run(cmd=['mkdir', '-p', self.home])
+    
+    def _set_state(self, state):
+        """Record the container's state for every session using it"""
+        session_ids = session_registry.sessions_for(self.container.id) if self.shared else [self.session_id]
+        for session_id in session_ids:
+            session_registry.update_state(session_id, state)
+    
+    def get_shell(self):
+        """Get the persistent shell for this session, creating it on first use"""
+        if self.shell is None:
+            self.shell = PersistentShell(
+                self.docker_client,
+                self.container,
+                environment={
+                    'KUBECONFIG': '/root/.kube/config',
+                    'GEMINI_API_KEY': os.getenv('GEMINI_API_KEY', '')
+                },
+                workdir=self.workdir
+            )
+        return self.shell
+    
+    def prewarm_cache(self):
+        """Fill the container's kubectl discovery cache (its cluster's volume, unless pooled) in the background"""
+        if kube_cache.enabled and settings.KUBE_CACHE_PREWARM:
+            threading.Thread(
+                target=kube_cache.prewarm,
+                args=(self.container,),
+                name=f"kube-cache-prewarm-{self.cluster.pk}",
+                daemon=True
+            ).start()
+    
+    def close_shell(self):
+        """Close the persistent shell if one is open, remembering its cwd for the next one"""
+        if self.shell is not None:
+            self.workdir = self.shell.cwd or self.workdir
+            self.shell.close()
+            self.shell = None
+    
     def execute_command(self, command):
+        """Execute command in the container, answering repeated kubectl reads from the result cache"""
+        scope = self.cache_scope()
+        generation = command_cache.generation(self.cluster.pk)
+        cached = command_cache.get(self.cluster.pk, command, scope)
+        if cached is not None:
+            return cached
+        result = self._execute_command(command)
+        command_cache.record(self.cluster.pk, command, result, scope, generation)
+        self.note_kube_config_change(command)
+        return result
+    
+    def cache_scope(self):
+        """Result cache scope: the cluster's shared one, or the container's own once it may have switched context"""
+        if command_cache.enabled and self.container is not None and session_registry.kube_config_changed(self.session_id):
+            return self.container.id
+        return None
+    
+    def note_kube_config_change(self, command):
+        """Turn the API fast path off for this container once a command may have switched its context"""
+        if self.container is not None and changes_kube_config(command):
+            session_registry.mark_kube_config_changed(self.container.id)
+    
+    def _execute_command(self, command):
         """Execute command in the container"""
         if not self.container or not self.running:
             return {'output': '❌ Container not available', 'exit_code': 1}
             
+        print(f"🐳 Executing in {self.container_name}: {command}")
+        
+        # Regular command execution
+        timeout = settings.COMMAND_TIMEOUT
+        
+        if settings.PERSISTENT_SHELL_ENABLED:
+            try:
+                result = self.get_shell().run(command, timeout=timeout)
+                if result['exit_code'] == 124:
+                    result['output'] += f"\n⏱️ Command timed out after {timeout} seconds"
+                print(f"🐳 Command exit code: {result['exit_code']}")
+                return result
+            except ShellUnavailable as e:
+                # The command never reached the shell, so running it again is safe
+                print(f"❌ Persistent shell failed, falling back to exec: {e}")
+                self.close_shell()
+            except Exception as e:
+                # The command may have run: re-running it could repeat its side effects
+                print(f"❌ Persistent shell failed mid-command: {e}")
+                self.close_shell()
+                return {'output': f'❌ Error executing command: {str(e)}', 'exit_code': 1}
+        
+        return self.execute_command_oneshot(command, timeout)
+    
+    def execute_batch(self, commands, stop_on_error=False):
+        """Run ``commands`` in order in the session's shell.
+        
+        Returns one result per command; with ``stop_on_error``, commands after
+        the first failure are not run and get None.
+        """
+        results = []
+        for command in commands:
+            if stop_on_error and any(result and result['exit_code'] != 0 for result in results):
+                results.append(None)
+                continue
+            results.append(self.execute_command(command))
+        return results
+    
+    def execute_command_oneshot(self, command, timeout):
+        """Execute command in a fresh shell via its own Docker exec"""
         try:
-            print(f"🐳 Executing in {self.container_name}: {command}")
-            
-            # Regular command execution
-            timeout = 30  # 30 seconds for regular commands
-            
             # Get GEMINI_API_KEY from environment
             gemini_api_key = os.getenv('GEMINI_API_KEY', '')
             
             # Execute command in container with proper environment and timeout
             exec_result = self.container.exec_run(
-                cmd=['/bin/sh', '-c', f'cd /root && export KUBECONFIG=/root/.kube/config && export GEMINI_API_KEY={gemini_api_key} && timeout {timeout} {command}'],
+                cmd=['/bin/sh', '-c', f'cd {self.home} && export KUBECONFIG=/root/.kube/config && export GEMINI_API_KEY={gemini_api_key} && timeout {timeout} {command}'],
                 stdout=True,
                 stderr=True,
                 stdin=False,
                 tty=False,
-                workdir='/root'
+                workdir=self.home
             )
             
             # Get output
@@ -443,6 +702,126 @@ class KubernetesContainer:
                 'exit_code': 1
             }
     
+    def stream_command(self, command):
+        """Execute command in the container, yielding ('output', text) chunks and finally ('exit', code)"""
+        try:
+            yield from self._stream_command(command)
+        finally:
+            # Streamed output isn't cached, but a mutation still makes cached reads stale
+            if is_mutating(command):
+                command_cache.invalidate(self.cluster.pk if self.cache_scope() is None else None)
+            self.note_kube_config_change(command)
+    
+    def _stream_command(self, command):
+        if not self.container or not self.running:
+            yield ('output', '❌ Container not available')
+            yield ('exit', 1)
+            return
+        
+        print(f"🐳 Streaming in {self.container_name}: {command}")
+        timeout = settings.COMMAND_TIMEOUT
+        
+        if settings.PERSISTENT_SHELL_ENABLED:
+            try:
+                for kind, value in self.get_shell().stream(command, timeout=timeout):
+                    if kind == 'exit' and value == 124:
+                        yield ('output', f"\n⏱️ Command timed out after {timeout} seconds")
+                    yield (kind, value)
+                return
+            except ShellUnavailable as e:
+                # The command never reached the shell, so running it again is safe
+                self.close_shell()
+                print(f"❌ Persistent shell failed, falling back to exec: {e}")
+            except Exception as e:
+                self.close_shell()
+                yield ('output', f'\n❌ Error executing command: {str(e)}')
+                yield ('exit', 1)
+                return
+        
+        yield from self.stream_command_oneshot(command, timeout)
+    
+    def stream_command_oneshot(self, command, timeout):
+        """Stream a command's output from its own Docker exec"""
+        try:
+            gemini_api_key = os.getenv('GEMINI_API_KEY', '')
+            api = self.docker_client.api
+            exec_id = api.exec_create(
+                self.container.id,
+                cmd=['/bin/sh', '-c', f'cd {self.home} && export KUBECONFIG=/root/.kube/config && export GEMINI_API_KEY={gemini_api_key} && timeout {timeout} {command}'],
+                stdout=True,
+                stderr=True,
+                stdin=False,
+                tty=False,
+                workdir=self.home
+            )['Id']
+            
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+            for chunk in api.exec_start(exec_id, stream=True):
+                text = decoder.decode(chunk)
+                if text:
+                    yield ('output', text)
+            text = decoder.decode(b'', final=True)
+            if text:
+                yield ('output', text)
+            
+            exit_code = api.exec_inspect(exec_id)['ExitCode']
+            if exit_code == 124:
+                yield ('output', f"\n⏱️ Command timed out after {timeout} seconds")
+            yield ('exit', exit_code)
+            
+        except Exception as e:
+            print(f"❌ Error streaming command: {e}")
+            yield ('output', f'❌ Error executing command: {str(e)}')
+            yield ('exit', 1)
+    
+    def resume(self):
+        """Bring a hibernated container back, keeping its files and the shell's cwd.
+        
+        A paused container is unpaused with its shell intact; a stopped one is
+        started again and gets a new shell in the last known cwd.
+        """
+        if self.container is None:
+            return self.adopt_container()
+        
+        start = time.monotonic()
+        try:
+            self.container.reload()
+            status = self.container.status
+            if status == 'paused':
+                self.container.unpause()
+            elif status != 'running':
+                self.close_shell()
+                self.container.start()
+            self.container.reload()
+        except docker.errors.NotFound:
+            return False
+        except Exception as e:
+            print(f"❌ Error resuming container {self.container_name}: {e}")
+            return False
+        
+        if self.container.status != 'running':
+            return False
+        
+        self.running = True
+        if status != 'running':
+            self._after_wake(status)
+            elapsed = time.monotonic() - start
+            metrics.observe('hibernation.resume_seconds', elapsed)
+            metrics.incr(f'hibernation.resumed_from_{status}')
+            self._set_state('running')
+            print(f"⏰ Resumed {status} container {self.container_name} in {elapsed:.2f}s")
+        return True
+    
+    def ensure_running(self):
+        """Make sure the container runs: resume it if hibernated, recreate it if it is gone"""
+        if self.is_running() or self.resume():
+            return True
+        print(f"🐳 Container not running, recreating...")
+        if self.create_container():
+            print(f"✅ Container recreated successfully")
+            return True
+        return False
+    
     def is_running(self):
         """Check if container is still running"""
         try:
@@ -454,18 +833,245 @@ class KubernetesContainer:
             return False
     
     def stop_container(self):
-        """Stop and remove the container"""
+        """Stop and remove the container; a shared one only once no other session uses it"""
         try:
             self.running = False
+            self.close_shell()
+            if self.shared and self.container:
+                with session_registry.lock(self.container_key):
+                    session_registry.unregister(self.session_id)
+                    if session_registry.sessions_for(self.container.id):
+                        print(f"🔗 Detached session {self.session_id} from shared container {self.container_name}")
+                        return
             if self.container:
                 print(f"🐳 Stopping container: {self.container_name}")
                 self.container.stop(timeout=10)
                 self.container.remove()
                 print(f"✅ Container stopped and removed: {self.container_name}")
+            session_registry.unregister(self.session_id)
         except Exception as e:
             print(f"❌ Error stopping container: {e}")
 
 
+def record_command(chat_session, command, output, exit_code):
+    """Queue a command for history; the session's last activity is bumped with it"""
+    history_sink.record(chat_session.pk, command, output, exit_code)
+
+
+@asynccontextmanager
+async def exec_attachment(session_id, timeout=None):
+    """Keep the idle reaper of every worker away from the session's container while commands run.
+
+    The lease lasts ``timeout`` (COMMAND_TIMEOUT by default) plus a grace
+    period, so a worker that dies mid-command does not pin the container.
+    """
+    key = f"exec:{uuid.uuid4().hex}"
+    timeout = settings.COMMAND_TIMEOUT if timeout is None else timeout
+    await run_blocking(session_registry.attach, session_id, key, timeout + ATTACHMENT_GRACE)
+    try:
+        yield
+    finally:
+        await run_blocking(session_registry.detach, session_id, key)
+
+
+def format_stream_event(stream_format, event):
+    """Encode a streaming event as an NDJSON line or an SSE message"""
+    if stream_format == 'sse':
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    return json.dumps(event) + "\n"
+
+
+def stream_result_response(result, stream_format):
+    """Stream an already finished command's result as an output frame and an exit frame"""
+    
+    async def events():
+        if result['output']:
+            yield format_stream_event(stream_format, {'type': 'output', 'data': result['output']})
+        yield format_stream_event(stream_format, {
+            'type': 'exit',
+            'success': True,
+            'exit_code': result['exit_code'],
+            'queue_wait_ms': 0.0
+        })
+    
+    content_type = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    response = StreamingHttpResponse(events(), content_type=content_type)
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def stream_command_response(chat_session, container_manager, command, stream_format):
+    """Stream a command's output as it arrives, finishing with an exit frame"""
+    
+    async def events():
+        async with exec_attachment(chat_session.session_id):
+            try:
+                ticket = await exec_scheduler.acquire(chat_session.session_id)
+            except SchedulerFull as e:
+                yield format_stream_event(stream_format, {'type': 'error', 'error': f'⏳ Too many queued commands: {e}'})
+                return
+            
+            output_chunks = []
+            exit_code = 1
+            recorded = False
+            iterator = container_manager.stream_command(command)
+            # Pull chunks off the request thread so waiting on output never blocks other views
+            pull = sync_to_async(next, thread_sensitive=False)
+            try:
+                while True:
+                    event = await pull(iterator, None)
+                    if event is None:
+                        break
+                    kind, value = event
+                    if kind == 'output':
+                        output_chunks.append(value)
+                        yield format_stream_event(stream_format, {'type': 'output', 'data': value})
+                    else:
+                        exit_code = value
+                
+                record_command(chat_session, command, ''.join(output_chunks), exit_code)
+                recorded = True
+                yield format_stream_event(stream_format, {
+                    'type': 'exit',
+                    'success': True,
+                    'exit_code': exit_code,
+                    'queue_wait_ms': round(ticket['queue_wait'] * 1000, 1)
+                })
+            finally:
+                exec_scheduler.release(ticket)
+                if not recorded:
+                    # Client disconnected: stop the command and keep what was produced so far
+                    try:
+                        await sync_to_async(iterator.close, thread_sensitive=False)()
+                    except Exception as e:
+                        print(f"❌ Error stopping streamed command: {e}")
+                    record_command(chat_session, command, ''.join(output_chunks), exit_code)
+    
+    content_type = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    response = StreamingHttpResponse(events(), content_type=content_type)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def get_container_manager(chat_session, create=True, wake=True):
+    """Return the session's container manager.
+    
+    Adopts the session's existing container if another worker (or a previous
+    process) started it, and otherwise creates one when ``create`` is set.
+    Hibernated containers are left paused unless ``wake`` is set.
+    The registry lock (of the cluster, with shared containers) keeps workers
+    from creating duplicate containers.
+    """
+    session_id = chat_session.session_id
+    container_manager = active_containers.get(session_id)
+    if container_manager is not None:
+        return container_manager
+    
+    with session_registry.lock(container_key_for(chat_session.cluster_id, session_id)):
+        container_manager = active_containers.get(session_id)
+        if container_manager is not None:
+            return container_manager
+        
+        container_manager = KubernetesContainer(chat_session.cluster, session_id)
+        if container_manager.docker_client is None:
+            return None
+        if container_manager.adopt_container(wake=wake) or (create and container_manager.create_container()):
+            active_containers[session_id] = container_manager
+            return container_manager
+    return None
+
+
+def adopt_session_container(chat_session, container):
+    """Register an existing container found by the startup reconciler"""
+    session_id = chat_session.session_id
+    with session_registry.lock(container_key_for(chat_session.cluster_id, session_id)):
+        if session_id in active_containers:
+            return True
+        container_manager = KubernetesContainer(chat_session.cluster, session_id)
+        if container_manager.adopt_container(container, wake=False):
+            active_containers[session_id] = container_manager
+            return True
+    return False
+
+
+def teardown_session_containers(session_ids, cluster_ids=()):
+    """Stop and remove the containers of ``session_ids`` concurrently, within TEARDOWN_DEADLINE.
+    
+    The sessions' references to shared cluster containers are dropped, and a
+    shared container is removed once no session references it, or when its
+    cluster is in ``cluster_ids``.
+    """
+    session_ids = set(session_ids)
+    cluster_ids = {str(cluster_id) for cluster_id in cluster_ids}
+    for session_id in session_ids:
+        container_manager = active_containers.pop(session_id, None)
+        if container_manager is not None:
+            container_manager.running = False
+            container_manager.close_shell()
+    if not session_ids and not cluster_ids:
+        return None
+    
+    referenced = set()
+    for session_id in session_ids:
+        record = session_registry.lookup(session_id)
+        if record is not None:
+            referenced.add(record['container_id'])
+        session_registry.unregister(session_id)
+    
+    try:
+        docker_client = get_docker_client()
+        containers = [
+            container
+            for container in docker_client.containers.list(all=True, filters={'name': SESSION_CONTAINER_PREFIX})
+            if container.name[len(SESSION_CONTAINER_PREFIX):] in session_ids
+        ]
+        if referenced or cluster_ids:
+            containers.extend(
+                container
+                for container in docker_client.containers.list(all=True, filters={'name': CLUSTER_CONTAINER_PREFIX})
+                if container.name.startswith(CLUSTER_CONTAINER_PREFIX) and (
+                    container.name[len(CLUSTER_CONTAINER_PREFIX):] in cluster_ids
+                    or (container.id in referenced and not session_registry.sessions_for(container.id))
+                )
+            )
+    except docker.errors.DockerException as e:
+        print(f"❌ Docker connection error: {e}")
+        return None
+    
+    return teardown_containers(
+        containers,
+        stop_timeout=settings.TEARDOWN_STOP_TIMEOUT,
+        deadline=settings.TEARDOWN_DEADLINE,
+        max_workers=settings.TEARDOWN_WORKERS,
+        label="session containers"
+    )
+
+
+def recover_jobs():
+    """Fail jobs whose worker exited before finishing them"""
+    try:
+        job_runner.recover()
+    except Exception as e:
+        print(f"❌ Error recovering jobs: {e}")
+    finally:
+        connection.close()
+
+
+def reconcile_session_containers():
+    """Adopt containers that survived a restart and remove orphans"""
+    try:
+        reconcile_containers(
+            get_docker_client(),
+            adopt_session_container,
+            max_workers=settings.RECONCILE_WORKERS
+        )
+    except Exception as e:
+        print(f"❌ Error reconciling containers: {e}")
+    finally:
+        connection.close()
+
+
 def index(request):
     """Render the main chat interface."""
     clusters = KubernetesCluster.objects.filter(is_active=True)
@@ -478,12 +1084,8 @@ def terminal_view(request, session_id):
         chat_session = get_object_or_404(ChatSession, session_id=session_id)
         
         # Ensure container exists
-        if session_id not in active_containers:
-            container_manager = KubernetesContainer(chat_session.cluster, session_id)
-            if container_manager.docker_client and container_manager.create_container():
-                active_containers[session_id] = container_manager
-            else:
-                return redirect('/')
+        if get_container_manager(chat_session) is None:
+            return redirect('/')
         
         context = {
             'session_id': session_id,
@@ -498,9 +1100,9 @@ def terminal_view(request, session_id):
         return redirect('/')
 
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def create_cluster(request):
+@async_csrf_exempt
+@async_require_http_methods(["POST"])
+async def create_cluster(request):
     """Create a new Kubernetes cluster configuration and container."""
     try:
         data = json.loads(request.body)
@@ -524,40 +1126,49 @@ def create_cluster(request):
                 'error': f'Invalid kubeconfig format: {str(e)}'
             })
         
+        # Sessions can only start once the terminal image is ready
+        if not await run_blocking(ensure_docker_image):
+            return JsonResponse({
+                'success': False,
+                'error': '🔨 The terminal image is still being prepared. Please try again in a moment.',
+                'image_ready': False
+            })
+        
         # Create cluster object
-        cluster = KubernetesCluster.objects.create(
+        cluster = await KubernetesCluster.objects.acreate(
             name=cluster_name,
             kubeconfig=kubeconfig_content
         )
         
         # Create a chat session
         session_id = str(uuid.uuid4())
-        chat_session = ChatSession.objects.create(
+        chat_session = await ChatSession.objects.acreate(
             cluster=cluster,
             session_id=session_id,
             name=f"{cluster_name} Terminal"
         )
         
         # Create Docker container for this cluster
-        container_manager = KubernetesContainer(cluster, session_id)
-        if container_manager.create_container():
+        container_manager = await run_blocking(KubernetesContainer, cluster, session_id)
+        if await run_blocking(container_manager.create_container):
             # Store container manager
             active_containers[session_id] = container_manager
             
             # Test connection in the actual container
             print(f"🧪 Testing connection in container...")
-            test_result = container_manager.execute_command('kubectl version --client')
+            test_result = await run_blocking(container_manager.execute_command, 'kubectl version --client')
             if test_result['exit_code'] == 0:
                 cluster.connection_status = 'connected'
                 cluster.connection_error = ''
                 print(f"✅ Container ready with kubectl")
+                container_manager.prewarm_cache()
             else:
                 cluster.connection_status = 'error'
                 cluster.connection_error = test_result['output'][:500]
                 print(f"❌ kubectl test failed: {test_result['output'][:100]}")
             
             cluster.last_connection_check = timezone.now()
-            cluster.save()
+            await cluster.asave()
             
             return JsonResponse({
                 'success': True,
@@ -566,7 +1177,7 @@ def create_cluster(request):
                 'message': f'🐳 Container created! Status: {cluster.connection_status}'
             })
         else:
-            cluster.delete()  # Clean up if container creation failed
+            await cluster.adelete()  # Clean up if container creation failed
             return JsonResponse({
                 'success': False,
                 'error': 'Failed to create Docker container. Please check Docker is running and try again.'
@@ -580,12 +1191,12 @@ def create_cluster(request):
         })
 
 
-@csrf_exempt
-@require_http_methods(["POST"])
-def execute_command(request, session_id):
+@async_csrf_exempt
+@async_require_http_methods(["POST"])
+async def execute_command(request, session_id):
     """Execute a command in the cluster's Docker container."""
     try:
-        chat_session = get_object_or_404(ChatSession, session_id=session_id)
+        chat_session = await ChatSession.objects.select_related('cluster').aget(session_id=session_id)
         data = json.loads(request.body)
         command = data.get('command', '').strip()
         ai_mode = data.get('ai_mode', False)
@@ -600,20 +1211,18 @@ def execute_command(request, session_id):
         if ai_mode and session_id in active_ai_sessions:
             ai_session = active_ai_sessions[session_id]
             if ai_session.is_active:
-                # Send message to AI session
-                result = ai_session.send_message(command)
+                # Send message to AI session once the scheduler grants an exec slot
+                try:
+                    async with exec_attachment(session_id), exec_scheduler.slot(session_id):
+                        result = await run_blocking(ai_session.send_message, command)
+                except SchedulerFull as e:
+                    return JsonResponse({
+                        'success': False,
+                        'error': f'⏳ Too many queued commands: {e}'
+                    })
                 
                 # Store in command history
-                CommandHistory.objects.create(
-                    chat_session=chat_session,
-                    command=f"[AI] {command}",
-                    output=result.get('output', ''),
-                    exit_code=0 if result.get('success') else 1
-                )
-                
-                # Update session last activity
-                chat_session.last_activity = timezone.now()
-                chat_session.save()
+                record_command(chat_session, f"[AI] {command}", result.get('output', ''), 0 if result.get('success') else 1)
                 
                 return JsonResponse(result)
             else:
@@ -658,12 +1267,7 @@ This terminal runs in a dedicated Docker container with kubectl and kubectl-ai p
 Your GEMINI_API_KEY is configured for kubectl-ai usage."""
             
             # Store help command in history
-            CommandHistory.objects.create(
-                chat_session=chat_session,
-                command=command,
-                output=help_text,
-                exit_code=0
-            )
+            record_command(chat_session, command, help_text, 0)
             
             return JsonResponse({
                 'success': True,
@@ -681,51 +1285,58 @@ Your GEMINI_API_KEY is configured for kubectl-ai usage."""
         
         # Handle AI session activation
         if command.strip() == 'kubectl-ai':
-            return start_ai_session(request, session_id)
+            return await run_blocking(start_ai_session, request, session_id)
+        
+        # Read-only kubectl commands are answered from the Kubernetes API without a container exec
+        ai_session = active_ai_sessions.get(session_id)
+        if ai_session is None or not ai_session.is_active:
+            result = await run_blocking(run_on_api, session_id, chat_session.cluster, command)
+            if result is not None:
+                record_command(chat_session, command, result['output'], result['exit_code'])
+                if data.get('stream'):
+                    return stream_result_response(result, 'sse' if data.get('stream') == 'sse' else 'ndjson')
+                return JsonResponse({
+                    'success': True,
+                    'output': result['output'],
+                    'exit_code': result['exit_code'],
+                    'source': 'api'
+                })
         
         # Get container for this session
-        if session_id not in active_containers:
+        container_manager = await run_blocking(get_container_manager, chat_session, create=False)
+        if container_manager is None:
             return JsonResponse({
                 'success': False,
                 'error': '🐳 Container not found. Please refresh the page and try again.'
             })
         
-        container_manager = active_containers[session_id]
-        
-        # Check if container is still running
-        if not container_manager.is_running():
-            # Try to recreate container
-            print(f"🐳 Container not running, recreating...")
-            if container_manager.create_container():
-                print(f"✅ Container recreated successfully")
-            else:
-                return JsonResponse({
-                    'success': False,
-                    'error': '🐳 Container stopped and could not be restarted. Please refresh the page.'
-                })
+        # Resume the container if it was hibernated, recreate it if it is gone
+        if not await run_blocking(container_manager.ensure_running):
+            return JsonResponse({
+                'success': False,
+                'error': '🐳 Container stopped and could not be restarted. Please refresh the page.'
+            })
         
         # Check if this is an AI session message
         if session_id in active_ai_sessions:
             ai_session = active_ai_sessions[session_id]
             if ai_session.is_active:
-                # Send message to AI session
-                result = ai_session.send_message(command)
+                # Send message to AI session once the scheduler grants an exec slot
+                try:
+                    async with exec_attachment(session_id), exec_scheduler.slot(session_id):
+                        result = await run_blocking(ai_session.send_message, command)
+                except SchedulerFull as e:
+                    return JsonResponse({
+                        'success': False,
+                        'error': f'⏳ Too many queued commands: {e}'
+                    })
                 
                 # If AI session ended, remove it
                 if result.get('ai_session_ended'):
                     del active_ai_sessions[session_id]
                 
                 # Store in command history
-                CommandHistory.objects.create(
-                    chat_session=chat_session,
-                    command=command,
-                    output=result.get('output', ''),
-                    exit_code=0 if result.get('success') else 1
-                )
-                
-                # Update session last activity
-                chat_session.last_activity = timezone.now()
-                chat_session.save()
+                record_command(chat_session, command, result.get('output', ''), 0 if result.get('success') else 1)
                 
                 return JsonResponse({
                     'success': result.get('success', True),
@@ -734,25 +1345,35 @@ Your GEMINI_API_KEY is configured for kubectl-ai usage."""
                     'ai_session_active': result.get('session_active', False)
                 })
         
-        # Execute regular command in container
-        result = container_manager.execute_command(command)
+        # Stream output as it arrives when the client asks for it
+        stream_format = data.get('stream')
+        if stream_format:
+            return stream_command_response(
+                chat_session,
+                container_manager,
+                command,
+                'sse' if stream_format == 'sse' else 'ndjson'
+            )
         
-        # Store command history
-        CommandHistory.objects.create(
-            chat_session=chat_session,
-            command=command,
-            output=result['output'],
-            exit_code=result['exit_code']
-        )
+        # Execute regular command in container once the scheduler grants an exec slot
+        try:
+            async with exec_attachment(session_id), exec_scheduler.slot(session_id) as ticket:
+                result = await run_blocking(container_manager.execute_command, command)
+        except SchedulerFull as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'⏳ Too many queued commands: {e}'
+            })
         
-        # Update session last activity
-        chat_session.last_activity = timezone.now()
-        chat_session.save()
+        # Store command history
+        record_command(chat_session, command, result['output'], result['exit_code'])
         
         return JsonResponse({
             'success': True,
             'output': result['output'],
-            'exit_code': result['exit_code']
+            'exit_code': result['exit_code'],
+            'cached': result.get('cached', False),
+            'queue_wait_ms': round(ticket['queue_wait'] * 1000, 1)
         })
         
     except ChatSession.DoesNotExist:
@@ -781,44 +1402,122 @@ def test_cluster_connection(cluster):
         return {'status': 'error', 'error': f'Kubeconfig validation failed: {str(e)}'}
 
 
-@require_http_methods(["GET"])
-def get_chat_history(request, session_id):
-    """Get command history for a chat session and ensure container exists."""
+@async_require_http_methods(["GET"])
+async def get_chat_history(request, session_id):
+    """Get a page of command history for a chat session and ensure container exists.
+
+    Entries are paged on ``(timestamp, id)``: ``before`` returns the ``limit``
+    entries older than a cursor (the newest ones without it), ``after`` (or an
+    ISO ``since`` timestamp) the ones newer than it, for polling. Outputs longer
+    than ``HISTORY_OUTPUT_PREVIEW`` characters are truncated; fetch them from
+    ``history/<id>/output/``. Responses carry an ETag for ``If-None-Match``,
+    covering both the session's history and the normalized query.
+    """
     try:
-        chat_session = get_object_or_404(ChatSession, session_id=session_id)
-        
-        # Ensure container exists for this session
-        if session_id not in active_containers:
-            print(f"🐳 Creating container for session {session_id} on history load...")
-            try:
-                container_manager = KubernetesContainer(chat_session.cluster, session_id)
-                if container_manager.docker_client and container_manager.create_container():
-                    active_containers[session_id] = container_manager
-                    print(f"✅ Container created for session {session_id}")
-                else:
-                    print(f"❌ Failed to create container for session {session_id} - Docker may not be running")
-            except Exception as e:
-                print(f"❌ Error creating container for session {session_id}: {e}")
-        
-        history = CommandHistory.objects.filter(chat_session=chat_session).order_by('timestamp')
-        
-        history_data = [{
+        chat_session = await ChatSession.objects.select_related('cluster').aget(session_id=session_id)
+        limit = min(max(1, int(request.GET.get('limit', settings.HISTORY_PAGE_SIZE))), settings.HISTORY_MAX_PAGE_SIZE)
+        before = decode_cursor(request.GET['before']) if request.GET.get('before') else None
+        after = decode_cursor(request.GET['after']) if request.GET.get('after') else None
+        since = parse_datetime(request.GET['since']) if request.GET.get('since') else None
+        if request.GET.get('since') and since is None:
+            raise ValueError(f"Invalid timestamp: {request.GET['since']}")
+    except ChatSession.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Chat session not found'
+        })
+    except ValueError as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid history query: {str(e)}'
+        })
+    
+    # Ensure container exists for this session; incremental polls don't need one
+    if session_id not in active_containers and not (before or after or since):
+        print(f"🐳 Ensuring container for session {session_id} on history load...")
+        try:
+            if await run_blocking(get_container_manager, chat_session) is not None:
+                print(f"✅ Container ready for session {session_id}")
+            else:
+                print(f"❌ Failed to create container for session {session_id} - Docker may not be running")
+        except Exception as e:
+            print(f"❌ Error creating container for session {session_id}: {e}")
+    
+    # Write out commands still buffered by the history sink, so they get ids for the cursors
+    await run_blocking(history_sink.flush)
+    
+    history = CommandHistory.objects.filter(chat_session=chat_session)
+    stats = await history.aaggregate(count=Count('id'), last=Max('id'))
+    query = repr((limit, before, after, since and since.isoformat(), chat_session.cluster.name))
+    query_hash = hashlib.sha1(query.encode()).hexdigest()[:16]
+    etag = f'"{chat_session.pk}-{stats["count"]}-{stats["last"] or 0}-{query_hash}"'
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        metrics.incr('history.not_modified')
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    
+    preview = settings.HISTORY_OUTPUT_PREVIEW
+    history = history.defer('output').annotate(
+        output_size=Length('output'),
+        output_preview=Substr('output', 1, preview) if preview > 0 else F('output')
+    )
+    if after or since:
+        if after:
+            history = history.filter(Q(timestamp__gt=after[0]) | Q(timestamp=after[0], id__gt=after[1]))
+        if since:
+            history = history.filter(timestamp__gt=since)
+        page = [cmd async for cmd in history.order_by('timestamp', 'id')[:limit + 1]]
+        has_more = len(page) > limit
+        page = page[:limit]
+    else:
+        if before:
+            history = history.filter(Q(timestamp__lt=before[0]) | Q(timestamp=before[0], id__lt=before[1]))
+        page = [cmd async for cmd in history.order_by('-timestamp', '-id')[:limit + 1]]
+        has_more = len(page) > limit
+        page = page[:limit][::-1]
+    
+    history_data = [{
+        'id': cmd.pk,
+        'command': cmd.command,
+        'output': cmd.output_preview,
+        'output_size': cmd.output_size,
+        'truncated': cmd.output_size > len(cmd.output_preview),
+        'exit_code': cmd.exit_code,
+        'timestamp': cmd.timestamp.isoformat()
+    } for cmd in page]
+    
+    response = JsonResponse({
+        'success': True,
+        'history': history_data,
+        'has_more': has_more,
+        # Cursors for the page before this one and for polling newer entries
+        'before': encode_cursor(page[0]) if page else request.GET.get('before'),
+        'after': encode_cursor(page[-1]) if page else request.GET.get('after'),
+        'cluster_name': chat_session.cluster.name
+    })
+    response['ETag'] = etag
+    return response
+
+
+@async_require_http_methods(["GET"])
+async def get_history_output(request, session_id, entry_id):
+    """Get the full output of a history entry that was truncated in the history listing."""
+    try:
+        cmd = await CommandHistory.objects.aget(pk=entry_id, chat_session__session_id=session_id)
+        return JsonResponse({
+            'success': True,
+            'id': cmd.pk,
             'command': cmd.command,
             'output': cmd.output,
             'exit_code': cmd.exit_code,
             'timestamp': cmd.timestamp.isoformat()
-        } for cmd in history]
-        
-        return JsonResponse({
-            'success': True,
-            'history': history_data,
-            'cluster_name': chat_session.cluster.name
         })
-        
-    except ChatSession.DoesNotExist:
+    except CommandHistory.DoesNotExist:
         return JsonResponse({
             'success': False,
-            'error': 'Chat session not found'
+            'error': 'History entry not found'
         })
 
 
@@ -882,23 +1581,17 @@ def rename_cluster(request, cluster_id):
 
 
 
-@require_http_methods(["GET"])
-def container_status(request, session_id):
+@async_require_http_methods(["GET"])
+async def container_status(request, session_id):
     """Check if container is running for the session."""
     try:
-        chat_session = get_object_or_404(ChatSession, session_id=session_id)
-        container_name = f"k8s-terminal-{session_id}"
+        chat_session = await ChatSession.objects.aget(session_id=session_id)
+        container_name = container_name_for(chat_session.cluster_id, session_id)
         
         # Check if Docker is available
-        if not hasattr(chat_session, '_kubernetes_container'):
-            chat_session._kubernetes_container = KubernetesContainer(
-                session_id=session_id,
-                cluster=chat_session.cluster
-            )
-        
-        k8s_container = chat_session._kubernetes_container
-        
-        if not k8s_container.docker_client:
+        try:
+            docker_client = await run_blocking(get_docker_client)
+        except docker.errors.DockerException:
             return JsonResponse({
                 'success': False,
                 'error': 'Docker is not available',
@@ -907,7 +1600,7 @@ def container_status(request, session_id):
         
         # Check if container exists and is running
         try:
-            container = k8s_container.docker_client.containers.get(container_name)
+            container = await run_blocking(docker_client.containers.get, container_name)
             is_running = container.status == 'running'
             
             return JsonResponse({
@@ -944,7 +1637,8 @@ def clear_history(request, session_id):
     try:
         chat_session = get_object_or_404(ChatSession, session_id=session_id)
         
-        # Delete all command history for this session
+        # Delete all command history for this session, including entries not written yet
+        history_sink.discard(chat_session.pk)
         CommandHistory.objects.filter(chat_session=chat_session).delete()
         
         return JsonResponse({
@@ -1013,19 +1707,8 @@ def update_kubeconfig(request, cluster_id):
         cluster.last_connection_check = timezone.now()
         cluster.save()
         
-        # Update containers with new kubeconfig
-        for session in cluster.chat_sessions.filter(is_active=True):
-            if session.session_id in active_containers:
-                print(f"🐳 Updating container for session {session.session_id}")
-                # Stop old container and create new one
-                active_containers[session.session_id].stop_container()
-                
-                new_container = KubernetesContainer(cluster, session.session_id)
-                if new_container.create_container():
-                    active_containers[session.session_id] = new_container
-                    print(f"✅ Container updated for session {session.session_id}")
-                else:
-                    print(f"❌ Failed to update container for session {session.session_id}")
+        # Swap the kubeconfig inside the running containers, keeping shells and cwd
+        update_session_kubeconfigs(cluster, list(cluster.chat_sessions.filter(is_active=True)))
         
         if connection_result['status'] == 'connected':
             return JsonResponse({
@@ -1045,6 +1728,45 @@ def update_kubeconfig(request, cluster_id):
         })
 
 
+def update_session_kubeconfigs(cluster, sessions):
+    """Install the cluster's kubeconfig in all of its session containers in parallel"""
+    def update(session):
+        try:
+            container_manager = get_container_manager(session, create=False, wake=False)
+            if container_manager is None:
+                return False
+            container_manager.cluster = cluster
+            if container_manager.install_kubeconfig():
+                print(f"✅ Kubeconfig updated for session {session.session_id}")
+                return True
+            print(f"❌ Failed to update kubeconfig for session {session.session_id}")
+            return False
+        except Exception as e:
+            print(f"❌ Error updating kubeconfig for session {session.session_id}: {e}")
+            return False
+        finally:
+            connection.close()
+    
+    if not sessions:
+        return 0
+    if shared_placement():
+        # The sessions share the cluster's container, writing it once is enough
+        sessions = sessions[:1]
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=settings.KUBECONFIG_UPDATE_WORKERS, thread_name_prefix="kubeconfig") as executor:
+        updated = sum(1 for result in executor.map(update, sessions) if result)
+    writer = active_containers.get(sessions[0].session_id)
+    if shared_placement() and updated and writer is not None:
+        # Every other session's manager of the shared container now knows what it holds
+        for container_manager in list(active_containers.values()):
+            if container_manager is not writer and container_manager.container_key == writer.container_key:
+                container_manager.cluster = cluster
+                container_manager.kubeconfig_digest = writer.kubeconfig_digest
+    metrics.observe('kubeconfig.update_seconds', time.monotonic() - start)
+    print(f"🔑 Updated kubeconfig in {updated}/{len(sessions)} containers in {time.monotonic() - start:.2f}s")
+    return updated
+
+
 @csrf_exempt
 @require_http_methods(["DELETE"])
 def delete_cluster(request, cluster_id):
@@ -1052,12 +1774,13 @@ def delete_cluster(request, cluster_id):
     try:
         cluster = get_object_or_404(KubernetesCluster, id=cluster_id)
         
-        # Stop and remove containers for this cluster
-        for session in cluster.chat_sessions.filter(is_active=True):
-            if session.session_id in active_containers:
-                print(f"🐳 Stopping container for session {session.session_id}")
-                active_containers[session.session_id].stop_container()
-                del active_containers[session.session_id]
+        # Stop and remove containers for this cluster in parallel
+        teardown_session_containers(
+            cluster.chat_sessions.filter(is_active=True).values_list('session_id', flat=True),
+            cluster_ids=[cluster.pk]
+        )
+        
+        kube_api.discard(cluster.pk)
         
         # Mark cluster as inactive instead of deleting to preserve data
         cluster.is_active = False
@@ -1065,6 +1788,7 @@ def delete_cluster(request, cluster_id):
         
         # Mark all chat sessions as inactive
         cluster.chat_sessions.update(is_active=False)
+        kube_cache.schedule_eviction()
         
         return JsonResponse({
             'success': True,
@@ -1109,16 +1833,15 @@ def start_ai_session(request, session_id):
         chat_session = get_object_or_404(ChatSession, session_id=session_id)
         
         # Get container for this session
-        if session_id not in active_containers:
+        container_manager = get_container_manager(chat_session, create=False)
+        if container_manager is None:
             return JsonResponse({
                 'success': False,
                 'error': '🐳 Container not found. Please refresh the page and try again.'
             })
         
-        container_manager = active_containers[session_id]
-        
         # Check if container is still running
-        if not container_manager.is_running():
+        if not container_manager.is_running() and not container_manager.resume():
             return JsonResponse({
                 'success': False,
                 'error': '🐳 Container not running. Please refresh the page and try again.'
@@ -1135,16 +1858,7 @@ def start_ai_session(request, session_id):
         result = ai_session.start_session()
         
         # Store in command history
-        CommandHistory.objects.create(
-            chat_session=chat_session,
-            command='kubectl-ai',
-            output=result.get('output', ''),
-            exit_code=0 if result.get('success') else 1
-        )
-        
-        # Update session last activity
-        chat_session.last_activity = timezone.now()
-        chat_session.save()
+        record_command(chat_session, 'kubectl-ai', result.get('output', ''), 0 if result.get('success') else 1)
         
         return JsonResponse({
             'success': result.get('success', True),
@@ -1224,15 +1938,327 @@ def debug_kubectl_ai(request, session_id):
         })
 
 
-# Cleanup function to stop containers on server shutdown
-def cleanup_containers():
-    """Stop all active containers"""
-    print("🐳 Cleaning up containers...")
-    for session_id, container_manager in active_containers.items():
+@async_csrf_exempt
+@async_require_http_methods(["POST"])
+async def execute_batch(request, session_id):
+    """Run an ordered list of commands in one request.
+    
+    ``mode`` is ``sequential`` (default), ``stop_on_error`` or ``parallel``.
+    Sequential batches run in the session's persistent shell, so ``cd`` and
+    ``export`` carry over between commands; parallel batches run each command in
+    its own exec. History is saved with a single bulk insert.
+    """
+    try:
+        chat_session = await ChatSession.objects.select_related('cluster').aget(session_id=session_id)
+        data = json.loads(request.body)
+        commands = [str(command).strip() for command in data.get('commands', [])]
+        mode = data.get('mode', 'sequential')
+        
+        if not commands or not all(commands):
+            return JsonResponse({
+                'success': False,
+                'error': 'A non-empty list of commands is required'
+            })
+        if len(commands) > settings.BATCH_MAX_COMMANDS:
+            return JsonResponse({
+                'success': False,
+                'error': f'At most {settings.BATCH_MAX_COMMANDS} commands per batch'
+            })
+        if mode not in ('sequential', 'stop_on_error', 'parallel'):
+            return JsonResponse({
+                'success': False,
+                'error': f'Unknown batch mode: {mode}'
+            })
+        
+        container_manager = await run_blocking(get_container_manager, chat_session, create=False)
+        if container_manager is None:
+            return JsonResponse({
+                'success': False,
+                'error': '🐳 Container not found. Please refresh the page and try again.'
+            })
+        if not await run_blocking(container_manager.ensure_running):
+            return JsonResponse({
+                'success': False,
+                'error': '🐳 Container stopped and could not be restarted. Please refresh the page.'
+            })
+        
+        # A sequential batch takes one exec slot; each command of a parallel batch takes its own,
+        # up to BATCH_MAX_PARALLEL of the session's at once
         try:
-            container_manager.stop_container()
-        except Exception as e:
-            print(f"❌ Error stopping container {session_id}: {e}")
+            async with exec_attachment(session_id, settings.COMMAND_TIMEOUT * len(commands)):
+                if mode == 'parallel':
+                    results = [None] * len(commands)
+                    queue_waits = [0.0]
+                    pending = deque(enumerate(commands))
+                    scope = await run_blocking(container_manager.cache_scope)
+                    
+                    async def worker():
+                        while pending:
+                            index, command = pending.popleft()
+                            generation = command_cache.generation(chat_session.cluster_id)
+                            cached = command_cache.get(chat_session.cluster_id, command, scope)
+                            if cached is not None:
+                                results[index] = cached
+                                continue
+                            async with exec_scheduler.slot(session_id, limit=settings.BATCH_MAX_PARALLEL) as ticket:
+                                queue_waits.append(ticket['queue_wait'])
+                                result = await run_blocking(
+                                    container_manager.execute_command_oneshot, command, settings.COMMAND_TIMEOUT
+                                )
+                            command_cache.record(chat_session.cluster_id, command, result, scope, generation)
+                            container_manager.note_kube_config_change(command)
+                            results[index] = result
+                    
+                    workers = min(settings.BATCH_MAX_PARALLEL, len(commands))
+                    await asyncio.gather(*(worker() for _ in range(workers)))
+                    queue_wait = max(queue_waits)
+                else:
+                    async with exec_scheduler.slot(session_id) as ticket:
+                        results = await run_blocking(
+                            container_manager.execute_batch, commands, stop_on_error=mode == 'stop_on_error'
+                        )
+                    queue_wait = ticket['queue_wait']
+        except SchedulerFull as e:
+            return JsonResponse({
+                'success': False,
+                'error': f'⏳ Too many queued commands: {e}'
+            })
+        
+        for command, result in zip(commands, results):
+            if result is not None:
+                record_command(chat_session, command, result['output'], result['exit_code'])
+        metrics.incr('batch.requests')
+        metrics.incr('batch.commands', len(commands))
+        
+        return JsonResponse({
+            'success': True,
+            'results': [
+                {
+                    'command': command,
+                    'output': result['output'],
+                    'exit_code': result['exit_code'],
+                    'cached': result.get('cached', False)
+                }
+                if result is not None else {'command': command, 'skipped': True}
+                for command, result in zip(commands, results)
+            ],
+            'queue_wait_ms': round(queue_wait * 1000, 1)
+        })
+        
+    except ChatSession.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Chat session not found'
+        })
+    except Exception as e:
+        print(f"❌ Error in execute_batch: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': f'Error executing batch: {str(e)}'
+        })
+
+
+@async_csrf_exempt
+@async_require_http_methods(["GET", "POST"])
+async def command_jobs(request, session_id):
+    """List a session's jobs (GET) or submit a command to run as a background job (POST)."""
+    try:
+        chat_session = await ChatSession.objects.select_related('cluster').aget(session_id=session_id)
+        
+        if request.method == 'GET':
+            jobs = [serialize_job(job) async for job in CommandJob.objects.filter(chat_session=chat_session)[:50]]
+            return JsonResponse({
+                'success': True,
+                'jobs': jobs
+            })
+        
+        data = json.loads(request.body)
+        command = data.get('command', '').strip()
+        if not command:
+            return JsonResponse({
+                'success': False,
+                'error': 'Command is required'
+            })
+        deadline = int(data.get('deadline') or settings.JOB_DEFAULT_DEADLINE)
+        deadline = max(1, min(deadline, settings.JOB_MAX_DEADLINE))
+        
+        container_manager = await run_blocking(get_container_manager, chat_session, create=False)
+        if container_manager is None:
+            return JsonResponse({
+                'success': False,
+                'error': '🐳 Container not found. Please refresh the page and try again.'
+            })
+        
+        job = await CommandJob.objects.acreate(
+            job_id=str(uuid.uuid4()),
+            chat_session=chat_session,
+            command=command,
+            deadline=deadline,
+            owner=process_owner()
+        )
+        job_runner.submit(job.job_id, container_manager)
+        
+        return JsonResponse({
+            'success': True,
+            'job_id': job.job_id,
+            'status': job.status,
+            'deadline': deadline
+        })
+        
+    except ChatSession.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Chat session not found'
+        })
+    except Exception as e:
+        print(f"❌ Error in command_jobs: {e}")
+        return JsonResponse({
+            'success': False,
+            'error': f'Error submitting job: {str(e)}'
+        })
+
+
+@async_require_http_methods(["GET"])
+async def job_status(request, session_id, job_id):
+    """Poll a job: its state plus output from byte ``offset`` (at most ``limit`` bytes)."""
+    try:
+        job = await CommandJob.objects.aget(job_id=job_id, chat_session__session_id=session_id)
+        offset = max(0, int(request.GET.get('offset', 0)))
+        limit = min(max(1, int(request.GET.get('limit', 65536))), 1024 * 1024)
+        
+        output, next_offset = await run_blocking(
+            read_job_output, job.job_id, offset, limit, final=job.status in FINISHED_STATUSES
+        )
+        return JsonResponse({
+            'success': True,
+            'job': serialize_job(job),
+            'output': output,
+            'offset': next_offset,
+            'complete': job.status in FINISHED_STATUSES and next_offset >= job.output_size
+        })
+        
+    except CommandJob.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Job not found'
+        })
+
+
+@async_require_http_methods(["GET"])
+async def stream_job(request, session_id, job_id):
+    """Follow a job's output from byte ``offset`` as NDJSON (or SSE with ``format=sse``) until it finishes."""
+    try:
+        job = await CommandJob.objects.aget(job_id=job_id, chat_session__session_id=session_id)
+    except CommandJob.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Job not found'
+        })
+    stream_format = 'sse' if request.GET.get('format') == 'sse' else 'ndjson'
+    offset = max(0, int(request.GET.get('offset', 0)))
+    
+    async def events():
+        nonlocal offset
+        while True:
+            current = await CommandJob.objects.aget(pk=job.pk)
+            finished = current.status in FINISHED_STATUSES
+            output, offset = await run_blocking(read_job_output, job.job_id, offset, final=finished)
+            if output:
+                yield format_stream_event(stream_format, {'type': 'output', 'data': output, 'offset': offset})
+            elif finished:
+                yield format_stream_event(stream_format, {
+                    'type': 'exit',
+                    'status': current.status,
+                    'exit_code': current.exit_code,
+                    'offset': offset
+                })
+                return
+            else:
+                await asyncio.sleep(settings.JOB_POLL_INTERVAL)
+    
+    content_type = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    response = StreamingHttpResponse(events(), content_type=content_type)
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@async_csrf_exempt
+@async_require_http_methods(["POST"])
+async def cancel_job(request, session_id, job_id):
+    """Cancel a queued or running job."""
+    try:
+        job = await CommandJob.objects.select_related('chat_session__cluster').aget(
+            job_id=job_id, chat_session__session_id=session_id
+        )
+        if job.status in FINISHED_STATUSES:
+            return JsonResponse({
+                'success': False,
+                'error': f'Job already {job.status}'
+            })
+        
+        container_manager = await run_blocking(get_container_manager, job.chat_session, create=False)
+        await run_blocking(job_runner.cancel, job, container_manager.container if container_manager else None)
+        return JsonResponse({
+            'success': True,
+            'message': 'Cancellation requested'
+        })
+        
+    except CommandJob.DoesNotExist:
+        return JsonResponse({
+            'success': False,
+            'error': 'Job not found'
+        })
+    except Exception as e:
+        return JsonResponse({
+            'success': False,
+            'error': f'Error cancelling job: {str(e)}'
+        })
+
+
+def container_stats():
+    """Sessions attached in this process and the distinct containers serving them"""
+    return {
+        'placement': settings.CONTAINER_PLACEMENT,
+        'sessions': len(active_containers),
+        'containers': len({
+            container_manager.container.id
+            for container_manager in list(active_containers.values())
+            if container_manager.container is not None
+        })
+    }
+
+
+@require_http_methods(["GET"])
+def get_metrics(request):
+    """Expose in-process performance metrics"""
+    update_docker_pool_metrics()
+    return JsonResponse({
+        'success': True,
+        'metrics': metrics.snapshot(),
+        'image': image_manager.status(),
+        'scheduler': exec_scheduler.snapshot(),
+        'command_cache': command_cache.snapshot(),
+        'containers': container_stats(),
+        'terminals': terminal_flow_stats()
+    })
+
+
+# Cleanup function to release containers on server shutdown
+def cleanup_containers():
+    """Release active containers, leaving them running for the next process unless configured otherwise"""
+    print("🔥 Draining warm pool...")
+    warm_pool.stop()
+    idle_reaper.stop()
+    kube_cache.stop()
+    
+    if settings.REMOVE_CONTAINERS_ON_SHUTDOWN:
+        print("🐳 Cleaning up containers...")
+        teardown_session_containers(list(active_containers))
+    else:
+        print("🐳 Detaching from containers, they will be adopted on restart...")
+        for container_manager in active_containers.values():
+            container_manager.close_shell()
     active_containers.clear()
     
     print("🤖 Cleaning up AI sessions...")
@@ -1243,6 +2269,11 @@ def cleanup_containers():
             print(f"❌ Error stopping AI session {session_id}: {e}")
     active_ai_sessions.clear()
     
+    kube_api.close()
+    
+    print("📝 Flushing command history...")
+    history_sink.stop()
+    
     print("✅ Cleanup completed")
 
 
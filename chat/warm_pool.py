@@ -0,0 +1,276 @@
+import fcntl
+import os
+import tempfile
+import time
+import uuid
+import threading
+from collections import deque
+
+import docker
+
+from .metrics import metrics
+from .docker_client import get_docker_client
+from .readiness import wait_until_ready
+from .teardown import teardown_containers
+from .registry import process_owner
+
+
+POOL_CONTAINER_PREFIX = "k8s-pool-"
+POOL_LABEL = "k8s-ai.pool"
+# The process (host:pid) that created a pooled container
+POOL_OWNER_LABEL = "k8s-ai.pool-owner"
+
+
+class WarmPool:
+    """Keep a pool of idle, already running kubectl containers ready to be claimed.
+
+    Session creation claims a pooled container, renames it to the session's
+    container name and injects the kubeconfig, instead of paying a cold
+    ``containers.run``. A background replenisher refills the pool up to the
+    high watermark whenever it drops below the low watermark.
+
+    Every worker process has its own pool. A process owns a pooled container
+    while it holds the container's lock file in ``lock_dir``; the kernel
+    releases it when the process dies. On start a pool only adopts orphans,
+    containers whose lock it can take, and it only claims or removes
+    containers it owns.
+    """
+
+    def __init__(self, image_name, size=2, low_watermark=1, interval=5.0, prepare=None, ready_timeout=10.0,
+                 lock_dir=None):
+        self.image_name = image_name
+        self.high_watermark = max(0, size)
+        self.low_watermark = min(max(0, low_watermark), self.high_watermark)
+        self.interval = interval
+        self.prepare = prepare
+        self.ready_timeout = ready_timeout
+        self.lock_dir = lock_dir or os.path.join(tempfile.gettempdir(), 'k8s-ai-pool')
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self.owner = process_owner()
+        self.docker_client = None
+        self._idle = deque()
+        # Container name -> open lock file, for every pooled container this process owns
+        self._ownership = {}
+        # Orphans adopted from dead processes; their owner label names the dead process
+        self._adopted = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        metrics.set_gauge('warm_pool.high_watermark', self.high_watermark)
+        metrics.set_gauge('warm_pool.low_watermark', self.low_watermark)
+        metrics.set_gauge('warm_pool.size', 0)
+
+    @property
+    def enabled(self):
+        return self.high_watermark > 0
+
+    @property
+    def started(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def size(self):
+        with self._lock:
+            return len(self._idle)
+
+    def start(self):
+        """Start the background replenisher"""
+        if not self.enabled or self.started:
+            return
+        try:
+            self.docker_client = get_docker_client()
+        except docker.errors.DockerException as e:
+            print(f"❌ Warm pool disabled, Docker connection error: {e}")
+            return
+        self._stopping.clear()
+        self._adopt_idle_containers()
+        self._thread = threading.Thread(target=self._run, name="warm-pool-replenisher", daemon=True)
+        self._thread.start()
+        print(f"🔥 Warm pool started (high={self.high_watermark}, low={self.low_watermark})")
+
+    def stop(self, deadline=10):
+        """Stop the replenisher and remove all idle pooled containers in parallel"""
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+        teardown_containers(idle, stop_timeout=0, deadline=deadline, label="pooled containers")
+        for name in list(self._ownership):
+            self._disown(name)
+        self._update_size_gauge()
+
+    def claim(self, container_name):
+        """Claim an idle container and rename it to ``container_name``.
+
+        Returns the container, or None when the pool is empty or disabled.
+        """
+        if not self.started:
+            return None
+
+        start = time.monotonic()
+        container = None
+        while container is None:
+            with self._lock:
+                if not self._idle:
+                    break
+                candidate = self._idle.popleft()
+            pooled_name = candidate.name
+            try:
+                candidate.reload()
+                if not (candidate.name.startswith(POOL_CONTAINER_PREFIX) and self._owns(candidate)):
+                    # Claimed or adopted elsewhere in the meantime: not ours to hand out or remove
+                    print(f"⚠️ Skipping pooled container {pooled_name}, no longer owned by this process")
+                    metrics.incr('warm_pool.ownership_conflicts')
+                    self._disown(pooled_name)
+                    continue
+                if candidate.status != 'running':
+                    candidate.remove(force=True)
+                    self._disown(pooled_name)
+                    continue
+                candidate.rename(container_name)
+                candidate.reload()
+                container = candidate
+                self._disown(pooled_name)
+            except Exception as e:
+                print(f"❌ Discarding pooled container {pooled_name}: {e}")
+                try:
+                    candidate.remove(force=True)
+                except Exception:
+                    pass
+                self._disown(pooled_name)
+
+        self._update_size_gauge()
+        if self.size() <= self.low_watermark:
+            self._wakeup.set()
+
+        if container is None:
+            metrics.incr('warm_pool.misses')
+        else:
+            metrics.incr('warm_pool.hits')
+            metrics.observe('warm_pool.claim_seconds', time.monotonic() - start)
+        self._update_hit_rate()
+        return container
+
+    def _run(self):
+        # Fill up to the high watermark on start, afterwards only when below the low watermark
+        self._replenish()
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._stopping.is_set():
+                break
+            if self.size() <= self.low_watermark:
+                self._replenish()
+
+    def _replenish(self):
+        if self.prepare is not None and not self.prepare():
+            return
+        while not self._stopping.is_set() and self.size() < self.high_watermark:
+            container = self._create_pooled_container()
+            if container is None:
+                break
+            with self._lock:
+                self._idle.append(container)
+            self._update_size_gauge()
+
+    def _create_pooled_container(self):
+        name = f"{POOL_CONTAINER_PREFIX}{uuid.uuid4().hex[:12]}"
+        if not self._own(name):
+            return None
+        try:
+            container = self.docker_client.containers.run(
+                image=self.image_name,
+                name=name,
+                environment={
+                    'GEMINI_API_KEY': os.getenv('GEMINI_API_KEY', ''),
+                    'TERM': 'xterm-256color',
+                    'KUBECONFIG': '/root/.kube/config'
+                },
+                labels={POOL_LABEL: 'idle', POOL_OWNER_LABEL: self.owner},
+                command=["/bin/sh", "-c", "mkdir -p /root/.kube && tail -f /dev/null"],
+                stdin_open=True,
+                tty=True,
+                detach=True,
+                remove=False,
+                working_dir="/root"
+            )
+            if not wait_until_ready(container, timeout=self.ready_timeout, metric='warm_pool.ready_seconds'):
+                container.remove(force=True)
+                metrics.incr('warm_pool.create_errors')
+                self._disown(name)
+                return None
+            metrics.incr('warm_pool.created')
+            return container
+        except Exception as e:
+            print(f"❌ Error creating pooled container: {e}")
+            metrics.incr('warm_pool.create_errors')
+            self._disown(name)
+            return None
+
+    def _adopt_idle_containers(self):
+        """Reuse idle pooled containers left behind by processes that exited"""
+        try:
+            containers = self.docker_client.containers.list(all=True, filters={'label': POOL_LABEL})
+        except Exception as e:
+            print(f"❌ Error listing pooled containers: {e}")
+            return
+        for container in containers:
+            if not container.name.startswith(POOL_CONTAINER_PREFIX) or not self._own(container.name):
+                # Another live worker's pool
+                continue
+            if container.status == 'running' and self.size() < self.high_watermark:
+                with self._lock:
+                    self._adopted.add(container.name)
+                    self._idle.append(container)
+            else:
+                try:
+                    container.remove(force=True)
+                except Exception:
+                    pass
+                self._disown(container.name)
+        self._update_size_gauge()
+
+    def _own(self, name):
+        """Take the ownership lock of pooled container ``name``; False if a live process holds it"""
+        with self._lock:
+            if name in self._ownership:
+                return True
+        lock_file = open(os.path.join(self.lock_dir, f"{name}.lock"), 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        with self._lock:
+            self._ownership[name] = lock_file
+        return True
+
+    def _owns(self, container):
+        with self._lock:
+            if container.name not in self._ownership:
+                return False
+            return container.labels.get(POOL_OWNER_LABEL) == self.owner or container.name in self._adopted
+
+    def _disown(self, name):
+        """Release the ownership lock of a container that left the pool"""
+        with self._lock:
+            lock_file = self._ownership.pop(name, None)
+            self._adopted.discard(name)
+        if lock_file is not None:
+            try:
+                os.remove(lock_file.name)
+            except OSError:
+                pass
+            lock_file.close()
+
+    def _update_size_gauge(self):
+        metrics.set_gauge('warm_pool.size', self.size())
+
+    def _update_hit_rate(self):
+        hits = metrics.counter('warm_pool.hits')
+        total = hits + metrics.counter('warm_pool.misses')
+        metrics.set_gauge('warm_pool.hit_rate', round(hits / total, 4) if total else 0.0)
@@ -12,10 +12,14 @@ django.setup()
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from chat.routing import websocket_urlpatterns
+from chat.views import start_background_services
 
 application = ProtocolTypeRouter({
     "http": get_asgi_application(),
     "websocket": AuthMiddlewareStack(
         URLRouter(websocket_urlpatterns)
     ),
-})
\ No newline at end of file
+})
+
+# Start background services (warm container pool) for the serving process
+start_background_services()
@@ -4,6 +4,7 @@ Django settings for k8s_ai project.
 
 from pathlib import Path
 import os
+import tempfile
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -129,4 +130,146 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField' 
\ No newline at end of file
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField' 
+
+# Terminal container warm pool
+# Idle kubectl containers kept running so new sessions can claim one instantly.
+WARM_POOL_SIZE = int(os.getenv('WARM_POOL_SIZE', '2'))
+WARM_POOL_LOW_WATERMARK = int(os.getenv('WARM_POOL_LOW_WATERMARK', '1'))
+WARM_POOL_REPLENISH_INTERVAL = float(os.getenv('WARM_POOL_REPLENISH_INTERVAL', '5'))
+
+# Command execution
+# Commands run in one long-lived shell per session so cwd and env persist between them.
+PERSISTENT_SHELL_ENABLED = os.getenv('PERSISTENT_SHELL_ENABLED', 'true').lower() == 'true'
+COMMAND_TIMEOUT = int(os.getenv('COMMAND_TIMEOUT', '30'))
+
+# Shared Docker client
+# One client per process; the pool bounds persistent connections to the Docker socket.
+DOCKER_MAX_POOL_SIZE = int(os.getenv('DOCKER_MAX_POOL_SIZE', '32'))
+DOCKER_HEALTH_CHECK_INTERVAL = float(os.getenv('DOCKER_HEALTH_CHECK_INTERVAL', '30'))
+
+# Terminal image
+# Loaded from a `docker save` tarball or built from a local context when set, so startup works offline.
+KUBECTL_IMAGE_TARBALL = os.getenv('KUBECTL_IMAGE_TARBALL', '')
+KUBECTL_IMAGE_BUILD_CONTEXT = os.getenv('KUBECTL_IMAGE_BUILD_CONTEXT', '')
+IMAGE_READY_WAIT = float(os.getenv('IMAGE_READY_WAIT', '0'))
+
+# Terminal WebSocket output
+# Output is coalesced over a short window before being sent as one frame.
+TERMINAL_COALESCE_WINDOW_MS = float(os.getenv('TERMINAL_COALESCE_WINDOW_MS', '5'))
+TERMINAL_COALESCE_MAX_BYTES = int(os.getenv('TERMINAL_COALESCE_MAX_BYTES', '65536'))
+
+# Terminal flow control
+# Reading from the container pauses while more than the high watermark of output is unsent or
+# unacknowledged. Clients without acknowledgements have output above the runaway rate dropped.
+TERMINAL_FLOW_HIGH_WATERMARK = int(os.getenv('TERMINAL_FLOW_HIGH_WATERMARK', '1048576'))
+TERMINAL_FLOW_LOW_WATERMARK = int(os.getenv('TERMINAL_FLOW_LOW_WATERMARK', '262144'))
+TERMINAL_RUNAWAY_BYTES_PER_SEC = int(os.getenv('TERMINAL_RUNAWAY_BYTES_PER_SEC', '2097152'))
+
+# Container placement
+# 'session' runs one container per chat session; 'cluster' shares one container between all sessions of a cluster,
+# each with its own shell and home directory, so containers scale with clusters instead of sessions.
+CONTAINER_PLACEMENT = os.getenv('CONTAINER_PLACEMENT', 'session')
+
+# Session registry
+# Maps sessions to containers for all worker processes: 'database' or 'file'.
+SESSION_REGISTRY_BACKEND = os.getenv('SESSION_REGISTRY_BACKEND', 'database')
+SESSION_REGISTRY_PATH = os.getenv('SESSION_REGISTRY_PATH', os.path.join(tempfile.gettempdir(), 'k8s-ai-sessions'))
+
+# Startup reconciliation
+# Session containers outlive the process and are re-adopted on startup; orphans are removed.
+RECONCILE_WORKERS = int(os.getenv('RECONCILE_WORKERS', '8'))
+REMOVE_CONTAINERS_ON_SHUTDOWN = os.getenv('REMOVE_CONTAINERS_ON_SHUTDOWN', 'false').lower() == 'true'
+
+# Idle session hibernation
+# Idle session containers are paused, then stopped; they resume on the next command or terminal connect.
+IDLE_PAUSE_AFTER = int(os.getenv('IDLE_PAUSE_AFTER', '900'))
+IDLE_STOP_AFTER = int(os.getenv('IDLE_STOP_AFTER', '7200'))
+MAX_RUNNING_CONTAINERS = int(os.getenv('MAX_RUNNING_CONTAINERS', '0'))
+IDLE_REAPER_INTERVAL = float(os.getenv('IDLE_REAPER_INTERVAL', '60'))
+
+# Container readiness
+# New containers are probed with exponential backoff until they accept commands, up to this many seconds.
+CONTAINER_READY_TIMEOUT = float(os.getenv('CONTAINER_READY_TIMEOUT', '10'))
+
+# Kubeconfig updates
+# New kubeconfigs are written into running session containers by this many threads.
+KUBECONFIG_UPDATE_WORKERS = int(os.getenv('KUBECONFIG_UPDATE_WORKERS', '8'))
+
+# Container teardown
+# Cluster deletion and shutdown stop containers in parallel and force-remove what is left at the deadline.
+TEARDOWN_WORKERS = int(os.getenv('TEARDOWN_WORKERS', '16'))
+TEARDOWN_STOP_TIMEOUT = int(os.getenv('TEARDOWN_STOP_TIMEOUT', '10'))
+TEARDOWN_DEADLINE = float(os.getenv('TEARDOWN_DEADLINE', '20'))
+
+# Async views
+# Blocking Docker calls from async views run on a dedicated pool of this many threads.
+DOCKER_EXECUTOR_WORKERS = int(os.getenv('DOCKER_EXECUTOR_WORKERS', '64'))
+
+# Command scheduling
+# Execs per worker process and per session, and how many commands a session may have waiting.
+# The limits are per process: with N workers, up to N * EXEC_GLOBAL_CONCURRENCY execs run on the host.
+EXEC_GLOBAL_CONCURRENCY = int(os.getenv('EXEC_GLOBAL_CONCURRENCY', '32'))
+EXEC_SESSION_CONCURRENCY = int(os.getenv('EXEC_SESSION_CONCURRENCY', '1'))
+EXEC_SESSION_QUEUE_LIMIT = int(os.getenv('EXEC_SESSION_QUEUE_LIMIT', '16'))
+
+# Background jobs
+# Long commands run as jobs with their own deadline; output is buffered in JOB_OUTPUT_DIR.
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '8'))
+JOB_DEFAULT_DEADLINE = int(os.getenv('JOB_DEFAULT_DEADLINE', '600'))
+JOB_MAX_DEADLINE = int(os.getenv('JOB_MAX_DEADLINE', '3600'))
+JOB_MAX_OUTPUT_BYTES = int(os.getenv('JOB_MAX_OUTPUT_BYTES', str(64 * 1024 * 1024)))
+JOB_OUTPUT_DIR = os.getenv('JOB_OUTPUT_DIR', os.path.join(tempfile.gettempdir(), 'k8s-ai-jobs'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '0.25'))
+
+# Batched commands
+# Commands accepted per batch request, and how many of a parallel batch run at once.
+BATCH_MAX_COMMANDS = int(os.getenv('BATCH_MAX_COMMANDS', '50'))
+BATCH_MAX_PARALLEL = int(os.getenv('BATCH_MAX_PARALLEL', '4'))
+
+# Command history write-behind
+# History entries are buffered and written in batches of up to HISTORY_BATCH_SIZE, at least every HISTORY_FLUSH_INTERVAL seconds.
+HISTORY_BATCH_SIZE = int(os.getenv('HISTORY_BATCH_SIZE', '100'))
+HISTORY_FLUSH_INTERVAL = float(os.getenv('HISTORY_FLUSH_INTERVAL', '0.5'))
+
+# Command history API
+# Entries per history page (and the most a client may ask for), and output characters returned before truncating.
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '50'))
+HISTORY_MAX_PAGE_SIZE = int(os.getenv('HISTORY_MAX_PAGE_SIZE', '500'))
+HISTORY_OUTPUT_PREVIEW = int(os.getenv('HISTORY_OUTPUT_PREVIEW', '4096'))
+
+# Kubernetes API fast path
+# Read-only `kubectl get` commands are answered by the Python Kubernetes client instead of a container exec.
+# Off by default: it uses the stored kubeconfig in the web server process (kubeconfigs with exec/auth-provider
+# plugins or file references are always left to the container).
+KUBE_API_FAST_PATH = os.getenv('KUBE_API_FAST_PATH', 'false').lower() == 'true'
+KUBE_API_POOL_SIZE = int(os.getenv('KUBE_API_POOL_SIZE', '4'))
+KUBE_API_TIMEOUT = float(os.getenv('KUBE_API_TIMEOUT', '5'))
+
+# Informer caches
+# Pods, nodes, services and deployments of clusters in use are kept in sync with list+watch and reads are answered
+# locally while the cache heard from the API server (list, event or bookmark) in the last INFORMER_MAX_STALENESS
+# seconds; an open watch may additionally be quiet for the minute between bookmarks. Clusters with more objects
+# are not cached.
+INFORMERS_ENABLED = os.getenv('INFORMERS_ENABLED', 'false').lower() == 'true'
+INFORMER_MAX_STALENESS = float(os.getenv('INFORMER_MAX_STALENESS', '10'))
+INFORMER_MAX_OBJECTS = int(os.getenv('INFORMER_MAX_OBJECTS', '20000'))
+INFORMER_RESYNC_PERIOD = int(os.getenv('INFORMER_RESYNC_PERIOD', '300'))
+INFORMER_IDLE_TIMEOUT = int(os.getenv('INFORMER_IDLE_TIMEOUT', '900'))
+
+# kubectl result cache
+# Successful read-only kubectl commands are cached per cluster for a few seconds (by resource) and dropped when a
+# mutating command (apply, delete, scale, ...) runs. Off by default: output can lag the cluster by up to the TTL.
+COMMAND_CACHE_ENABLED = os.getenv('COMMAND_CACHE_ENABLED', 'false').lower() == 'true'
+COMMAND_CACHE_TTL = float(os.getenv('COMMAND_CACHE_TTL', '5'))
+COMMAND_CACHE_MAX_ENTRIES = int(os.getenv('COMMAND_CACHE_MAX_ENTRIES', '512'))
+
+# Shared kubectl cache
+# kubectl's discovery and HTTP caches live in Docker volumes named after this prefix, one per cluster shared by all
+# of its cold-started containers, so only the first kubectl of a cluster pays API discovery. Empty disables it.
+# Caches of clusters deleted or without activity for KUBE_CACHE_MAX_AGE seconds are removed every
+# KUBE_CACHE_EVICT_INTERVAL seconds.
+KUBE_CACHE_VOLUME = os.getenv('KUBE_CACHE_VOLUME', 'k8s-ai-kube-cache')
+KUBE_CACHE_PREWARM = os.getenv('KUBE_CACHE_PREWARM', 'true').lower() == 'true'
+KUBE_CACHE_MAX_AGE = int(os.getenv('KUBE_CACHE_MAX_AGE', '604800'))
+KUBE_CACHE_EVICT_INTERVAL = float(os.getenv('KUBE_CACHE_EVICT_INTERVAL', '3600'))
@@ -31,6 +31,8 @@ let connectionCheckInterval = null;
 let terminal = null;
 let terminalSocket = null;
 let fitAddon = null;
+let terminalBytesConsumed = 0;
+let terminalBytesAcked = 0;
 
 // AI Assistant State
 let currentAiRequest = null;
@@ -1633,7 +1635,8 @@ async function loadCommandHistory(sessionId) {
     }
     
     try {
-        const response = await fetch(`/terminal/${sessionId}/history/`);
+        // Only the last few commands are shown, so one small page is enough
+        const response = await fetch(`/terminal/${sessionId}/history/?limit=20`);
         const data = await response.json();
         
         if (data.success && data.history.length > 0) {
@@ -1675,9 +1678,10 @@ async function loadCommandHistory(sessionId) {
                         const outputDiv = document.createElement('div');
                         outputDiv.className = 'terminal-message mb-4';
                         const exitClass = cmd.exit_code === 0 ? 'text-blue-200' : 'text-red-400';
+                        const truncatedNote = cmd.truncated ? `\n[... output truncated, ${cmd.output_size} characters in total ...]` : '';
                         outputDiv.innerHTML = `
                             <div class="${exitClass} font-mono whitespace-pre-wrap">
-                                ${escapeHtml(cmd.output)}
+                                ${escapeHtml(cmd.output + truncatedNote)}
                             </div>
                         `;
                         oldHistory.appendChild(outputDiv);
@@ -4129,12 +4133,17 @@ function initializeRealTerminal(sessionId) {
 
 function connectTerminalWebSocket(sessionId) {
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${protocol}//${window.location.host}/ws/terminal/${sessionId}/`;
+    // Terminal output arrives as raw binary frames, control messages as JSON.
+    // Consumed output is acknowledged so the server can apply backpressure.
+    const wsUrl = `${protocol}//${window.location.host}/ws/terminal/${sessionId}/?protocol=binary&flow=ack`;
+    terminalBytesConsumed = 0;
+    terminalBytesAcked = 0;
     
     console.log('Connecting to WebSocket:', wsUrl);
     terminal.write('Connecting to terminal...\r\n');
     
     terminalSocket = new WebSocket(wsUrl);
+    terminalSocket.binaryType = 'arraybuffer';
     
     terminalSocket.onopen = () => {
         console.log('Terminal WebSocket connected');
@@ -4153,6 +4162,11 @@ function connectTerminalWebSocket(sessionId) {
     };
     
     terminalSocket.onmessage = (event) => {
+        if (event.data instanceof ArrayBuffer) {
+            const bytes = new Uint8Array(event.data);
+            terminal.write(bytes, () => acknowledgeTerminalOutput(bytes.length));
+            return;
+        }
         try {
             const data = JSON.parse(event.data);
             console.log('Received message:', data.type);
@@ -4202,6 +4216,20 @@ function connectTerminalWebSocket(sessionId) {
     });
 }
 
+function acknowledgeTerminalOutput(length) {
+    terminalBytesConsumed += length;
+    
+    // Acknowledge in 64 KB steps once xterm.js has processed the output
+    if (terminalBytesConsumed - terminalBytesAcked >= 65536 &&
+        terminalSocket && terminalSocket.readyState === WebSocket.OPEN) {
+        terminalBytesAcked = terminalBytesConsumed;
+        terminalSocket.send(JSON.stringify({
+            type: 'ack',
+            bytes: terminalBytesConsumed
+        }));
+    }
+}
+
 function loadChatSession(sessionId, clusterName, clusterId) {
     console.log('🐳 Loading container session:', sessionId);
     